@@ -1,24 +1,69 @@
 import streamlit as st
-import requests
 import json
-import pandas as pd
-from requests.auth import HTTPBasicAuth
-from io import BytesIO
 import base64
 import time
 import gc
+import os
+import datetime
+import tempfile
 import streamlit.components.v1 as components
 
+from exportador.azure import get_projects
+from exportador.cache import DEFAULT_CACHE_PATH, RunCache
+from exportador.checkpoint import CHECKPOINT_MAX_AGE, checkpoint_dir_for, checkpoint_expired, checkpoint_status
+from exportador.downloads import MAX_BUTTON_DOWNLOAD_BYTES, can_download_in_memory, publish_export, read_file
+from exportador.engine import API_VERSIONS, MAX_WORKERS
+from exportador.filters import OUTCOMES, RUN_STATES, parse_patterns
+from exportador.jobs import job_manager
+from exportador.preflight import scan
+from exportador.store import DEFAULT_STORE_PATH, ResultStore
+from exportador.writers import OUTPUT_FORMATS, write_rows
+
 st.set_page_config(
     page_title="Test Results Exporter",
     page_icon="📤",
 )
 
 # --- Función para mostrar imagen del canal ---
+@st.cache_data
 def image_to_base64(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode()
 
+# Carpeta servida por Streamlit como estática (server.enableStaticServing)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+# Opciones del selector de motor de descarga (ver exportador.engine.ENGINES)
+ENGINE_LABELS = {"Hilos (requests)": "threads", "asyncio (httpx)": "async", "OData (Analytics)": "odata"}
+
+# Cada cuánto se consulta el avance de la exportación en segundo plano
+JOB_POLL_SECONDS = 0.5
+
+# Opciones de las tendencias del almacén local (ver exportador.store)
+STORE_GROUP_LABELS = {"Suite": "suite", "Plan": "plan", "Proyecto": "project", "Tester": "tester"}
+STORE_PERIOD_LABELS = {"Semana": "week", "Día": "day", "Mes": "month"}
+# Columnas que identifican cada serie de una tendencia
+STORE_SERIES_COLUMNS = ("Project Name", "Plan Name", "Suite Name", "Executed By")
+
+# Filas por página del explorador de resultados, además de explorer.DEFAULT_PAGE_SIZE
+EXPLORER_PAGE_SIZES = (50, 250, 500)
+
+
+# --- Descarga de un archivo que no se sirve como estático ---
+def download_from_disk(label, path, file_name, mime):
+    # st.download_button lee el archivo entero en memoria al hacer clic:
+    # los que superan MAX_BUTTON_DOWNLOAD_BYTES no se ofrecen desde la app
+    if can_download_in_memory(path):
+        st.download_button(label, data=lambda: read_file(path), file_name=file_name, mime=mime, on_click="ignore")
+    else:
+        st.markdown(
+            f'<div class="custom-warning">El archivo supera los {MAX_BUTTON_DOWNLOAD_BYTES // (1024 * 1024)} MB '
+            f'que se pueden descargar desde la app. Quedó en el servidor en <code>{path}</code>; '
+            'para archivos así de grandes usá la exportación por línea de comandos '
+            '(<code>python -m exportador export</code>).</div>',
+            unsafe_allow_html=True
+        )
+
 logo_path = "Screenshot_46.jpg"
 youtube_link = "https://www.youtube.com/@QAtotheSoftware"
 logo_base64 = image_to_base64(logo_path)
@@ -185,7 +230,8 @@ def limpiar_inputs():
         st.session_state['project_radio'] = "Todos los proyectos"
         st.session_state['proj_input'] = ""
         # Limpiar posibles estados auxiliares usados durante el procesamiento
-        for aux in ['procesar', 'all_data', 'progress', 'status_text']:
+        for aux in ['procesar', 'all_data', 'progress', 'status_text', 'export_job_id',
+                    'store_trend_table', 'store_export_file', 'preflight', 'explorer_file']:
             if aux in st.session_state:
                 del st.session_state[aux]
     except Exception:
@@ -207,223 +253,6 @@ def limpiar_inputs():
         pass
 
 
-# --- Sesión HTTP persistente ---
-session = requests.Session()
-
-# --- Funciones de conexión con Azure DevOps ---
-def get_projects(organization, api_version, username, token):
-    url = f"https://dev.azure.com/{organization}/_apis/projects?api-version={api_version}"
-    response = session.get(url, auth=HTTPBasicAuth(username, token))
-    return response.json().get('value', []) if response.status_code == 200 else []
-
-def get_all_test_plans(organization, project, api_version, username, token):
-    url = f"https://dev.azure.com/{organization}/{project}/_apis/testplan/plans?api-version={api_version}"
-    response = session.get(url, auth=HTTPBasicAuth(username, token))
-    return response.json().get('value', []) if response.status_code == 200 else []
-
-def api_get_all(url, auth, params=None):
-    """Realiza llamadas GET manejando paginación."""
-    all_items = []
-    params = params.copy() if params else {}
-    while True:
-        resp = session.get(url, auth=auth, params=params)
-        if resp.status_code != 200:
-            return all_items
-        j = resp.json()
-        items = j.get('value') or j.get('members') or []
-        all_items.extend(items)
-
-        cont = resp.headers.get('x-ms-continuationtoken') or resp.headers.get('x-ms-continuation-token') or j.get('continuationToken')
-        if not cont:
-            break
-        params['continuationToken'] = cont
-    return all_items
-
-def _flatten_suites(nodes):
-    """Aplana una estructura de suites en árbol."""
-    flat = []
-    for n in nodes:
-        flat.append(n)
-        children = n.get('children') or []
-        if children:
-            flat.extend(_flatten_suites(children))
-    return flat
-
-def get_test_suites(organization, project, plan_id, api_version, username, token):
-    url = f"https://dev.azure.com/{organization}/{project}/_apis/testplan/plans/{plan_id}/suites?asTreeView=True&api-version={api_version}"
-    auth = HTTPBasicAuth(username, token)
-    suites = api_get_all(url, auth)
-    if not suites:
-        return []
-    return _flatten_suites(suites)
-
-def get_test_runs(organization, project, plan_id, api_version, username, token):
-    url = f"https://dev.azure.com/{organization}/{project}/_apis/test/runs?planId={plan_id}&api-version={api_version}"
-    auth = HTTPBasicAuth(username, token)
-    return api_get_all(url, auth)
-
-def get_run_results(organization, project, run_id, api_version, username, token):
-    url = f"https://dev.azure.com/{organization}/{project}/_apis/test/runs/{run_id}/results?api-version={api_version}"
-    auth = HTTPBasicAuth(username, token)
-    return api_get_all(url, auth)
-
-def get_test_points(organization, project, plan_id, suite_id, api_version, username, token):
-    url = f"https://dev.azure.com/{organization}/{project}/_apis/testplan/plans/{plan_id}/suites/{suite_id}/testpoints?api-version={api_version}"
-    auth = HTTPBasicAuth(username, token)
-    return api_get_all(url, auth)
-
-def get_test_cases_in_suite(organization, project, plan_id, suite_id, api_version, username, token):
-    """Devuelve la lista de test case references en una suite."""
-    url = f"https://dev.azure.com/{organization}/{project}/_apis/test/Plans/{plan_id}/Suites/{suite_id}/testcases?api-version={api_version}"
-    auth = HTTPBasicAuth(username, token)
-    items = api_get_all(url, auth)
-    testcases = []
-    for it in items:
-        tc = it.get('testCase') or it.get('testCaseReference') or it
-        tc_id = None
-        tc_name = None
-        if isinstance(tc, dict):
-            tc_id = tc.get('id') or tc.get('testCaseId') or tc.get('workItemId')
-            tc_name = tc.get('name') or (tc.get('fields') or {}).get('System.Title') or tc.get('testCaseTitle')
-        else:
-            tc_id = it.get('id')
-            tc_name = it.get('name')
-
-        if tc_id:
-            testcases.append({'id': str(tc_id), 'name': tc_name})
-    return testcases
-
-def get_workitems_titles(organization, ids, api_version='7.0', username=None, token=None):
-    """Obtiene títulos de work items en lote."""
-    if not ids:
-        return {}
-    out = {}
-    chunk_size = 50
-    auth = HTTPBasicAuth(username, token)
-    for i in range(0, len(ids), chunk_size):
-        chunk = ids[i:i+chunk_size]
-        ids_param = ",".join(map(str, chunk))
-        url = f"https://dev.azure.com/{organization}/_apis/wit/workitems?ids={ids_param}&fields=System.Title&api-version={api_version}"
-        resp = session.get(url, auth=auth)
-        if resp.status_code != 200:
-            continue
-        j = resp.json()
-        for wi in j.get('value', []):
-            wid = str(wi.get('id'))
-            title = (wi.get('fields') or {}).get('System.Title')
-            out[wid] = title
-    return out
-
-def fetch_data_for_project(organization, project_name, plan_id, plan_name, plan_iteration, 
-                          api_version_suites, api_version_runs, api_version_points, 
-                          api_version_results, username, token):
-    data = []
-    test_suites = get_test_suites(organization, project_name, plan_id, api_version_suites, username, token)
-
-    all_runs = get_test_runs(organization, project_name, plan_id, api_version_runs, username, token)
-    run_results_map = {}
-    run_info_map = {}
-    for run in all_runs:
-        run_id = run.get('id')
-        run_info_map[run_id] = {'id': run_id, 'name': run.get('name')}
-        results = get_run_results(organization, project_name, run_id, api_version_results, username, token)
-        for r in results:
-            tc = r.get('testCase') or r.get('testCaseReference') or {}
-            tc_id = str(tc.get('id') or tc.get('testCaseId') or tc.get('workItemId') or tc.get('id'))
-            if not tc_id:
-                continue
-            existing = run_results_map.get(tc_id)
-            r_date = r.get('completedDate') or r.get('dateCompleted')
-            if existing:
-                existing_date = existing.get('completedDate') or existing.get('dateCompleted')
-                if existing_date and r_date and existing_date >= r_date:
-                    continue
-            r['_run_id'] = run_id
-            r['_run_name'] = run.get('name')
-            tc_name = None
-            if isinstance(tc, dict):
-                tc_name = tc.get('name') or (tc.get('fields') or {}).get('System.Title') or tc.get('testCaseTitle')
-            if tc_name:
-                r['_testcase_name'] = tc_name
-            run_results_map[tc_id] = r
-
-    for suite in test_suites:
-        suite_id = suite.get('id')
-        suite_name = suite.get('name')
-        iteration_path = plan_iteration
-
-        testcases = get_test_cases_in_suite(organization, project_name, plan_id, suite_id, api_version_points, username, token)
-        test_points = get_test_points(organization, project_name, plan_id, suite_id, api_version_points, username, token)
-        points_map = {}
-        for p in test_points:
-            tc_ref = p.get('testCaseReference') or p.get('testCase') or {}
-            tcid = str(tc_ref.get('id')) if tc_ref else None
-            if tcid:
-                points_map[tcid] = p
-
-        for tc in testcases:
-            tcid = tc.get('id')
-            tcname = tc.get('name')
-            result = run_results_map.get(tcid)
-            if result:
-                data.append({
-                    "Project Name": project_name,
-                    "Plan Name": plan_name,
-                    "Plan ID": plan_id,
-                    "Suite ID": suite_id,
-                    "Suite Name": suite_name,
-                    "Run ID": result.get('_run_id'),
-                    "Run Name": result.get('_run_name'),
-                    "Test Case ID": tcid,
-                    "Test Case Name": tcname,
-                    "Outcome": result.get('outcome'),
-                    "Executed By": (result.get('runBy') or {}).get('displayName'),
-                    "Execution Date": result.get('completedDate') or result.get('dateCompleted'),
-                    "Iteration Path": iteration_path
-                })
-            else:
-                p = points_map.get(tcid)
-                if p:
-                    last = p.get('results') or p.get('lastResultDetails') or {}
-                    outcome = last.get('outcome') or ("Active" if not last else last.get('outcome'))
-                    executed_by = (last.get('runBy') or {}).get('displayName')
-                    date_completed = last.get('dateCompleted') or last.get('completedDate')
-                else:
-                    outcome = "Not Executed"
-                    executed_by = None
-                    date_completed = None
-
-                data.append({
-                    "Project Name": project_name,
-                    "Plan Name": plan_name,
-                    "Plan ID": plan_id,
-                    "Suite ID": suite_id,
-                    "Suite Name": suite_name,
-                    "Run ID": None,
-                    "Run Name": None,
-                    "Test Case ID": tcid,
-                    "Test Case Name": tcname,
-                    "Outcome": outcome,
-                    "Executed By": executed_by,
-                    "Execution Date": date_completed,
-                    "Iteration Path": iteration_path
-                })
-
-    missing_ids = [str(row['Test Case ID']) for row in data if not row.get('Test Case Name')]
-    if missing_ids:
-        titles = get_workitems_titles(organization, missing_ids, username=username, token=token)
-        for row in data:
-            if not row.get('Test Case Name'):
-                row['Test Case Name'] = titles.get(str(row['Test Case ID']))
-
-    for row in data:
-        if not row.get('Test Case Name'):
-            rr = run_results_map.get(str(row['Test Case ID']))
-            if rr and rr.get('_testcase_name'):
-                row['Test Case Name'] = rr.get('_testcase_name')
-
-    return data
-
 # --- Interfaz de usuario ---
 
 
@@ -462,18 +291,199 @@ if project_option == "Proyecto específico":
 
 # (panel de depuración eliminado)
 
+output_format = st.selectbox(
+    "Formato de salida", list(OUTPUT_FORMATS),
+    format_func=lambda f: OUTPUT_FORMATS[f]['label'], key="format_input",
+    help="Excel admite hasta 1.048.576 filas por hoja. CSV, JSON Lines y Parquet no tienen "
+         "ese límite; Parquet guarda Plan ID, Suite ID y Run ID como enteros y "
+         "Execution Date como fecha."
+)
+
+include_run_names = st.checkbox(
+    "Incluir nombre de run (más lento: recorre todos los runs y sus resultados)",
+    value=False, key="run_names_input",
+    help="Sin esta opción cada fila se arma con el último resultado de cada test point: "
+         "'Run Name' queda vacío, 'Run ID' es el último run del test point y el resultado "
+         "es el último de la suite. Con la opción se toma el resultado más reciente del "
+         "test case en todo el plan."
+)
+
+include_history = st.checkbox(
+    "Historial completo (todos los resultados de todos los runs)",
+    value=False, key="history_input",
+    help="Una fila por cada resultado de cada run, ordenadas por fecha de ejecución, en lugar "
+         "de solo el último resultado de cada test case. Recorre todos los runs como la opción anterior."
+)
+
+include_summary = st.checkbox(
+    "Hojas de resumen", value=False, key="summary_input",
+    help="Pass rate por plan, suite e iteración, casos inestables (outcome que cambia entre "
+         "ejecuciones) y ejecuciones por tester. En Excel se agregan al mismo archivo; en los otros "
+         "formatos se descargan aparte. Con el historial completo los resúmenes cubren todas las ejecuciones."
+)
+
+with st.expander("🔎 Filtros"):
+    plans_filter = st.text_input(
+        "Planes", key="plans_filter_input",
+        help="IDs o nombres de planes separados por coma. Admite comodines, por ejemplo: Release*, 1234."
+    )
+    iteration_filter = st.text_input(
+        "Ruta de iteración", key="iteration_filter_input",
+        help="Solo planes de esta iteración o de sus iteraciones hijas, por ejemplo: Proyecto\\Sprint 12."
+    )
+    suites_filter = st.text_input(
+        "Suites", key="suites_filter_input",
+        help="IDs o nombres de suites separados por coma. Se exportan esas suites y todas sus hijas; "
+             "las demás no se descargan."
+    )
+    use_date_filter = st.checkbox("Filtrar por fecha de ejecución", value=False, key="date_filter_input")
+    date_range = None
+    if use_date_filter:
+        today = datetime.date.today()
+        date_range = st.date_input(
+            "Rango de fechas", value=(today - datetime.timedelta(days=14), today), key="date_range_input",
+            help="Con 'Incluir nombre de run' solo se consultan los runs actualizados en el rango."
+        )
+    run_states_filter = st.multiselect(
+        "Estados de run", RUN_STATES, key="run_states_input",
+        help="Solo se consideran los runs en estos estados (vacío: todos). Aplica con 'Incluir nombre de run'."
+    )
+    outcomes_filter = st.multiselect(
+        "Outcomes", OUTCOMES, key="outcomes_input",
+        help="Solo se exportan las filas con estos resultados (vacío: todos)."
+    )
+
+with st.expander("⚙️ Opciones avanzadas"):
+    max_workers = st.number_input(
+        "Descargas concurrentes de resultados de runs",
+        min_value=1, max_value=32, value=MAX_WORKERS, step=1, key="max_workers_input",
+        help="Cantidad máxima de runs cuyos resultados se descargan en paralelo por plan."
+    )
+    workers = st.number_input(
+        "Procesos en paralelo",
+        min_value=1, max_value=16, value=1, step=1, key="workers_input",
+        help="Reparte los planes entre varios procesos. Cada proceso escribe un archivo parcial "
+             "y al final se unen en un único Excel."
+    )
+    use_run_cache = st.checkbox(
+        "Usar caché local de runs completados", value=True, key="run_cache_input",
+        help="Los resultados de runs completados se guardan en disco y no se vuelven a descargar "
+             "en las siguientes exportaciones."
+    )
+    rebuild_run_cache = st.checkbox(
+        "Reconstruir caché", value=False, key="rebuild_cache_input",
+        help="Vacía la caché antes de exportar y vuelve a descargar todos los runs."
+    )
+    use_checkpoint = st.checkbox(
+        "Guardar progreso por plan", value=True, key="checkpoint_input",
+        help="Cada plan terminado se guarda en disco. Si la exportación se interrumpe "
+             "(recarga de la página, corte de conexión, reinicio o error), se puede reanudar."
+    )
+    resume_export = st.checkbox(
+        "Reanudar exportación interrumpida", value=False, key="resume_input",
+        help="Con los mismos parámetros y el mismo token, solo se descargan los planes que faltaban. "
+             f"El progreso guardado hace más de {CHECKPOINT_MAX_AGE // 3600} horas no se reanuda."
+    )
+    use_store = st.checkbox(
+        "Guardar en el almacén local", value=True, key="store_input",
+        help="Las filas exportadas se guardan en disco para consultar tendencias y volver a "
+             "exportarlas sin descargar de nuevo (ver \"Almacén local\" al final de la página)."
+    )
+    use_explorer = st.checkbox(
+        "Explorar los resultados en la app", value=False, key="explore_input",
+        help="Después de exportar se pueden filtrar y recorrer las filas por páginas sin abrir el "
+             "archivo, y descargar solo las filtradas. Las filas quedan en memoria del servidor "
+             "(unos 200 MB por millón de filas) mientras la exportación esté disponible (30 minutos)."
+    )
+    engine_label = st.selectbox(
+        "Motor de descarga", list(ENGINE_LABELS), key="engine_input",
+        help="El motor asíncrono (requiere httpx) recorre varios planes a la vez con un único "
+             "límite de peticiones en vuelo. OData (Analytics) arma cada plan con una consulta a "
+             "Analytics en vez de una por suite y por run; no admite el historial completo."
+    )
+
 
 username = ""
 
+# Parámetros que definen qué planes analiza el pre-flight: si cambian, su selección deja de valer
+preflight_key = (organization_input, project_option, project_name, plans_filter, iteration_filter, suites_filter,
+                 include_run_names, include_history, date_range and tuple(date_range), tuple(run_states_filter))
+
 # --- Botones lado a lado ---
-col1, col2 = st.columns([1, 1])
+col1, col2, col3 = st.columns([1, 1, 1])
 
 with col1:
     procesar = st.button("🔄 Procesar resultados 🧪", key="procesar")
 
 with col2:
+    analizar = st.button("🔍 Analizar planes", key="analizar",
+                         help="Lista los planes con sus suites y runs y estima las peticiones y el tiempo de "
+                              "exportarlos, para elegir cuáles exportar. Es rápido: no descarga resultados.")
+
+with col3:
     st.button("🧹 Limpiar", on_click=limpiar_inputs)
 
+# --- Análisis previo (pre-flight) ---
+if analizar:
+    if not organization_input or not token_input or (project_option == "Proyecto específico" and not project_name):
+        st.markdown('<div class="custom-error">Por favor completá todos los campos.</div>', unsafe_allow_html=True)
+    else:
+        scan_progress = st.progress(0)
+        scan_status = st.empty()
+
+        def update_scan(done, total, unit):
+            scan_progress.progress(int(done / total * 100))
+            scan_status.text(f"🔍 Analizando plan: {unit['plan_name']} - {unit['project']} ({done}/{total})")
+
+        try:
+            st.session_state['preflight'] = (preflight_key, scan(
+                organization_input, project_name if project_option == "Proyecto específico" else None,
+                username, token_input, plans=parse_patterns(plans_filter), iteration=iteration_filter or None,
+                mode="history" if include_history else "runs" if include_run_names else "points",
+                suites=parse_patterns(suites_filter),
+                min_date=date_range[0].isoformat() if date_range else None,
+                max_date=date_range[-1].isoformat() if date_range else None,
+                run_states=run_states_filter or None,
+                cache_path=DEFAULT_CACHE_PATH if use_run_cache and not rebuild_run_cache else None,
+                max_workers=int(max_workers), progress=update_scan,
+            ))
+        except Exception as e:
+            st.error(f"Error durante el análisis: {str(e)}")
+        scan_progress.empty()
+        scan_status.empty()
+
+# Planes elegidos en el pre-flight (None si no hay un análisis vigente para estos parámetros)
+selected_plans = None
+preflight = st.session_state.get('preflight')
+if preflight and preflight[0] == preflight_key:
+    report = preflight[1]
+    if not report['plans']:
+        st.markdown('<div class="custom-warning">No hay planes que coincidan con los filtros.</div>',
+                    unsafe_allow_html=True)
+    else:
+        st.caption(f"Análisis: {report['scan_requests']} peticiones en {report['scan_seconds']} s. "
+                   "Las estimaciones usan la latencia medida y suponen un proceso y el motor de hilos.")
+        plans_table = [{
+            'Exportar': True,
+            'Proyecto': p['project'],
+            'Plan': p['plan_name'],
+            'ID': p['plan_id'],
+            'Suites': p['suites'],
+            'Runs': p['runs'],
+            'Runs en caché': p['cached_runs'],
+            'Peticiones (est.)': p['requests'],
+            'Tiempo (est., s)': p['seconds'],
+        } for p in report['plans']]
+        edited = st.data_editor(
+            plans_table, key="preflight_editor", hide_index=True,
+            disabled=[c for c in plans_table[0] if c != 'Exportar'],
+        )
+        chosen = [row for row in edited if row['Exportar']]
+        selected_plans = [str(row['ID']) for row in chosen]
+        minutes, seconds = divmod(int(round(sum(row['Tiempo (est., s)'] for row in chosen))), 60)
+        st.markdown(f"**{len(chosen)} de {len(edited)} planes**: ~{int(sum(row['Peticiones (est.)'] for row in chosen))} "
+                    f"peticiones, ~{minutes} min {seconds} s")
+
 # Si el callback de limpiar marcó la necesidad de un rerun, hacerlo aquí (fuera del callback)
 try:
     if st.session_state.get('_do_rerun'):
@@ -494,6 +504,8 @@ except Exception:
 if procesar:
     if not organization_input or not token_input or (project_option == "Proyecto específico" and not project_name):
         st.markdown('<div class="custom-error">Por favor completá todos los campos.</div>', unsafe_allow_html=True)
+    elif selected_plans == []:
+        st.markdown('<div class="custom-error">Marcá al menos un plan en el análisis.</div>', unsafe_allow_html=True)
     else:
         try:
             # USO LOCAL del token (leer y eliminar del session_state para que no quede en el DOM)
@@ -522,96 +534,52 @@ if procesar:
             except Exception:
                 pass
             
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            def update_progress(progress, message):
-                progress_bar.progress(progress)
-                status_text.text(message)
-            
-            update_progress(0, "Iniciando exportación...")
-            
-            api_version = "7.1-preview.1"
-            api_version_suites = "7.1-preview.1"
-            api_version_runs = "7.1-preview.3"
-            api_version_points = "7.1"
-            api_version_results = "7.1-preview.3"
-            all_data = []
+            export_options = {
+                'max_workers': int(max_workers),
+                'mode': "history" if include_history else "runs" if include_run_names else "points",
+                'suites': parse_patterns(suites_filter),
+                'run_states': run_states_filter or None,
+                'outcomes': outcomes_filter or None,
+            }
+            if date_range:
+                export_options['min_date'] = date_range[0].isoformat()
+                export_options['max_date'] = date_range[-1].isoformat()
+            if use_run_cache:
+                export_options['cache_path'] = DEFAULT_CACHE_PATH
+                if rebuild_run_cache:
+                    run_cache = RunCache(DEFAULT_CACHE_PATH)
+                    run_cache.clear()
+                    run_cache.close()
             
-            if project_option == "Todos los proyectos":
-                update_progress(10, "Obteniendo lista de proyectos...")
-                projects = get_projects(organization, api_version, username, token)
-                
-                total_projects = len(projects)
-                for i, project in enumerate(projects):
-                    project_name_iter = project['name']
-                    update_progress(10 + int(i/total_projects*60), 
-                                  f"📁 Procesando proyecto: {project_name_iter} ({i+1}/{total_projects})")
-                    
-                    plans = get_all_test_plans(organization, project_name_iter, api_version, username, token)
-                    total_plans = len(plans)
-                    for j, plan in enumerate(plans):
-                        update_progress(10 + int(i/total_projects*60) + int(j/total_plans*30), 
-                                      f"📦 Procesando plan: {plan['name']}")
-                        
-                        data = fetch_data_for_project(
-                            organization, project_name_iter, plan['id'], plan['name'], plan.get('iteration', "N/A"),
-                            api_version_suites, api_version_runs, api_version_points, api_version_results,
-                            username, token
-                        )
-                        all_data.extend(data)
-            else:
-                if project_name:
-                    update_progress(20, f"Procesando proyecto específico: {project_name}")
-                    plans = get_all_test_plans(organization, project_name, api_version, username, token)
-                    
-                    total_plans = len(plans)
-                    for j, plan in enumerate(plans):
-                        update_progress(20 + int(j/total_plans*70), 
-                                      f"📦 Procesando plan: {plan['name']} ({j+1}/{total_plans})")
-                        
-                        data = fetch_data_for_project(
-                            organization, project_name, plan['id'], plan['name'], plan.get('iteration', "N/A"),
-                            api_version_suites, api_version_runs, api_version_points, api_version_results,
-                            username, token
-                        )
-                        all_data.extend(data)
-            
-            update_progress(95, "Generando archivo Excel...")
+            # Checkpoint propio de estos parámetros y este token: una exportación cortada se retoma al repetirla
+            plans_patterns = parse_patterns(plans_filter)
+            if selected_plans is not None:
+                # Solo los planes marcados en el análisis previo (sus metadatos ya están en caché)
+                plans_patterns = selected_plans
+            export_project = project_name if project_option == "Proyecto específico" else None
+            checkpoint_dir = None
+            if use_checkpoint:
+                checkpoint_dir = checkpoint_dir_for(organization, export_project, username, token,
+                                                    plans=plans_patterns, iteration=iteration_filter or None,
+                                                    **export_options)
+                saved = checkpoint_status(checkpoint_dir)
+                if saved and saved[0] and resume_export:
+                    if checkpoint_expired(checkpoint_dir):
+                        st.warning(f"El progreso guardado tiene más de {CHECKPOINT_MAX_AGE // 3600} horas: "
+                                   "se descarta y la exportación empieza de cero.")
+                    else:
+                        st.info(f"Se reanuda la exportación interrumpida: {saved[0]} de {saved[1]} planes ya estaban guardados.")
             
-            if all_data:
-                df = pd.DataFrame(all_data)
-                
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    df.to_excel(writer, index=False, sheet_name='Resultados')
-                
-                excel_data = output.getvalue()
-                
-                update_progress(100, "¡Exportación completada!")
-                time.sleep(0.5)
-                
-                progress_bar.empty()
-                status_text.empty()
-                
-                b64 = base64.b64encode(excel_data).decode()
-                href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="test_results.xlsx" id="download-link">Descargar archivo</a>'
-                st.markdown(href, unsafe_allow_html=True)
-                
-                st.markdown(
-                    """
-                    <script>
-                        document.getElementById('download-link').click();
-                    </script>
-                    """,
-                    unsafe_allow_html=True
+            # La exportación corre en segundo plano: sobrevive a los reruns y esta sesión solo sigue su avance
+            with st.spinner("Obteniendo lista de proyectos y planes..."):
+                st.session_state['export_job_id'] = job_manager.submit(
+                    organization, export_project, username, token, output_format,
+                    workers=int(workers), plans=plans_patterns, iteration=iteration_filter or None,
+                    engine=ENGINE_LABELS[engine_label], checkpoint_dir=checkpoint_dir,
+                    resume=resume_export, summary=include_summary,
+                    store_path=DEFAULT_STORE_PATH if use_store else None, explore=use_explorer,
+                    **export_options
                 )
-                
-                st.markdown('<div class="custom-success">¡Los resultados fueron procesados correctamente!</div>', unsafe_allow_html=True)
-            else:
-                progress_bar.empty()
-                status_text.empty()
-                st.markdown('<div class="custom-warning">No se encontraron datos para exportar.</div>', unsafe_allow_html=True)
         
         except Exception as e:
             st.error(f"Error durante el procesamiento: {str(e)}")
@@ -630,3 +598,243 @@ if procesar:
                 pass
         
         del token
+
+# --- Seguimiento de la exportación en segundo plano ---
+export_job = job_manager.get(st.session_state.get('export_job_id'))
+if export_job:
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    def update_progress(progress, message):
+        progress_bar.progress(progress)
+        status_text.text(message)
+    
+    if export_job.subscribers > 1 and not export_job.done:
+        st.caption("Otra sesión pidió la misma exportación: se comparte el mismo trabajo.")
+    while not export_job.done:
+        ahead = job_manager.queue_position(export_job)
+        if ahead:
+            update_progress(0, f"En cola: {ahead} exportaciones antes que esta...")
+        else:
+            update_progress(export_job.progress, export_job.message)
+        time.sleep(JOB_POLL_SECONDS)
+    
+    progress_bar.empty()
+    status_text.empty()
+    output_name = f"test_results.{export_job.output_format}"
+    if export_job.error:
+        st.error(f"Error durante el procesamiento: {export_job.error}")
+    elif export_job.rows:
+        # El archivo se descarga desde disco: como estático si está habilitado,
+        # si no con un botón que lo lee recién al hacer clic (ver download_from_disk)
+        static_root = STATIC_DIR if st.get_option("server.enableStaticServing") else None
+        download_path, download_url = export_job.publish(output_name, static_root)
+        if download_url:
+            st.markdown(
+                f'<a href="{download_url}" download="{output_name}" id="download-link">📥 Descargar archivo</a>',
+                unsafe_allow_html=True
+            )
+        else:
+            download_from_disk("📥 Descargar archivo", download_path, output_name,
+                               OUTPUT_FORMATS[export_job.output_format]['mime'])
+        if export_job.has_summary_file:
+            summary_name = "test_results.summary.xlsx"
+            summary_path, summary_url = export_job.publish(summary_name, static_root, summary=True)
+            if summary_url:
+                st.markdown(f'<a href="{summary_url}" download="{summary_name}">📊 Descargar resúmenes</a>',
+                            unsafe_allow_html=True)
+            else:
+                download_from_disk("📊 Descargar resúmenes", summary_path, summary_name, OUTPUT_FORMATS['xlsx']['mime'])
+        
+        st.markdown('<div class="custom-success">¡Los resultados fueron procesados correctamente!</div>', unsafe_allow_html=True)
+
+        # Explorador: filtros y conteos sobre las filas codificadas en el servidor; al navegador va solo la página
+        explorer = export_job.explorer
+        if explorer is not None:
+            # pandas y numpy se cargan solo si hay algo para explorar
+            from exportador.explorer import DEFAULT_PAGE_SIZE, FILTER_COLUMNS
+            page_sizes = sorted({*EXPLORER_PAGE_SIZES, DEFAULT_PAGE_SIZE})
+            with st.expander("🔍 Explorar resultados", expanded=True):
+                explorer_keys = {column: f"explorer_{export_job.id}_{column}" for column in FILTER_COLUMNS}
+                explorer_filters = {column: st.session_state.get(key, []) for column, key in explorer_keys.items()}
+                for filter_col, column in zip(st.columns(len(FILTER_COLUMNS)), FILTER_COLUMNS):
+                    # Cantidad de filas de cada valor con los filtros de las otras columnas
+                    counts = dict(explorer.value_counts(column, explorer_filters))
+                    options = list(counts) + [v for v in explorer_filters[column] if v not in counts]
+                    with filter_col:
+                        explorer_filters[column] = st.multiselect(
+                            column, options, key=explorer_keys[column],
+                            format_func=lambda v, counts=counts: f"{'(vacío)' if v is None else v} ({counts.get(v, 0)})"
+                        )
+
+                filtered_rows = explorer.count(explorer_filters)
+                page_col, size_col = st.columns([1, 1])
+                with size_col:
+                    page_size = st.selectbox("Filas por página", page_sizes,
+                                             index=page_sizes.index(DEFAULT_PAGE_SIZE),
+                                             key=f"explorer_{export_job.id}_page_size")
+                pages = max(1, -(-filtered_rows // page_size))
+                page_key = f"explorer_{export_job.id}_page"
+                # Si los filtros dejan menos páginas, se vuelve a la última que existe
+                if st.session_state.get(page_key, 1) > pages:
+                    st.session_state[page_key] = pages
+                with page_col:
+                    page_number = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages,
+                                                  step=1, key=page_key)
+                page_frame, _ = explorer.page(explorer_filters, int(page_number) - 1, page_size)
+                first_row = (int(page_number) - 1) * page_size
+                st.caption(f"Filas {first_row + 1 if filtered_rows else 0}–{first_row + len(page_frame)} de "
+                           f"{filtered_rows} (de {len(explorer)} exportadas).")
+                st.dataframe(page_frame, hide_index=True)
+
+                if st.button("📄 Preparar descarga de las filas filtradas", key=f"explorer_{export_job.id}_export",
+                             disabled=not filtered_rows):
+                    fd, filtered_path = tempfile.mkstemp(prefix="test_results-", suffix=f".{export_job.output_format}")
+                    os.close(fd)
+                    written = write_rows(explorer.rows(explorer_filters), filtered_path, export_job.output_format)
+                    st.session_state['explorer_file'] = (
+                        export_job.id, written,
+                        publish_export(filtered_path, f"test_results.filtered.{export_job.output_format}", static_root),
+                    )
+                explorer_file = st.session_state.get('explorer_file')
+                if explorer_file and explorer_file[0] == export_job.id:
+                    _, filtered_written, (filtered_path, filtered_url) = explorer_file
+                    filtered_name = f"test_results.filtered.{export_job.output_format}"
+                    st.caption(f"{filtered_written} filas filtradas listas para descargar.")
+                    if filtered_url:
+                        st.markdown(f'<a href="{filtered_url}" download="{filtered_name}">📥 Descargar filas filtradas</a>',
+                                    unsafe_allow_html=True)
+                    elif os.path.exists(filtered_path):
+                        download_from_disk("📥 Descargar filas filtradas", filtered_path, filtered_name,
+                                           OUTPUT_FORMATS[export_job.output_format]['mime'])
+    else:
+        st.markdown('<div class="custom-warning">No se encontraron datos para exportar.</div>', unsafe_allow_html=True)
+    
+    # Reporte de endpoints que fallaron aun después de reintentar
+    failures = export_job.failures
+    if failures:
+        st.markdown(
+            f'<div class="custom-warning">⚠️ {len(failures)} llamadas a la API fallaron después de '
+            'reintentar. Los datos de esos endpoints pueden estar incompletos.</div>',
+            unsafe_allow_html=True
+        )
+        st.dataframe(failures)
+
+    # Planes que no se pudieron exportar: sus filas no están en el archivo
+    skipped_plans = export_job.skipped_plans
+    if skipped_plans:
+        st.markdown(
+            f'<div class="custom-warning">⚠️ {len(skipped_plans)} planes no se pudieron exportar y '
+            'sus filas no están en el archivo.</div>',
+            unsafe_allow_html=True
+        )
+        st.dataframe(skipped_plans)
+
+    # Uso de la caché de metadatos (proyectos, planes y suites) en esta exportación
+    hits, revalidated, misses = (export_job.metadata[k] for k in ('hits', 'revalidated', 'misses'))
+    if hits or revalidated or misses:
+        st.caption(f"Caché de metadatos: {hits} aciertos, {revalidated} revalidados (304), {misses} descargados")
+    
+    # Métricas de rendimiento: peticiones por endpoint y tiempo por proyecto y plan
+    export_stats = export_job.stats
+    with st.expander("📊 Rendimiento de la exportación"):
+        col_time, col_requests, col_retries, col_mb = st.columns(4)
+        col_time.metric("Duración", f"{export_stats['seconds']} s")
+        col_requests.metric("Peticiones", export_stats['requests'])
+        col_retries.metric("Reintentos", export_stats['retries'])
+        col_mb.metric("Descargado", f"{export_stats['mb']} MB")
+        if export_stats['endpoints']:
+            st.markdown("**Por endpoint** (latencias en ms)")
+            st.dataframe(export_stats['endpoints'], hide_index=True)
+        if export_stats['projects']:
+            st.markdown("**Por proyecto**")
+            st.dataframe(export_stats['projects'], hide_index=True)
+            st.markdown("**Por plan** (del más lento al más rápido)")
+            st.dataframe(export_stats['plans'], hide_index=True)
+        st.download_button(
+            "📥 Descargar métricas (JSON)", data=json.dumps(export_stats, ensure_ascii=False, indent=2),
+            file_name="test_results.stats.json", mime="application/json", on_click="ignore"
+        )
+
+# --- Consultas al almacén local (sin descargar de Azure DevOps) ---
+with st.expander("📚 Almacén local: tendencias y exportaciones anteriores"):
+    st.caption("Cada exportación queda guardada en el almacén local. Acá se consulta sin volver a "
+               "Azure DevOps, con los filtros de planes, suites, outcomes y fechas de arriba. "
+               "Se necesitan la organización y el token: solo se muestran los proyectos que ese token ve.")
+    trend_by = st.selectbox("Agrupar por", list(STORE_GROUP_LABELS), key="store_by_input")
+    trend_period = st.selectbox("Período", list(STORE_PERIOD_LABELS), key="store_period_input")
+    store_latest = st.checkbox(
+        "Solo el último resultado de cada test case", value=False, key="store_latest_input",
+        help="Para exportar desde el almacén: sin esta opción se exportan todos los resultados guardados."
+    )
+    store_col1, store_col2 = st.columns([1, 1])
+    with store_col1:
+        show_trend = st.button("📈 Ver tendencia", key="store_trend")
+    with store_col2:
+        export_stored = st.button("📄 Exportar desde el almacén", key="store_export")
+
+    if show_trend or export_stored:
+        if not organization_input or not token_input:
+            st.markdown('<div class="custom-error">Completá la organización y el token.</div>', unsafe_allow_html=True)
+        else:
+            try:
+                # El token solo se usa para saber qué proyectos puede ver
+                visible = [p['name'] for p in get_projects(organization_input, API_VERSIONS['core'], "", token_input)]
+                if project_option == "Proyecto específico":
+                    visible = [p for p in visible if p == project_name]
+                store_filters = {
+                    'projects': visible,
+                    'plans': parse_patterns(plans_filter),
+                    'suites': parse_patterns(suites_filter),
+                    'outcomes': outcomes_filter or None,
+                }
+                if date_range:
+                    store_filters['min_date'] = date_range[0].isoformat()
+                    store_filters['max_date'] = date_range[-1].isoformat()
+                if not visible:
+                    st.info("El token no tiene acceso a ningún proyecto con ese nombre.")
+                else:
+                    store = ResultStore(DEFAULT_STORE_PATH)
+                    try:
+                        if show_trend:
+                            st.session_state['store_trend_table'] = store.trend(
+                                organization_input, by=STORE_GROUP_LABELS[trend_by],
+                                period=STORE_PERIOD_LABELS[trend_period], **store_filters)
+                        else:
+                            fd, stored_path = tempfile.mkstemp(prefix="test_results-", suffix=f".{output_format}")
+                            os.close(fd)
+                            stored_rows = write_rows(store.query_rows(organization_input, latest=store_latest,
+                                                                      **store_filters),
+                                                     stored_path, output_format)
+                            static_root = STATIC_DIR if st.get_option("server.enableStaticServing") else None
+                            st.session_state['store_export_file'] = (
+                                stored_rows, output_format,
+                                publish_export(stored_path, f"test_results.{output_format}", static_root),
+                            )
+                    finally:
+                        store.close()
+            except Exception as e:
+                st.error(f"Error al consultar el almacén: {str(e)}")
+
+    trend_table = st.session_state.get('store_trend_table')
+    if trend_table is not None:
+        if trend_table.empty:
+            st.info("El almacén no tiene resultados con esos filtros.")
+        else:
+            st.dataframe(trend_table, hide_index=True)
+            # Pass rate de cada serie en el tiempo
+            series = [c for c in trend_table.columns if c in STORE_SERIES_COLUMNS]
+            chart = trend_table.assign(Serie=trend_table[series].astype(str).agg(" / ".join, axis=1))
+            st.line_chart(chart.pivot_table(index="Period", columns="Serie", values="Pass Rate %"))
+
+    stored_export = st.session_state.get('store_export_file')
+    if stored_export:
+        stored_rows, stored_format, (stored_path, stored_url) = stored_export
+        stored_name = f"test_results.{stored_format}"
+        st.caption(f"{stored_rows} filas exportadas desde el almacén.")
+        if stored_url:
+            st.markdown(f'<a href="{stored_url}" download="{stored_name}">📥 Descargar archivo del almacén</a>',
+                        unsafe_allow_html=True)
+        elif os.path.exists(stored_path):
+            download_from_disk("📥 Descargar archivo del almacén", stored_path, stored_name,
+                               OUTPUT_FORMATS[stored_format]['mime'])
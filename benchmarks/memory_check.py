@@ -0,0 +1,152 @@
+"""Memoria pico de los resultados de runs en representación compacta contra los JSON crudos.
+
+Levanta benchmarks/mock_server.py con un plan grande (escenario large_plan:
+20k test cases, 60 runs y unos 720k resultados) y arma dos veces, cada una en
+un proceso aparte, las estructuras intermedias del modo "runs" para ese plan:
+
+- crudo: run_results_map guarda el dict completo del último resultado de
+  cada test case y cada suite su mapa de test points sin reducir, como se
+  exportaba antes;
+- compacto: lo que hace engine.fetch_data_for_project, con los resultados
+  reducidos a engine._RunResult (engine._slim_result y _merge_run_results),
+  los textos repetidos internados (engine._intern) y los test points
+  reducidos con engine._summarize_points.
+
+Las dos recorren los mismos runs y suites del mismo servidor simulado.
+Reporta la memoria pico (RSS) de cada una y devuelve código 1 si la compacta
+no queda por debajo de --max-ratio veces la cruda. También se puede correr
+desde run_benchmarks.py con --memory-check.
+
+    python benchmarks/memory_check.py
+    python benchmarks/memory_check.py --scenario huge
+
+La memoria depende de la máquina y de la versión de Python; lo que se
+compara es la proporción entre las dos medidas en la misma máquina. En los
+escenarios chicos la memoria del intérprete pesa más que los resultados y la
+proporción no llega al máximo: la referencia es large_plan.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from mock_server import ORGANIZATION, SCENARIOS, MockAzureDevOps, SyntheticOrganization
+
+DEFAULT_SCENARIO = "large_plan"
+# La representación compacta tiene que usar como máximo esta fracción de la memoria de la cruda
+DEFAULT_MAX_RATIO = 0.8
+# Páginas grandes para que la prueba tarde menos (no cambian la memoria de las estructuras)
+PAGE_SIZE = 1000
+APPROACHES = ("raw", "compact")
+
+_CHILD_CODE = """
+import json, time
+from exportador.azure import get_run_results, get_test_points, get_test_runs, get_test_suites
+from exportador.engine import (API_VERSIONS, _merge_run_results, _points_by_testcase, _slim_result,
+                               _summarize_points, list_work_units)
+
+def merge_raw(run_results_map, run, results):
+    # Como antes de la representación compacta: el dict completo del resultado más reciente
+    for r in results:
+        tc = r.get('testCase') or r.get('testCaseReference') or {}
+        tc_id = str(tc.get('id') or tc.get('testCaseId') or tc.get('workItemId') or tc.get('id'))
+        if not tc_id:
+            continue
+        existing = run_results_map.get(tc_id)
+        r_date = r.get('completedDate') or r.get('dateCompleted')
+        if existing:
+            existing_date = existing.get('completedDate') or existing.get('dateCompleted')
+            if existing_date and r_date and existing_date >= r_date:
+                continue
+        r['_run_id'] = run.get('id')
+        r['_run_name'] = run.get('name')
+        if isinstance(tc, dict) and tc.get('name'):
+            r['_testcase_name'] = tc['name']
+        run_results_map[tc_id] = r
+
+organization, approach = sys.argv[1], sys.argv[2]
+start = time.perf_counter()
+run_results_map = {}
+point_results = {}
+for unit in list_work_units(organization, None, "", "benchmark"):
+    project, plan_id = unit['project'], unit['plan_id']
+    for run in get_test_runs(organization, project, plan_id, API_VERSIONS['runs'], "", "benchmark"):
+        results = get_run_results(organization, project, run['id'], API_VERSIONS['results'], "", "benchmark")
+        if approach == "raw":
+            merge_raw(run_results_map, run, results)
+        else:
+            _merge_run_results(run_results_map, run, [_slim_result(r) for r in results])
+        del results
+    for suite in get_test_suites(organization, project, plan_id, API_VERSIONS['suites'], "", "benchmark"):
+        points_map = _points_by_testcase(get_test_points(organization, project, plan_id, suite['id'],
+                                                         API_VERSIONS['points'], "", "benchmark"))
+        point_results[suite['id']] = points_map if approach == "raw" else _summarize_points(points_map, "runs")
+print(json.dumps({
+    'results': len(run_results_map),
+    'points': sum(len(p) for p in point_results.values()),
+    'wall_seconds': time.perf_counter() - start,
+    'peak_rss_mb': peak_rss_mb(),
+}))
+"""
+
+
+def measure(base_url, approach):
+    """Arma las estructuras con approach en un proceso nuevo y devuelve cantidades, tiempo y memoria pico."""
+    # Import diferido: run_benchmarks importa este módulo para --memory-check
+    from run_benchmarks import PEAK_RSS_CODE, REPO_DIR
+
+    env = dict(os.environ, AZURE_DEVOPS_URL=base_url,
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-c", PEAK_RSS_CODE + _CHILD_CODE, ORGANIZATION, approach],
+                          env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"La medición {approach} falló:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def check_memory(scenario=DEFAULT_SCENARIO, max_ratio=DEFAULT_MAX_RATIO):
+    """Mide las dos representaciones, imprime las medidas y devuelve la lista de problemas."""
+    mock = MockAzureDevOps(SyntheticOrganization.from_scenario(scenario), page_size=PAGE_SIZE)
+    base_url = mock.start()
+    try:
+        results = {approach: measure(base_url, approach) for approach in APPROACHES}
+    finally:
+        mock.stop()
+
+    for approach, result in results.items():
+        rss = f"{result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] else "n/d"
+        print(f"{approach:<8} {result['results']:>7} resultados  {result['points']:>7} test points  "
+              f"{result['wall_seconds']:>7.2f} s  {rss:>8}")
+
+    raw, compact = results['raw'], results['compact']
+    if (compact['results'], compact['points']) != (raw['results'], raw['points']):
+        return [f"memoria/{scenario}: {compact['results']} resultados y {compact['points']} test points "
+                f"(crudo {raw['results']} y {raw['points']})"]
+    if not compact['peak_rss_mb'] or not raw['peak_rss_mb']:
+        print("No se puede medir la memoria pico en esta plataforma.", file=sys.stderr)
+        return []
+    ratio = compact['peak_rss_mb'] / raw['peak_rss_mb']
+    print(f"compacto / crudo: {ratio:.2f} (máximo {max_ratio:.2f})")
+    if ratio > max_ratio:
+        return [f"memoria/{scenario}: {compact['peak_rss_mb']:.0f} MB, {ratio:.2f} veces la memoria "
+                f"de los resultados crudos (máximo {max_ratio:.2f})"]
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Memoria pico de los resultados de runs en representación compacta contra los JSON crudos.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default=DEFAULT_SCENARIO)
+    parser.add_argument("--max-ratio", type=float, default=DEFAULT_MAX_RATIO,
+                        help="Máxima proporción aceptada entre la memoria compacta y la cruda.")
+    args = parser.parse_args(argv)
+
+    problems = check_memory(args.scenario, args.max_ratio)
+    for problem in problems:
+        print(f"REGRESIÓN {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
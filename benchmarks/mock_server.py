@@ -0,0 +1,483 @@
+"""Servidor local que imita los endpoints de Azure DevOps que usa el exportador.
+
+Genera una organización sintética (determinista para una misma semilla) y
+responde con paginación por continuation token, ETag/304, latencia
+configurable e inyección de 429. También imita las entidades TestPoints y
+TestRuns de Analytics (OData) con el subconjunto de $filter/$select/$expand/
+$apply que usa exportador.odata. Cuenta las peticiones por endpoint para los
+benchmarks.
+
+Uso manual:
+
+    python benchmarks/mock_server.py --scenario medium --port 8080 --latency 0.02
+    AZURE_DEVOPS_URL=http://127.0.0.1:8080 AZURE_DEVOPS_PAT=x python -m exportador export --organization bench
+"""
+import argparse
+import functools
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+ORGANIZATION = "bench"
+
+# Tamaño de las organizaciones sintéticas:
+# projects, plans (por proyecto), suites (por plan), cases (por suite), runs (por plan)
+SCENARIOS = {
+    'small': {'projects': 1, 'plans': 2, 'suites': 3, 'cases': 20, 'runs': 5},
+    'medium': {'projects': 2, 'plans': 4, 'suites': 8, 'cases': 40, 'runs': 15},
+    'huge': {'projects': 2, 'plans': 6, 'suites': 25, 'cases': 100, 'runs': 30},
+    # Un solo plan grande (20k test cases, 60 runs, ~720k resultados): ver memory_check.py
+    'large_plan': {'projects': 1, 'plans': 1, 'suites': 50, 'cases': 400, 'runs': 60},
+}
+
+# Fracción de los test cases del plan que tiene resultado en cada run
+RESULT_COVERAGE = 0.6
+# Uno de cada N test cases no trae nombre en los test points (obliga a pedir títulos)
+UNNAMED_EVERY = 10
+DEFAULT_PAGE_SIZE = 200
+FIRST_RUN_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# Nombre de cada endpoint (mismo criterio que exportador.transport.endpoint_name)
+_ENDPOINTS = [
+    ("odata", re.compile(r"^/[^/]+/[^/]+/_odata/v4\.0-preview/(TestPoints|TestRuns)$")),
+    ("run_results", re.compile(r"^/[^/]+/[^/]+/_apis/test/runs/(\d+)/results$")),
+    ("runs", re.compile(r"^/[^/]+/[^/]+/_apis/test/runs$")),
+    ("testpoints", re.compile(r"^/[^/]+/[^/]+/_apis/testplan/plans/(\d+)/suites/(\d+)/testpoints$")),
+    ("suite_testcases", re.compile(r"^/[^/]+/[^/]+/_apis/test/Plans/(\d+)/Suites/(\d+)/testcases$", re.I)),
+    ("suites", re.compile(r"^/[^/]+/[^/]+/_apis/testplan/plans/(\d+)/suites$")),
+    ("plans", re.compile(r"^/[^/]+/[^/]+/_apis/testplan/plans$")),
+    ("workitems", re.compile(r"^/[^/]+/_apis/wit/workitems(batch)?$")),
+    ("projects", re.compile(r"^/[^/]+/_apis/projects$")),
+]
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class SyntheticOrganization:
+    """Proyectos, planes, suites y runs de una organización ficticia.
+
+    Los resultados de cada run se generan a pedido (con una semilla por run)
+    para que los escenarios grandes no ocupen memoria en el servidor.
+    """
+
+    def __init__(self, projects, plans, suites, cases, runs, seed=1):
+        self.seed = seed
+        self._last_results_lock = threading.Lock()
+        self.projects = {}
+        self.plans = {}
+        next_case = 100000
+        for p in range(projects):
+            name = f"Project{p}"
+            project_plans = []
+            for pl in range(plans):
+                plan_id = (p + 1) * 1000 + pl
+                root = {'id': plan_id * 1000, 'name': f"Plan {plan_id}", 'children': [], 'cases': []}
+                plan_cases = []
+                for s in range(suites):
+                    suite = {'id': plan_id * 1000 + s + 1, 'name': f"Suite {s}", 'children': [], 'cases': []}
+                    # Cada tercera suite cuelga de la anterior para tener árboles con profundidad
+                    parent = root['children'][-1] if s % 3 == 2 and root['children'] else root
+                    parent['children'].append(suite)
+                    for _ in range(cases):
+                        suite['cases'].append(next_case)
+                        plan_cases.append(next_case)
+                        next_case += 1
+                plan = {
+                    'id': plan_id,
+                    'name': f"Plan {plan_id}",
+                    'iteration': f"{name}\\Sprint {pl}",
+                    'project': name,
+                    'root': root,
+                    'cases': plan_cases,
+                    'runs': [{
+                        'id': plan_id * 100 + r,
+                        'name': f"Run {plan_id}-{r}",
+                        'state': "Completed",
+                        'revision': 1,
+                        'plan': {'id': str(plan_id)},
+                        'lastUpdatedDate': _iso(FIRST_RUN_DATE + timedelta(days=r)),
+                    } for r in range(runs)],
+                }
+                self.plans[plan_id] = plan
+                project_plans.append(plan)
+            self.projects[name] = project_plans
+        self.runs = {run['id']: (plan, run) for plan in self.plans.values() for run in plan['runs']}
+        self.suites = {}
+        self.suite_plans = {}
+        for plan in self.plans.values():
+            for suite in self._walk(plan['root']):
+                self.suites[suite['id']] = suite
+                self.suite_plans[suite['id']] = plan['id']
+
+    @classmethod
+    def from_scenario(cls, name, seed=1):
+        return cls(seed=seed, **SCENARIOS[name])
+
+    def _walk(self, suite):
+        yield suite
+        for child in suite['children']:
+            yield from self._walk(child)
+
+    @staticmethod
+    def case_name(case_id):
+        return f"Test case {case_id}"
+
+    @functools.lru_cache(maxsize=64)
+    def run_results(self, run_id):
+        plan, run = self.runs[run_id]
+        rng = random.Random(self.seed * 1000003 + run_id)
+        completed = run['lastUpdatedDate']
+        results = []
+        for case_id in plan['cases']:
+            if rng.random() < RESULT_COVERAGE:
+                results.append({
+                    'id': len(results) + 100000,
+                    'testCase': {'id': str(case_id), 'name': self.case_name(case_id)},
+                    'outcome': rng.choice(("Passed", "Passed", "Passed", "Failed", "Blocked")),
+                    'runBy': {'displayName': rng.choice(("Ana", "Luis", "Marta", "Pedro"))},
+                    'completedDate': completed,
+                    'state': "Completed",
+                })
+        return results
+
+    def last_results(self, plan_id):
+        """{case id: (run, resultado)} con el último resultado de cada test case del plan."""
+        # Las suites del plan se piden en paralelo: el primero lo calcula y los demás esperan
+        with self._last_results_lock:
+            return self._last_results(plan_id)
+
+    @functools.lru_cache(maxsize=16)
+    def _last_results(self, plan_id):
+        last = {}
+        # Los runs del plan están en orden de fecha
+        for run in self.plans[plan_id]['runs']:
+            for r in self.run_results(run['id']):
+                last[int(r['testCase']['id'])] = (run, r)
+        return last
+
+    def odata_points(self, plan):
+        """Filas de la entidad TestPoints de Analytics de un plan (con sus navegaciones)."""
+        last = self.last_results(plan['id'])
+        points = []
+        for suite in self._walk(plan['root']):
+            for case_id in suite['cases']:
+                run, r = last.get(case_id, (None, {}))
+                points.append({
+                    'TestPointId': case_id * 10,
+                    'TestPlanId': plan['id'],
+                    'TestSuiteId': suite['id'],
+                    'TestCaseId': case_id,
+                    'LastResultOutcome': r.get('outcome'),
+                    'LastResultCompletedDate': r.get('completedDate'),
+                    'LastResultTestRunId': run['id'] if run else None,
+                    'TestCase': {'Title': self.case_name(case_id)},
+                    'LastResultRunBy': {'UserName': (r.get('runBy') or {}).get('displayName')} if r else None,
+                })
+        return points
+
+    def odata_runs(self, plans):
+        return [{'TestRunId': run['id'], 'Title': run['name'], 'State': run['state'], 'TestPlanId': plan['id']}
+                for plan in plans for run in plan['runs']]
+
+    def test_points(self, suite_id):
+        """Test points de la API REST con el último resultado de cada caso (el mismo que odata_points)."""
+        last = self.last_results(self.suite_plans[suite_id])
+        points = []
+        for case_id in self.suites[suite_id]['cases']:
+            name = None if case_id % UNNAMED_EVERY == 0 else self.case_name(case_id)
+            run, r = last.get(case_id, (None, None))
+            results = {}
+            if r:
+                results = {
+                    'outcome': r['outcome'],
+                    'lastTestRunId': str(run['id']),
+                    'lastResultDetails': {'dateCompleted': r['completedDate'], 'runBy': r['runBy']},
+                }
+            points.append({
+                'id': case_id * 10,
+                'testCaseReference': {'id': case_id, 'name': name},
+                'results': results,
+            })
+        return points
+
+
+class MockAzureDevOps:
+    """Servidor HTTP en un hilo; base_url se usa como AZURE_DEVOPS_URL."""
+
+    def __init__(self, organization, page_size=DEFAULT_PAGE_SIZE, latency=0.0,
+                 throttle_rate=0.0, retry_after=0, seed=1):
+        self.organization = organization
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.counts = {}
+            self.throttled = 0
+            self.not_modified = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': sum(self.counts.values()),
+                'by_endpoint': dict(sorted(self.counts.items())),
+                'throttled': self.throttled,
+                'not_modified': self.not_modified,
+            }
+
+    def start(self, port=0):
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # --- Lógica de cada petición ---
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def _should_throttle(self):
+        with self._lock:
+            if self.throttle_rate and self._rng.random() < self.throttle_rate:
+                self.throttled += 1
+                return True
+            return False
+
+    def _page(self, items, qs):
+        start = int(qs.get('continuationToken', ["0"])[0])
+        headers = {}
+        if start + self.page_size < len(items):
+            headers['x-ms-continuationtoken'] = str(start + self.page_size)
+        chunk = items[start:start + self.page_size]
+        return {'count': len(chunk), 'value': chunk}, headers
+
+    def _odata_page(self, items, path, qs, headers):
+        """Página de una consulta OData con @odata.nextLink (Prefer: odata.maxpagesize)."""
+        prefer = re.search(r"odata\.maxpagesize=(\d+)", headers.get('Prefer') or "")
+        size = int(prefer.group(1)) if prefer else self.page_size
+        start = int(qs.get('$skiptoken', ["0"])[0])
+        payload = {'value': items[start:start + size]}
+        if start + size < len(items):
+            query = {k: v for k, v in qs.items() if k != '$skiptoken'}
+            query['$skiptoken'] = [str(start + size)]
+            payload['@odata.nextLink'] = f"{self.base_url}{path}?{urlencode(query, doseq=True)}"
+        return payload
+
+    def handle(self, method, path, qs, body, headers=None):
+        """Devuelve (status, cuerpo, cabeceras) para una petición."""
+        for endpoint, pattern in _ENDPOINTS:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return 404, {'message': "not found"}, {}
+
+        self._count(endpoint)
+        if self.latency:
+            time.sleep(self.latency)
+        if self._should_throttle():
+            return 429, {'message': "throttled"}, {'Retry-After': str(self.retry_after)}
+
+        org = self.organization
+        parts = path.split("/")
+        project_plans = org.projects.get(parts[2], []) if len(parts) > 2 else []
+        plans = {plan['id']: plan for plan in project_plans}
+
+        if endpoint == "odata":
+            return self._handle_odata(match.group(1), project_plans, path, qs, headers or {})
+        if endpoint == "projects":
+            return 200, {'count': len(org.projects), 'value': [{'name': name} for name in org.projects]}, {}
+        if endpoint == "plans":
+            value = [{'id': p['id'], 'name': p['name'], 'iteration': p['iteration']} for p in project_plans]
+            return 200, {'count': len(value), 'value': value}, {}
+        if endpoint == "suites":
+            plan = plans.get(int(match.group(1)))
+            if not plan:
+                return 404, {'message': "plan not found"}, {}
+
+            def tree(s):
+                return {'id': s['id'], 'name': s['name'], 'children': [tree(c) for c in s['children']]}
+            return 200, {'count': 1, 'value': [tree(plan['root'])]}, {}
+        if endpoint in ("testpoints", "suite_testcases"):
+            plan = plans.get(int(match.group(1)))
+            suite_id = int(match.group(2))
+            if not plan or suite_id not in org.suites:
+                return 404, {'message': "suite not found"}, {}
+            if endpoint == "testpoints":
+                value, headers = self._page(org.test_points(suite_id), qs)
+                return 200, value, headers
+            value = [{'testCase': {'id': str(c), 'name': org.case_name(c)}} for c in org.suites[suite_id]['cases']]
+            return 200, {'count': len(value), 'value': value}, {}
+        if endpoint == "runs":
+            wanted = qs.get('planIds', qs.get('planId', [""]))[0].split(",")
+            min_date = qs.get('minLastUpdatedDate', [None])[0]
+            max_date = qs.get('maxLastUpdatedDate', [None])[0]
+            runs = []
+            for plan in project_plans:
+                if wanted != [""] and str(plan['id']) not in wanted:
+                    continue
+                for run in plan['runs']:
+                    if min_date and not (min_date <= run['lastUpdatedDate'] < max_date):
+                        continue
+                    runs.append(run)
+            value, headers = self._page(runs, qs)
+            return 200, value, headers
+        if endpoint == "run_results":
+            run_id = int(match.group(1))
+            if run_id not in org.runs:
+                return 404, {'message': "run not found"}, {}
+            value, headers = self._page(org.run_results(run_id), qs)
+            return 200, value, headers
+        if endpoint == "workitems":
+            ids = body.get('ids', []) if method == "POST" else qs.get('ids', [""])[0].split(",")
+            value = [{'id': int(i), 'fields': {'System.Title': org.case_name(int(i))}} for i in ids if i]
+            return 200, {'count': len(value), 'value': value}, {}
+        return 404, {'message': "not found"}, {}
+
+    def _handle_odata(self, entity, project_plans, path, qs, headers):
+        option = {k: v[0] for k, v in qs.items()}
+        apply = re.fullmatch(r"filter\((.*)\)/groupby\(\(([^)]*)\)\)", option.get('$apply', ""))
+        expression = apply.group(1) if apply else option.get('$filter')
+        try:
+            keep = _odata_filter(expression)
+        except ValueError as e:
+            return 400, {'message': str(e)}, {}
+        if entity == "TestPoints":
+            items = [p for plan in project_plans for p in self.organization.odata_points(plan) if keep(p)]
+        else:
+            items = [r for r in self.organization.odata_runs(project_plans) if keep(r)]
+        if apply:
+            fields = apply.group(2).split(",")
+            items = [dict(t) for t in dict.fromkeys(tuple((f, item.get(f)) for f in fields) for item in items)]
+        elif '$select' in option:
+            fields = option['$select'].split(",") + re.findall(r"(\w+)\(", option.get('$expand', ""))
+            items = [{f: item.get(f) for f in fields} for item in items]
+        return 200, self._odata_page(items, path, qs, headers), {}
+
+
+# Condiciones de $filter que entiende el servidor: "Campo op valor" y "Campo in (v1,v2)"
+_ODATA_CONDITION = re.compile(r"(\w+) (eq|ne|ge|gt|le|lt) (\S+)$")
+_ODATA_IN = re.compile(r"(\w+) in \(([^)]*)\)$")
+_ODATA_OPERATORS = {
+    'eq': lambda a, b: a == b, 'ne': lambda a, b: a != b,
+    'ge': lambda a, b: a is not None and a >= b, 'gt': lambda a, b: a is not None and a > b,
+    'le': lambda a, b: a is not None and a <= b, 'lt': lambda a, b: a is not None and a < b,
+}
+
+
+def _odata_value(text):
+    return int(text) if text.lstrip("-").isdigit() else text.strip("'")
+
+
+def _odata_filter(expression):
+    """Predicado de un $filter con condiciones unidas por "and"."""
+    checks = []
+    for clause in (expression.split(" and ") if expression else []):
+        match = _ODATA_IN.match(clause)
+        if match:
+            values = {_odata_value(v) for v in match.group(2).split(",")}
+            checks.append(lambda item, f=match.group(1), values=values: item.get(f) in values)
+            continue
+        match = _ODATA_CONDITION.match(clause)
+        if not match:
+            raise ValueError(f"$filter no soportado: {clause}")
+        field, op, value = match.group(1), _ODATA_OPERATORS[match.group(2)], _odata_value(match.group(3))
+        checks.append(lambda item, f=field, op=op, value=value: op(item.get(f), value))
+    return lambda item: all(check(item) for check in checks)
+
+
+def _make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Cabeceras y cuerpo se escriben por separado: sin esto cada respuesta espera el ACK retardado
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _respond(self, method):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+            status, payload, headers = mock.handle(method, url.path, parse_qs(url.query), body, self.headers)
+            data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+            if status == 200 and method == "GET" and self.headers.get('If-None-Match') == etag:
+                with mock._lock:
+                    mock.not_modified += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', "0")
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header('Content-Type', "application/json; charset=utf-8")
+            self.send_header('Content-Length', str(len(data)))
+            if status == 200:
+                self.send_header('ETag', etag)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita Azure DevOps.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="small")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por petición.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fracción de peticiones que reciben 429.")
+    parser.add_argument("--retry-after", type=int, default=0, help="Valor de Retry-After en los 429.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    mock = MockAzureDevOps(SyntheticOrganization.from_scenario(args.scenario, seed=args.seed),
+                           page_size=args.page_size, latency=args.latency, throttle_rate=args.throttle_rate,
+                           retry_after=args.retry_after, seed=args.seed)
+    print(f"Organización '{ORGANIZATION}' en {mock.start(args.port)} (Ctrl+C para terminar)", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(mock.stats(), indent=2))
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Benchmarks de punta a punta del exportador contra el servidor local.
+
+Para cada escenario y modo levanta benchmarks/mock_server.py, ejecuta una
+exportación completa en un proceso aparte y reporta filas, peticiones
+(total y por endpoint), tiempo y memoria pico. Compara contra
+benchmarks/baseline.json y termina con código 1 si algo empeoró más que la
+tolerancia. Cada caso se exporta además con el motor odata y el CSV tiene que
+ser igual al de la API REST (salvo con --no-parity):
+
+    python benchmarks/run_benchmarks.py                       # small y medium
+    python benchmarks/run_benchmarks.py --scenario huge --mode runs
+    python benchmarks/run_benchmarks.py --update-baseline     # guardar la referencia
+    python benchmarks/run_benchmarks.py --memory-check        # más la memoria de los resultados de runs
+
+Con --memory-check también se ejecuta benchmarks/memory_check.py (resultados
+de runs compactos contra crudos en el escenario large_plan).
+
+Las peticiones y filas son deterministas; el tiempo y la memoria dependen de
+la máquina, así que conviene regenerar la referencia en la máquina donde se
+comparan los resultados.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from memory_check import check_memory
+from mock_server import ORGANIZATION, SCENARIOS, MockAzureDevOps, SyntheticOrganization
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+MODES = ("points", "runs")
+
+# Tolerancias antes de considerar que hubo una regresión
+REQUESTS_TOLERANCE = 0.0
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.25
+# Margen absoluto para que el ruido de los escenarios chicos no cuente como regresión
+TIME_SLACK_SECONDS = 0.5
+MEMORY_SLACK_MB = 10.0
+
+# Memoria pico (MB) del proceso hijo; la usa también memory_check.py. En Linux
+# se lee VmHWM: ru_maxrss de RUSAGE_SELF incluye la memoria que tenía el
+# padre (que aloja el servidor simulado) al momento del fork
+PEAK_RSS_CODE = """
+import sys
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            own = next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        pass
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return max(own, children)
+"""
+
+# Se ejecuta en un proceso nuevo para medir la memoria pico de la exportación sola
+_CHILD_CODE = PEAK_RSS_CODE + """
+import json, time
+from exportador.exporter import export_to_file
+from exportador.transport import get_failures
+
+organization, mode, workers, output, engine = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4], sys.argv[5]
+start = time.perf_counter()
+rows = export_to_file(organization, None, "", "benchmark", output, "csv", workers=workers, mode=mode,
+                      engine=engine)
+print(json.dumps({
+    'rows': rows,
+    'wall_seconds': time.perf_counter() - start,
+    'peak_rss_mb': peak_rss_mb(),
+    'failures': len(get_failures()),
+}))
+"""
+
+
+def _output_digest(path):
+    """Huella del CSV exportado, independiente del orden de las filas."""
+    with open(path, "rb") as f:
+        lines = f.read().splitlines()
+    return hashlib.sha256(b"\n".join(sorted(lines))).hexdigest()
+
+
+def run_case(scenario, mode, workers=1, latency=0.0, throttle_rate=0.0, page_size=None, engine="threads"):
+    """Ejecuta una exportación contra un servidor nuevo y devuelve sus métricas.
+
+    'digest' es la huella del CSV exportado (ver _output_digest), para
+    comparar las salidas de distintos motores.
+    """
+    options = {'latency': latency, 'throttle_rate': throttle_rate}
+    if page_size:
+        options['page_size'] = page_size
+    mock = MockAzureDevOps(SyntheticOrganization.from_scenario(scenario), **options)
+    base_url = mock.start()
+    env = dict(os.environ, AZURE_DEVOPS_URL=base_url,
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    fd, output = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        proc = subprocess.run([sys.executable, "-c", _CHILD_CODE, ORGANIZATION, mode, str(workers), output,
+                               engine],
+                              env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"La exportación {scenario}/{mode} falló:\n{proc.stderr}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result['digest'] = _output_digest(output)
+    finally:
+        mock.stop()
+        os.remove(output)
+    stats = mock.stats()
+    result.update(
+        requests=stats['requests'] - stats['throttled'],
+        throttled=stats['throttled'],
+        not_modified=stats['not_modified'],
+        by_endpoint=stats['by_endpoint'],
+    )
+    return result
+
+
+def find_regressions(name, result, reference):
+    """Lista de textos que describen en qué empeoró result respecto de reference."""
+    problems = []
+    if result['rows'] != reference['rows']:
+        problems.append(f"{name}: {result['rows']} filas (referencia {reference['rows']})")
+    if result['failures']:
+        problems.append(f"{name}: {result['failures']} llamadas fallaron")
+    if result['requests'] > reference['requests'] * (1 + REQUESTS_TOLERANCE):
+        problems.append(f"{name}: {result['requests']} peticiones (referencia {reference['requests']})")
+    limit = reference['wall_seconds'] * (1 + TIME_TOLERANCE) + TIME_SLACK_SECONDS
+    if result['wall_seconds'] > limit:
+        problems.append(f"{name}: {result['wall_seconds']:.2f} s (límite {limit:.2f} s)")
+    if result['peak_rss_mb'] and reference.get('peak_rss_mb'):
+        limit = reference['peak_rss_mb'] * (1 + MEMORY_TOLERANCE) + MEMORY_SLACK_MB
+        if result['peak_rss_mb'] > limit:
+            problems.append(f"{name}: {result['peak_rss_mb']:.0f} MB (límite {limit:.0f} MB)")
+    return problems
+
+
+def find_parity_problems(name, rest, odata):
+    """Lista de textos que describen en qué difiere la exportación odata de la REST."""
+    problems = []
+    if odata['failures']:
+        problems.append(f"{name}/odata: {odata['failures']} llamadas fallaron")
+    if odata['rows'] != rest['rows']:
+        problems.append(f"{name}/odata: {odata['rows']} filas (REST {rest['rows']})")
+    elif odata['digest'] != rest['digest']:
+        problems.append(f"{name}/odata: el CSV difiere del exportado con la API REST")
+    return problems
+
+
+def print_result(name, result):
+    rss = f"{result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] else "n/d"
+    print(f"{name:<16} {result['rows']:>8} filas  {result['requests']:>6} peticiones  "
+          f"{result['wall_seconds']:>7.2f} s  {rss:>7}  429: {result['throttled']}")
+    for endpoint, count in result['by_endpoint'].items():
+        print(f"{'':<18}{endpoint:<16} {count:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del exportador contra un Azure DevOps simulado.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Escenario a ejecutar (se puede repetir; por defecto small y medium).")
+    parser.add_argument("--mode", action="append", choices=MODES,
+                        help="Modo de exportación (se puede repetir; por defecto ambos).")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de latencia por petición.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fracción de peticiones que reciben 429.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Guardar los resultados como referencia.")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo.")
+    parser.add_argument("--no-parity", action="store_true",
+                        help="No comparar la exportación del motor odata con la de la API REST.")
+    parser.add_argument("--memory-check", action="store_true",
+                        help="Comparar también la memoria de los resultados de runs compactos y crudos.")
+    args = parser.parse_args(argv)
+
+    scenarios = args.scenario or ["small", "medium"]
+    modes = args.mode or list(MODES)
+    results = {}
+    parity_problems = []
+    for scenario in scenarios:
+        for mode in modes:
+            name = f"{scenario}/{mode}"
+            results[name] = run_case(scenario, mode, workers=args.workers, latency=args.latency,
+                                     throttle_rate=args.throttle_rate)
+            print_result(name, results[name])
+            if not args.no_parity:
+                odata = run_case(scenario, mode, workers=args.workers, latency=args.latency,
+                                 throttle_rate=args.throttle_rate, engine="odata")
+                print_result(f"{name}/odata", odata)
+                parity_problems.extend(find_parity_problems(name, results[name], odata))
+    memory_problems = check_memory() if args.memory_check else []
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    if args.update_baseline:
+        for name, r in results.items():
+            baseline[name] = {
+                'rows': r['rows'],
+                'requests': r['requests'],
+                'wall_seconds': round(r['wall_seconds'], 2),
+                'peak_rss_mb': round(r['peak_rss_mb'], 1) if r['peak_rss_mb'] else None,
+            }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Referencia guardada en {args.baseline}")
+        return 0
+
+    # Con latencia o 429 los tiempos no son comparables con la referencia
+    comparable = not args.latency and not args.throttle_rate and args.workers == 1
+    problems = parity_problems + memory_problems
+    for name, result in results.items():
+        if comparable and name in baseline:
+            problems.extend(find_regressions(name, result, baseline[name]))
+        elif result['failures']:
+            problems.append(f"{name}: {result['failures']} llamadas fallaron")
+    for problem in problems:
+        print(f"REGRESIÓN {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
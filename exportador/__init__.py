@@ -0,0 +1,31 @@
+"""Exportador de resultados de pruebas de Azure DevOps.
+
+Se puede usar como librería, sin Streamlit:
+
+    from exportador import export_to_file
+    export_to_file("mi-org", None, "", token, "test_results.csv", "csv")
+
+o desde la línea de comandos con ``python -m exportador``. Los submódulos se
+importan recién cuando se usan, así ``import exportador`` es inmediato.
+"""
+import importlib
+
+# Nombre público -> submódulo que lo define
+_LAZY_ATTRIBUTES = {
+    'export_to_file': 'exporter',
+    'list_work_units': 'engine',
+    'fetch_unit': 'engine',
+    'fetch_data_for_project': 'engine',
+    'COLUMNS': 'engine',
+    'OUTPUT_FORMATS': 'writers',
+    'write_rows': 'writers',
+}
+
+__all__ = sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{module}", __name__), name)
@@ -0,0 +1,311 @@
+"""Línea de comandos del exportador (sin Streamlit, apta para cron).
+
+Exportación completa a un archivo:
+
+    AZURE_DEVOPS_PAT=... python -m exportador export --organization org --output test_results.csv
+
+Exportación repartida en dos máquinas:
+
+    AZURE_DEVOPS_PAT=... python -m exportador shard --organization org --shard-index 0 --shard-count 2 --out-dir parts
+    AZURE_DEVOPS_PAT=... python -m exportador shard --organization org --shard-index 1 --shard-count 2 --out-dir parts
+    python -m exportador merge --out-dir parts --output test_results.xlsx
+
+Análisis previo (suites, runs, peticiones y tiempo estimados por plan):
+
+    AZURE_DEVOPS_PAT=... python -m exportador scan --organization org --run-names
+
+El archivo final puede ser .xlsx, .csv, .jsonl o .parquet (ver --format).
+
+Cada exportación queda además en el almacén local (ver exportador.store),
+que se consulta sin token ni acceso a Azure DevOps:
+
+    python -m exportador query --organization org --plans "Release*" --latest --output ultimos.csv
+    python -m exportador trend --organization org --by suite --period week
+"""
+import argparse
+import os
+import sys
+
+from .cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, RunCache
+from .engine import ENGINES, MAX_WORKERS, list_work_units
+from .exporter import export_to_file
+from .filters import parse_patterns
+from .metacache import metadata_cache
+from .preflight import scan
+from .shards import merge_partials, run_shard
+from .stats import get_stats, write_stats_json
+from .store import DEFAULT_STORE_PATH, TREND_GROUPS, TREND_PERIODS, ResultStore
+from .transport import get_failures
+from .writers import OUTPUT_FORMATS, summary_path, write_rows
+
+PAT_ENV_VAR = "AZURE_DEVOPS_PAT"
+
+
+def _token_from_env():
+    token = os.environ.get(PAT_ENV_VAR)
+    if not token:
+        sys.exit(f"Definí la variable de entorno {PAT_ENV_VAR} con el token personal (PAT).")
+    return token
+
+
+def _export_options(args):
+    """Opciones para engine.fetch_unit a partir de los argumentos comunes."""
+    options = {
+        'max_workers': args.max_workers,
+        'mode': "history" if args.history else "runs" if args.run_names else "points",
+        'suites': parse_patterns(args.suites),
+        'min_date': args.since,
+        'max_date': args.until,
+        'run_states': parse_patterns(args.run_states),
+        'outcomes': parse_patterns(args.outcomes),
+    }
+    if args.no_cache:
+        return options
+    max_bytes = args.cache_max_mb * 1024 * 1024
+    if args.rebuild_cache:
+        cache = RunCache(args.cache, max_bytes=max_bytes)
+        cache.clear()
+        cache.close()
+    options.update(cache_path=args.cache, cache_max_bytes=max_bytes)
+    return options
+
+
+def _report_failures():
+    """Imprime las llamadas que fallaron y los planes omitidos; devuelve True si hubo alguno."""
+    failures = get_failures()
+    for f in failures:
+        print(f"FALLA {f['endpoint']}: {f['status']} {f['message']} - {f['url']}", file=sys.stderr)
+    skipped = get_stats()['skipped_plans']
+    for p in skipped:
+        print(f"PLAN OMITIDO {p['plan_name']} ({p['plan_id']}) - {p['project']}: sus filas no están en el archivo",
+              file=sys.stderr)
+    return bool(failures or skipped)
+
+
+def _report_metadata_cache():
+    stats = metadata_cache.stats()
+    print(f"Caché de metadatos: {stats['hits']} aciertos, {stats['revalidated']} revalidados (304), "
+          f"{stats['misses']} descargados", file=sys.stderr)
+
+
+def _report_stats(path=None):
+    """Imprime las peticiones por endpoint y, con path, guarda el resumen completo en JSON."""
+    stats = get_stats()
+    print(f"{stats['requests']} peticiones ({stats['retries']} reintentos, {stats['mb']} MB)", file=sys.stderr)
+    for e in stats['endpoints']:
+        print(f"  {e['endpoint']:<16} {e['requests']:>6} peticiones {e['pages']:>5} páginas "
+              f"{e['retries']:>4} reintentos  p50 {e['p50_ms']} ms  p90 {e['p90_ms']} ms  p99 {e['p99_ms']} ms",
+              file=sys.stderr)
+    if path:
+        write_stats_json(path, stats)
+
+
+def _cmd_export(args):
+    token = _token_from_env()
+    options = _export_options(args)
+
+    def progress(pct, message):
+        print(f"[{pct:3d}%] {message}", file=sys.stderr)
+
+    rows = export_to_file(args.organization, args.project, "", token, args.output, _output_format(args),
+                          workers=args.workers, progress=progress,
+                          plans=parse_patterns(args.plans), iteration=args.iteration,
+                          profile_path=args.profile, engine=args.engine,
+                          checkpoint_dir=args.checkpoint, resume=args.resume, summary=args.summary,
+                          store_path=None if args.no_store else args.store, **options)
+    print(f"{rows} filas escritas en {args.output}", file=sys.stderr)
+    if args.summary and _output_format(args) != "xlsx":
+        print(f"Resúmenes escritos en {summary_path(args.output)}", file=sys.stderr)
+    _report_metadata_cache()
+    _report_stats(args.stats)
+    if _report_failures():
+        sys.exit(2)
+
+
+def _cmd_scan(args):
+    token = _token_from_env()
+    options = _export_options(args)
+
+    def progress(done, total, unit):
+        print(f"[{done}/{total}] {unit['project']} / {unit['plan_name']}", file=sys.stderr)
+
+    report = scan(args.organization, args.project, "", token, plans=parse_patterns(args.plans),
+                  iteration=args.iteration, progress=progress, **options)
+    print(f"{'Proyecto':<20} {'Plan':<30} {'ID':>8} {'Suites':>7} {'Runs':>7} {'En caché':>9} "
+          f"{'Peticiones':>11} {'Segundos':>9}")
+    for p in report['plans']:
+        print(f"{p['project'][:20]:<20} {p['plan_name'][:30]:<30} {p['plan_id']:>8} {p['suites']:>7} {p['runs']:>7} "
+              f"{p['cached_runs']:>9} {p['requests']:>11} {p['seconds']:>9}")
+    print(f"{len(report['plans'])} planes: ~{report['requests']} peticiones, ~{report['seconds']} s "
+          f"(análisis: {report['scan_requests']} peticiones, {report['scan_seconds']} s)", file=sys.stderr)
+
+
+def _cmd_shard(args):
+    token = _token_from_env()
+    options = _export_options(args)
+    units = list_work_units(args.organization, args.project, "", token,
+                            plans=parse_patterns(args.plans), iteration=args.iteration)
+
+    def progress(done, total, unit):
+        print(f"[{done}/{total}] {unit['project']} / {unit['plan_name']}", file=sys.stderr)
+
+    run_shard(args.organization, units, args.shard_index, args.shard_count, args.out_dir, "", token,
+              workers=args.workers, progress=progress, engine=args.engine, **options)
+    if _report_failures():
+        sys.exit(2)
+
+
+def _output_format(args):
+    """Formato pedido con --format o, si no se indicó, el de la extensión de --output."""
+    if args.format:
+        return args.format
+    ext = os.path.splitext(args.output)[1].lstrip(".").lower()
+    return ext if ext in OUTPUT_FORMATS else "xlsx"
+
+
+def _store_filters(args):
+    """Filtros de store.ResultStore a partir de los argumentos de query y trend."""
+    return {
+        'projects': parse_patterns(args.project),
+        'plans': parse_patterns(args.plans),
+        'suites': parse_patterns(args.suites),
+        'outcomes': parse_patterns(args.outcomes),
+        'executed_by': parse_patterns(args.executed_by),
+        'min_date': args.since,
+        'max_date': args.until,
+    }
+
+
+def _cmd_query(args):
+    store = ResultStore(args.store)
+    try:
+        rows = write_rows(store.query_rows(args.organization, latest=args.latest, **_store_filters(args)),
+                          args.output, _output_format(args))
+    finally:
+        store.close()
+    print(f"{rows} filas escritas en {args.output}", file=sys.stderr)
+
+
+def _cmd_trend(args):
+    store = ResultStore(args.store)
+    try:
+        table = store.trend(args.organization, by=args.by, period=args.period, **_store_filters(args))
+    finally:
+        store.close()
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"{len(table)} filas escritas en {args.output}", file=sys.stderr)
+    else:
+        print(table.to_string(index=False))
+
+
+def _cmd_merge(args):
+    rows = merge_partials(args.out_dir, args.output, _output_format(args))
+    print(f"{rows} filas escritas en {args.output}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m exportador")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    # Argumentos comunes a los comandos que consultan Azure DevOps
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--organization", required=True)
+    common.add_argument("--project", help="Proyecto específico (por defecto, todos).")
+    common.add_argument("--workers", type=int, default=1, help="Procesos locales entre los que se reparten los planes.")
+    common.add_argument("--max-workers", type=int, default=MAX_WORKERS,
+                        help="Descargas concurrentes de resultados de runs por plan.")
+    common.add_argument("--run-names", action="store_true",
+                        help="Recorrer todos los runs para completar 'Run Name' (más lento). "
+                             "Sin esta opción se usa el último resultado de cada test point.")
+    common.add_argument("--history", action="store_true",
+                        help="Exportar todos los resultados de todos los runs (historial completo), "
+                             "no solo el último de cada test case.")
+    common.add_argument("--engine", choices=ENGINES, default="threads",
+                        help="Motor de descarga: hilos con requests, asyncio con httpx (recorre varios planes a la vez) "
+                             "u OData de Analytics (una consulta por plan; no admite --history).")
+    common.add_argument("--plans", help="Planes a exportar: ids o nombres separados por coma (admite * y ?).")
+    common.add_argument("--iteration", help="Ruta de iteración de los planes (incluye sus iteraciones hijas).")
+    common.add_argument("--suites", help="Suites a exportar, con sus hijas: ids o nombres separados por coma.")
+    common.add_argument("--since", help="Solo resultados ejecutados desde esta fecha (AAAA-MM-DD).")
+    common.add_argument("--until", help="Solo resultados ejecutados hasta esta fecha inclusive (AAAA-MM-DD).")
+    common.add_argument("--run-states", help="Estados de run a considerar, separados por coma (p. ej. Completed).")
+    common.add_argument("--outcomes", help="Outcomes a exportar, separados por coma (p. ej. Failed,Blocked).")
+    common.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Archivo SQLite de la caché de runs.")
+    common.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Tamaño máximo de la caché antes de desalojar los runs menos usados.")
+    common.add_argument("--no-cache", action="store_true", help="No usar la caché de runs.")
+    common.add_argument("--rebuild-cache", action="store_true", help="Vaciar la caché antes de exportar.")
+
+    # Argumentos de las consultas al almacén local (no usan Azure DevOps)
+    stored = argparse.ArgumentParser(add_help=False)
+    stored.add_argument("--organization", required=True)
+    stored.add_argument("--store", default=DEFAULT_STORE_PATH, help="Archivo SQLite del almacén local.")
+    stored.add_argument("--project", help="Proyectos, separados por coma.")
+    stored.add_argument("--plans", help="Planes: ids o nombres separados por coma (admite * y ?).")
+    stored.add_argument("--suites", help="Suites: ids o nombres separados por coma (sin incluir sus hijas).")
+    stored.add_argument("--outcomes", help="Outcomes, separados por coma (p. ej. Failed,Blocked).")
+    stored.add_argument("--executed-by", help="Testers, separados por coma.")
+    stored.add_argument("--since", help="Solo resultados ejecutados desde esta fecha (AAAA-MM-DD).")
+    stored.add_argument("--until", help="Solo resultados ejecutados hasta esta fecha inclusive (AAAA-MM-DD).")
+
+    export = sub.add_parser("export", parents=[common], help="Exporta los resultados a un archivo.")
+    export.add_argument("--output", default="test_results.xlsx")
+    export.add_argument("--format", choices=sorted(OUTPUT_FORMATS),
+                        help="Formato de salida (por defecto, según la extensión de --output).")
+    export.add_argument("--stats", help="Guardar las métricas de la exportación en este archivo JSON.")
+    export.add_argument("--profile", help="Perfilar la exportación con cProfile y guardar el resultado aquí.")
+    export.add_argument("--summary", action="store_true",
+                        help="Agregar hojas de resumen: pass rate por plan, suite e iteración, casos "
+                             "inestables y ejecuciones por tester (en un .summary.xlsx si la salida no es .xlsx).")
+    export.add_argument("--store", default=DEFAULT_STORE_PATH,
+                        help="Almacén local (SQLite) donde se guardan también las filas exportadas.")
+    export.add_argument("--no-store", action="store_true", help="No guardar las filas en el almacén local.")
+    export.add_argument("--checkpoint", help="Directorio donde se guarda cada plan terminado (permite reanudar).")
+    export.add_argument("--resume", action="store_true",
+                        help="Reanudar la exportación guardada en --checkpoint: solo se descargan los planes que faltan "
+                             "(un checkpoint de más de 24 horas se descarta).")
+    export.set_defaults(func=_cmd_export)
+
+    scan_parser = sub.add_parser("scan", parents=[common],
+                                 help="Análisis previo: suites, runs, peticiones y tiempo estimados por plan.")
+    scan_parser.set_defaults(func=_cmd_scan)
+
+    shard = sub.add_parser("shard", parents=[common],
+                           help="Exporta una porción (shard) de los planes a archivos parciales.")
+    shard.add_argument("--shard-index", type=int, default=0)
+    shard.add_argument("--shard-count", type=int, default=1)
+    shard.add_argument("--out-dir", required=True)
+    shard.set_defaults(func=_cmd_shard)
+
+    merge = sub.add_parser("merge", help="Une los archivos parciales en el archivo final.")
+    merge.add_argument("--out-dir", required=True)
+    merge.add_argument("--output", default="test_results.xlsx")
+    merge.add_argument("--format", choices=sorted(OUTPUT_FORMATS),
+                       help="Formato de salida (por defecto, según la extensión de --output).")
+    merge.set_defaults(func=_cmd_merge)
+
+    query = sub.add_parser("query", parents=[stored],
+                           help="Exporta a un archivo las filas guardadas en el almacén local.")
+    query.add_argument("--output", default="test_results.xlsx")
+    query.add_argument("--format", choices=sorted(OUTPUT_FORMATS),
+                       help="Formato de salida (por defecto, según la extensión de --output).")
+    query.add_argument("--latest", action="store_true",
+                       help="Solo el resultado más reciente de cada test case en cada suite.")
+    query.set_defaults(func=_cmd_query)
+
+    trend = sub.add_parser("trend", parents=[stored],
+                           help="Outcomes por período (día, semana, mes) desde el almacén local.")
+    trend.add_argument("--by", choices=sorted(TREND_GROUPS), default="suite")
+    trend.add_argument("--period", choices=sorted(TREND_PERIODS), default="week")
+    trend.add_argument("--output", help="Guardar la tabla en este CSV (por defecto se imprime).")
+    trend.set_defaults(func=_cmd_trend)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "resume", False) and not args.checkpoint:
+        parser.error("--resume requiere --checkpoint")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
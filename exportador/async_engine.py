@@ -0,0 +1,543 @@
+"""Motor de exportación asíncrono (asyncio + httpx).
+
+Recorre proyecto → plan → runs/suites → test points → work items como tareas
+de asyncio que comparten un único presupuesto de peticiones en vuelo
+(MAX_CONCURRENCY) y un pool de conexiones keep-alive. Hasta PLANS_IN_FLIGHT
+planes se recorren a la vez: las suites del plan B se descargan mientras los
+runs del plan A siguen en curso. Dentro de un plan, los test points de las
+suites se piden en paralelo con los resultados de los runs.
+
+Las filas se entregan en el mismo orden y con el mismo contenido que
+engine.fetch_data_for_project; fetch_unit y fetch_data_for_project tienen las
+mismas firmas que las de engine, así que la interfaz puede elegir el motor.
+Reintentos, control de tasa, reporte de fallas, métricas y cachés son los
+mismos que usa el motor con hilos. Requiere httpx (dependencia opcional).
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+
+from requests.auth import HTTPBasicAuth
+
+from . import azure
+from .azure import (
+    WORKITEMS_BATCH_SIZE,
+    _continuation_token,
+    _flatten_suites,
+    _parse_testcases,
+    _parse_titles,
+    group_runs_by_plan,
+    runs_window_params,
+)
+from .cache import DEFAULT_MAX_BYTES, RunCache
+from .engine import (
+    API_VERSIONS,
+    EXPORT_MODES,
+    MAX_WORKERS,
+    RUN_CACHE_BATCH,
+    RUN_MODES,
+    _TitleWindow,
+    _fill_titles,
+    _merge_function,
+    _points_by_testcase,
+    _select_runs,
+    _slim_result,
+    _suite_rows,
+    _summarize_points,
+)
+from .filters import check_date_range, date_windows
+from .metacache import auth_fingerprint, metadata_cache, workitem_titles
+from .stats import record_page, record_request, record_unit
+from .transport import (
+    MAX_RETRIES,
+    RETRY_STATUS,
+    TIMEOUT,
+    ApiError,
+    backoff_delay,
+    endpoint_name,
+    record_failure,
+    throttle,
+)
+
+# Peticiones HTTP en vuelo en toda la exportación (presupuesto global)
+MAX_CONCURRENCY = 16
+# Planes que se recorren a la vez; los siguientes empiezan a medida que se entregan los anteriores
+PLANS_IN_FLIGHT = 4
+# Suites ya armadas que un plan puede adelantar mientras espera su turno para entregarlas
+PLAN_QUEUE_SUITES = 16
+# Lotes de filas entre el event loop y el hilo que consume las filas
+OUTPUT_QUEUE_BATCHES = 8
+
+_DONE = object()
+
+
+def _httpx():
+    try:
+        import httpx
+    except ImportError as e:
+        raise RuntimeError("El motor asíncrono requiere el paquete 'httpx'.") from e
+    return httpx
+
+
+class _Stopped(Exception):
+    """El consumidor dejó de pedir filas."""
+
+
+class _Crawler:
+    """Cliente HTTP asíncrono con las mismas reglas que transport.request."""
+
+    def __init__(self, organization, username, token, concurrency=MAX_CONCURRENCY, versions=None,
+                 cache_scope=None):
+        httpx = _httpx()
+        self.httpx = httpx
+        self.organization = organization
+        self.auth = (username or "", token or "")
+        self.fingerprint = auth_fingerprint(HTTPBasicAuth(username, token))
+        self.versions = versions or API_VERSIONS
+        # Ámbito de la exportación en la caché de títulos (ver metacache.new_cache_scope)
+        self.cache_scope = cache_scope
+        # Índices de runs por proyecto (runs_scope "project"), uno por recorrido
+        self._project_runs = {}
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=httpx.Timeout(TIMEOUT[1], connect=TIMEOUT[0]),
+        )
+
+    async def aclose(self):
+        for task in self._project_runs.values():
+            task.cancel()
+        await asyncio.gather(*self._project_runs.values(), return_exceptions=True)
+        await self.client.aclose()
+
+    def _url(self, project, path):
+        return f"{azure.BASE_URL}/{self.organization}/{project}/_apis/{path}"
+
+    async def request(self, method, url, params=None, json=None, headers=None):
+        endpoint = endpoint_name(url)
+        # httpx reemplaza la query de la URL por params; requests las combina
+        target = self.httpx.URL(url).copy_merge_params(params) if params else url
+        for attempt in range(MAX_RETRIES + 1):
+            wait = throttle.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            resp = None
+            async with self.semaphore:
+                started = time.perf_counter()
+                try:
+                    resp = await self.client.request(method, target, json=json, headers=headers, auth=self.auth)
+                except self.httpx.TransportError:
+                    record_request(endpoint, time.perf_counter() - started, 0, retry=attempt > 0, error=True)
+                    if attempt == MAX_RETRIES:
+                        raise
+                else:
+                    record_request(endpoint, time.perf_counter() - started, len(resp.content),
+                                   retry=attempt > 0, error=resp.status_code >= 400)
+            if resp is not None:
+                throttle.observe(resp)
+                if resp.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                    return resp
+            await asyncio.sleep(backoff_delay(attempt, resp))
+
+    async def get_json(self, url, params=None, headers=None, method="GET", body=None):
+        """Igual que transport.get_json: (json, headers), (None, headers) si 304, o ApiError."""
+        try:
+            resp = await self.request(method, url, params=params, json=body, headers=headers)
+        except self.httpx.HTTPError as e:
+            record_failure(url, None, str(e))
+            raise ApiError(url, None, str(e)) from e
+        if resp.status_code == 304:
+            return None, resp.headers
+        if resp.status_code != 200:
+            message = resp.reason_phrase or ""
+            record_failure(url, resp.status_code, message)
+            raise ApiError(url, resp.status_code, message)
+        return resp.json(), resp.headers
+
+    async def get_all(self, url, params=None, raise_errors=False):
+        """Como azure.api_get_all."""
+        all_items = []
+        params = dict(params or {})
+        while True:
+            try:
+                j, headers = await self.get_json(url, params=params)
+            except ApiError:
+                if raise_errors:
+                    raise
+                return all_items
+            all_items.extend(j.get('value') or j.get('members') or [])
+            cont = _continuation_token(j, headers)
+            if not cont:
+                return all_items
+            record_page(endpoint_name(url))
+            params['continuationToken'] = cont
+
+    async def get_all_cached(self, url):
+        """Como azure.api_get_all_cached (misma caché de metadatos)."""
+        items, etag = metadata_cache.lookup(url, self.fingerprint)
+        if items is not None:
+            return items
+        try:
+            j, headers = await self.get_json(url, headers={'If-None-Match': etag} if etag else None)
+        except ApiError:
+            return []
+        if j is None:
+            items = metadata_cache.revalidate(url, self.fingerprint)
+            return items if items is not None else await self.get_all(url)
+        items = j.get('value') or j.get('members') or []
+        etag = headers.get('ETag')
+        cont = _continuation_token(j, headers)
+        if cont:
+            record_page(endpoint_name(url))
+            try:
+                items = items + await self.get_all(url, params={'continuationToken': cont}, raise_errors=True)
+            except ApiError:
+                return items
+            etag = None
+        metadata_cache.store(url, self.fingerprint, items, etag)
+        return items
+
+    # --- Entidades (mismas URLs que azure) ---
+
+    async def suites(self, project, plan_id, subtrees=None):
+        url = self._url(project, f"testplan/plans/{plan_id}/suites?asTreeView=True"
+                                 f"&api-version={self.versions['suites']}")
+        return _flatten_suites(await self.get_all_cached(url), subtrees)
+
+    async def runs(self, project, plan_id, min_date=None, max_date=None, state=None, scope="plan"):
+        """Como azure.get_test_runs, o azure.get_plan_runs_from_index si scope es "project"."""
+        version = self.versions['runs']
+        if scope == "project":
+            key = (project, str(min_date or ""), str(max_date or ""), state)
+            task = self._project_runs.get(key)
+            if task is None:
+                url = self._url(project, f"test/runs?api-version={version}")
+                task = self._project_runs[key] = asyncio.ensure_future(
+                    self._project_groups(url, min_date, max_date, state))
+            # shield: si el plan que la espera se cancela, la carga sigue para los demás
+            return (await asyncio.shield(task)).get(str(plan_id), [])
+        if not min_date:
+            return await self.get_all(self._url(project, f"test/runs?planId={plan_id}&api-version={version}"))
+        url = self._url(project, f"test/runs?planIds={plan_id}&api-version={version}")
+        return await self._query_runs(url, min_date, max_date, state)
+
+    async def _project_groups(self, url, min_date, max_date, state):
+        return group_runs_by_plan(await self._query_runs(url, min_date, max_date, state))
+
+    async def _query_runs(self, url, min_date=None, max_date=None, state=None):
+        if not min_date:
+            return await self.get_all(url)
+        windows = date_windows(min_date, max_date or datetime.now(timezone.utc).date())
+        pages = await asyncio.gather(*(self.get_all(url, params=runs_window_params(start, stop, state))
+                                       for start, stop in windows))
+        runs = {}
+        for page in pages:
+            for run in page:
+                runs.setdefault(run.get('id'), run)
+        return list(runs.values())
+
+    async def run_results(self, project, run_id):
+        url = self._url(project, f"test/runs/{run_id}/results?api-version={self.versions['results']}")
+        return await self.get_all(url, raise_errors=True)
+
+    async def suite_cases_and_points(self, project, plan_id, suite_id):
+        """Como engine._suite_cases_and_points."""
+        version = self.versions['points']
+        try:
+            test_points = await self.get_all(
+                self._url(project, f"testplan/plans/{plan_id}/suites/{suite_id}/testpoints?api-version={version}"),
+                raise_errors=True)
+        except ApiError:
+            test_points = None
+        if test_points:
+            points_map = _points_by_testcase(test_points)
+            testcases = []
+            for tcid, p in points_map.items():
+                tc_ref = p.get('testCaseReference') or p.get('testCase') or {}
+                testcases.append({'id': tcid, 'name': tc_ref.get('name')})
+            return testcases, points_map
+        items = await self.get_all(
+            self._url(project, f"test/Plans/{plan_id}/Suites/{suite_id}/testcases?api-version={version}"))
+        return _parse_testcases(items), _points_by_testcase(test_points or [])
+
+    async def titles(self, ids, api_version='7.0'):
+        """Como azure.get_workitems_titles (misma caché de títulos)."""
+        out, missing = workitem_titles.get_many(self.organization, self.fingerprint,
+                                                list(dict.fromkeys(map(str, ids))), scope=self.cache_scope)
+        if not missing:
+            return out
+        url = f"{azure.BASE_URL}/{self.organization}/_apis/wit/workitemsbatch"
+
+        async def fetch(chunk):
+            body = {'ids': [int(wid) for wid in chunk], 'fields': ['System.Title'], 'errorPolicy': 'omit'}
+            try:
+                j, _ = await self.get_json(url, params={'api-version': api_version}, method="POST", body=body)
+            except ApiError:
+                return {}
+            return _parse_titles(chunk, j)
+
+        chunks = [missing[i:i+WORKITEMS_BATCH_SIZE] for i in range(0, len(missing), WORKITEMS_BATCH_SIZE)]
+        for titles in await asyncio.gather(*(fetch(c) for c in chunks)):
+            workitem_titles.put_many(self.organization, self.fingerprint, titles, scope=self.cache_scope)
+            out.update(titles)
+        return out
+
+
+async def _ordered_map(fn, items, limit):
+    """Versión asíncrona de engine._ordered_map: entrega (item, resultado) en orden."""
+    items = iter(items)
+    limit = max(1, limit)
+    pending = deque((item, asyncio.ensure_future(fn(item))) for item in islice(items, limit))
+    try:
+        while pending:
+            item, task = pending[0]
+            result = await task
+            pending.popleft()
+            for nxt in islice(items, 1):
+                pending.append((nxt, asyncio.ensure_future(fn(nxt))))
+            yield item, result
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+async def _load_runs(crawler, unit, run_results_map, max_workers, run_cache, mode, min_date, max_date, run_states):
+    """Fase de runs de un plan: igual que en engine.fetch_data_for_project."""
+    project = unit['project']
+    state = run_states[0] if run_states and len(run_states) == 1 else None
+    runs = await crawler.runs(project, unit['plan_id'], min_date, max_date, state,
+                              scope=unit.get('runs_scope', "plan"))
+    all_runs = _select_runs(runs, run_states)
+    cached = run_cache.get_many(crawler.organization, project, all_runs) if run_cache else {}
+
+    async def fetch(run):
+        run_id = run.get('id')
+        if run_id in cached:
+            return cached[run_id]
+        try:
+            results = await crawler.run_results(project, run_id)
+        except ApiError:
+            return None
+        return [_slim_result(r) for r in results]
+
+    merge = _merge_function(mode)
+    to_store = []
+    async for run, results in _ordered_map(fetch, all_runs, max_workers):
+        run_id = run.get('id')
+        if run_id in cached:
+            del cached[run_id]
+        elif run_cache and results is not None:
+            to_store.append((run, results))
+            if len(to_store) >= RUN_CACHE_BATCH:
+                run_cache.put_many(crawler.organization, project, to_store)
+                to_store = []
+        merge(run_results_map, run, results or [])
+    if to_store:
+        run_cache.put_many(crawler.organization, project, to_store)
+
+
+async def _crawl_unit(crawler, unit, out, max_workers=MAX_WORKERS, run_cache=None, mode="runs",
+                      suites=None, min_date=None, max_date=None, run_states=None, outcomes=None):
+    """Pone en `out` las filas de cada suite del plan, en orden, y _DONE al final.
+
+    Si algo falla pone la excepción en lugar de _DONE.
+    """
+    started = time.perf_counter()
+    rows = 0
+    runs_task = None
+    try:
+        project, plan_id = unit['project'], unit['plan_id']
+        test_suites = await crawler.suites(project, plan_id, subtrees=suites)
+        run_results_map = {}
+        if test_suites and mode in RUN_MODES:
+            # Los runs avanzan en paralelo con los test points de las primeras suites
+            runs_task = asyncio.ensure_future(_load_runs(crawler, unit, run_results_map, max_workers, run_cache,
+                                                         mode, min_date, max_date, run_states))
+
+        async def load_suite(suite):
+            testcases, points_map = await crawler.suite_cases_and_points(project, plan_id, suite.get('id'))
+            return testcases, _summarize_points(points_map, mode)
+
+        async def put_window():
+            nonlocal rows, started
+            missing_ids, pending = window.take()
+            titles = await crawler.titles(missing_ids) if missing_ids else {}
+            for data in pending:
+                _fill_titles(data, titles, run_results_map)
+                rows += len(data)
+                # El tiempo esperando turno para entregar no cuenta como tiempo del plan
+                paused = time.perf_counter()
+                await out.put(data)
+                started += time.perf_counter() - paused
+
+        # Los títulos faltantes de varias suites se piden juntos (ver engine._TitleWindow)
+        window = _TitleWindow()
+        async for suite, (testcases, point_results) in _ordered_map(load_suite, test_suites, max_workers):
+            if runs_task:
+                await runs_task
+            data = _suite_rows(project, plan_id, unit['plan_name'], unit['iteration'], suite, testcases,
+                               point_results, run_results_map, outcomes=outcomes,
+                               min_date=min_date, max_date=max_date, history=mode == "history")
+            if window.add(data):
+                await put_window()
+        await put_window()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await out.put(e)
+        return
+    finally:
+        if runs_task and not runs_task.done():
+            runs_task.cancel()
+        record_unit(unit['project'], unit['plan_id'], unit['plan_name'], time.perf_counter() - started, rows)
+    await out.put(_DONE)
+
+
+async def _crawl_units(emit, organization, units, username, token, max_workers=MAX_WORKERS,
+                       cache_path=None, cache_max_bytes=DEFAULT_MAX_BYTES, mode="runs",
+                       versions=None, cache_scope=None, **filters):
+    """Recorre las unidades con hasta PLANS_IN_FLIGHT en paralelo y las entrega en orden con emit."""
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"Modo de exportación desconocido: {mode}")
+    check_date_range(filters.get('min_date'), filters.get('max_date'))
+    crawler = _Crawler(organization, username, token, versions=versions, cache_scope=cache_scope)
+    # La conexión SQLite se abre en el hilo del event loop, que es el único que la usa
+    run_cache = RunCache(cache_path, max_bytes=cache_max_bytes) if cache_path else None
+    pending = deque()
+    units = iter(units)
+
+    def start_next():
+        for unit in islice(units, 1):
+            out = asyncio.Queue(maxsize=PLAN_QUEUE_SUITES)
+            task = asyncio.ensure_future(_crawl_unit(crawler, unit, out, max_workers=max_workers,
+                                                     run_cache=run_cache, mode=mode, **filters))
+            pending.append((unit, out, task))
+
+    try:
+        for _ in range(PLANS_IN_FLIGHT):
+            start_next()
+        index = 0
+        while pending:
+            unit, out, _ = pending[0]
+            await emit(('unit', index, unit))
+            while True:
+                item = await out.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                await emit(('rows', item))
+            pending.popleft()
+            index += 1
+            start_next()
+    finally:
+        for _, _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, _, task in pending), return_exceptions=True)
+        await crawler.aclose()
+        if run_cache:
+            run_cache.close()
+
+
+def _iter_in_thread(make_coro):
+    """Corre make_coro(emit) en un event loop propio en otro hilo y devuelve lo que emite.
+
+    La cola entre ambos hilos está acotada: si el consumidor se atrasa, el
+    recorrido se frena. Si el consumidor deja de iterar, el recorrido se cancela.
+    """
+    out = queue.Queue(maxsize=OUTPUT_QUEUE_BATCHES)
+    stop = threading.Event()
+
+    async def emit(item):
+        while True:
+            if stop.is_set():
+                raise _Stopped()
+            try:
+                out.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.005)
+
+    def put_final(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run():
+        try:
+            asyncio.run(make_coro(emit))
+        except _Stopped:
+            return
+        except BaseException as e:
+            put_final(('error', e))
+        else:
+            put_final(('done',))
+
+    thread = threading.Thread(target=run, name="exportador-async", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = out.get()
+            if item[0] == 'done':
+                return
+            if item[0] == 'error':
+                raise item[1]
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def fetch_units(organization, units, username, token, progress=None, **options):
+    """Genera las filas de varias unidades de list_work_units, recorriéndolas en paralelo.
+
+    progress(índice, unidad) se invoca (en el hilo del consumidor) cuando
+    empiezan a entregarse las filas de cada unidad. options son los de
+    fetch_unit.
+    """
+    units = list(units)
+    for item in _iter_in_thread(lambda emit: _crawl_units(emit, organization, units, username, token, **options)):
+        if item[0] == 'rows':
+            yield from item[1]
+        elif progress:
+            progress(item[1], item[2])
+
+
+def fetch_unit(organization, unit, username, token, max_workers=MAX_WORKERS,
+               cache_path=None, cache_max_bytes=DEFAULT_MAX_BYTES, mode="runs", **filters):
+    """Misma firma y mismas filas que engine.fetch_unit."""
+    return fetch_units(organization, [unit], username, token, max_workers=max_workers, cache_path=cache_path,
+                       cache_max_bytes=cache_max_bytes, mode=mode, **filters)
+
+
+def fetch_data_for_project(organization, project_name, plan_id, plan_name, plan_iteration,
+                           api_version_suites, api_version_runs, api_version_points,
+                           api_version_results, username, token, max_workers=MAX_WORKERS,
+                           run_cache=None, mode="runs", suites=None, min_date=None, max_date=None,
+                           run_states=None, outcomes=None, runs_scope="plan", cache_scope=None):
+    """Misma firma y mismas filas que engine.fetch_data_for_project.
+
+    run_cache se usa solo por su ruta: SQLite no permite compartir la conexión
+    con el hilo del event loop, que abre la suya.
+    """
+    unit = {'ordinal': 0, 'project': project_name, 'plan_id': plan_id, 'plan_name': plan_name,
+            'iteration': plan_iteration, 'runs_scope': runs_scope}
+    versions = {
+        'suites': api_version_suites,
+        'runs': api_version_runs,
+        'points': api_version_points,
+        'results': api_version_results,
+    }
+    options = {}
+    if run_cache:
+        options.update(cache_path=run_cache.path, cache_max_bytes=run_cache.max_bytes)
+    return fetch_units(organization, [unit], username, token, max_workers=max_workers, mode=mode,
+                       versions=versions, suites=suites, min_date=min_date, max_date=max_date,
+                       run_states=run_states, outcomes=outcomes, cache_scope=cache_scope, **options)
@@ -0,0 +1,268 @@
+"""Funciones de acceso a la API REST de Azure DevOps."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from requests.auth import HTTPBasicAuth
+
+from .filters import date_windows, matches_any
+from .metacache import auth_fingerprint, metadata_cache, project_runs, workitem_titles
+from .stats import record_page
+from .transport import ApiError, endpoint_name, get_json, post_json
+
+# URL base de Azure DevOps; AZURE_DEVOPS_URL permite apuntar a un servidor local (ver benchmarks/)
+BASE_URL = os.environ.get("AZURE_DEVOPS_URL", "https://dev.azure.com").rstrip("/")
+
+
+# --- Funciones de conexión con Azure DevOps ---
+def get_projects(organization, api_version, username, token):
+    url = f"{BASE_URL}/{organization}/_apis/projects?api-version={api_version}"
+    return api_get_all_cached(url, HTTPBasicAuth(username, token))
+
+def get_all_test_plans(organization, project, api_version, username, token):
+    url = f"{BASE_URL}/{organization}/{project}/_apis/testplan/plans?api-version={api_version}"
+    return api_get_all_cached(url, HTTPBasicAuth(username, token))
+
+def api_get_all(url, auth, params=None, raise_errors=False):
+    """Realiza llamadas GET manejando paginación.
+
+    Si una página falla (después de los reintentos de transport) la falla queda
+    en el reporte de transport.get_failures() y se devuelve lo obtenido hasta
+    ese momento, o se relanza ApiError si raise_errors es True.
+    """
+    all_items = []
+    params = params.copy() if params else {}
+    while True:
+        try:
+            j, headers = get_json(url, auth, params=params)
+        except ApiError:
+            if raise_errors:
+                raise
+            return all_items
+        items = j.get('value') or j.get('members') or []
+        all_items.extend(items)
+
+        cont = _continuation_token(j, headers)
+        if not cont:
+            break
+        record_page(endpoint_name(url))
+        params['continuationToken'] = cont
+    return all_items
+
+def _continuation_token(j, headers):
+    return headers.get('x-ms-continuationtoken') or headers.get('x-ms-continuation-token') or j.get('continuationToken')
+
+def api_get_all_cached(url, auth):
+    """Como api_get_all, pero pasando por la caché de metadatos compartida.
+
+    Dentro del TTL la respuesta sale de la caché sin ninguna petición. Pasado
+    el TTL (o con credenciales todavía no validadas) se revalida con
+    If-None-Match cuando hay ETag, y un 304 reutiliza lo guardado.
+    """
+    fingerprint = auth_fingerprint(auth)
+    items, etag = metadata_cache.lookup(url, fingerprint)
+    if items is not None:
+        return items
+
+    try:
+        j, headers = get_json(url, auth, headers={'If-None-Match': etag} if etag else None)
+    except ApiError:
+        return []
+    if j is None:
+        items = metadata_cache.revalidate(url, fingerprint)
+        return items if items is not None else api_get_all(url, auth)
+
+    items = j.get('value') or j.get('members') or []
+    etag = headers.get('ETag')
+    cont = _continuation_token(j, headers)
+    if cont:
+        record_page(endpoint_name(url))
+        try:
+            items = items + api_get_all(url, auth, params={'continuationToken': cont}, raise_errors=True)
+        except ApiError:
+            # Respuesta incompleta: se devuelve, pero no se guarda
+            return items
+        # Con varias páginas el ETag de la primera no alcanza para revalidar: solo TTL
+        etag = None
+    metadata_cache.store(url, fingerprint, items, etag)
+    return items
+
+def _flatten_suites(nodes, subtrees=None, inside=False):
+    """Aplana una estructura de suites en árbol.
+
+    Con subtrees (patrones de id o nombre) solo quedan las suites que coinciden
+    y todas sus descendientes.
+    """
+    flat = []
+    for n in nodes:
+        selected = inside or matches_any(subtrees, n.get('id'), n.get('name'))
+        if selected:
+            flat.append(n)
+        children = n.get('children') or []
+        if children:
+            flat.extend(_flatten_suites(children, subtrees, selected))
+    return flat
+
+def get_test_suites(organization, project, plan_id, api_version, username, token, subtrees=None):
+    url = f"{BASE_URL}/{organization}/{project}/_apis/testplan/plans/{plan_id}/suites?asTreeView=True&api-version={api_version}"
+    auth = HTTPBasicAuth(username, token)
+    suites = api_get_all_cached(url, auth)
+    if not suites:
+        return []
+    return _flatten_suites(suites, subtrees)
+
+def get_test_runs(organization, project, plan_id, api_version, username, token,
+                  min_date=None, max_date=None, state=None):
+    """Runs de un plan.
+
+    Con min_date (y opcionalmente max_date, por defecto hoy) se usa la consulta
+    por fecha de última actualización, que Azure DevOps limita a 7 días por
+    petición: el rango se recorre en ventanas y los runs repetidos se descartan.
+    """
+    auth = HTTPBasicAuth(username, token)
+    if not min_date:
+        url = f"{BASE_URL}/{organization}/{project}/_apis/test/runs?planId={plan_id}&api-version={api_version}"
+        return api_get_all(url, auth)
+
+    url = f"{BASE_URL}/{organization}/{project}/_apis/test/runs?planIds={plan_id}&api-version={api_version}"
+    return _query_runs_by_date(url, auth, min_date, max_date, state)
+
+def _query_runs_by_date(url, auth, min_date, max_date=None, state=None):
+    runs = {}
+    for start, stop in date_windows(min_date, max_date or datetime.now(timezone.utc).date()):
+        params = runs_window_params(start, stop, state)
+        for run in api_get_all(url, auth, params=params):
+            runs.setdefault(run.get('id'), run)
+    return list(runs.values())
+
+def runs_window_params(start, stop, state=None):
+    """Parámetros de la consulta de runs por fecha para una ventana de date_windows."""
+    params = {
+        'minLastUpdatedDate': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'maxLastUpdatedDate': stop.strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }
+    if state:
+        params['state'] = state
+    return params
+
+def get_project_runs(organization, project, api_version, username, token,
+                     min_date=None, max_date=None, state=None):
+    """Runs de todo el proyecto agrupados por plan: {plan id (str): [runs]}.
+
+    Recorre la lista de runs del proyecto una sola vez (con las mismas reglas
+    de fechas que get_test_runs) en lugar de una consulta por plan.
+    """
+    auth = HTTPBasicAuth(username, token)
+    url = f"{BASE_URL}/{organization}/{project}/_apis/test/runs?api-version={api_version}"
+    if min_date:
+        return group_runs_by_plan(_query_runs_by_date(url, auth, min_date, max_date, state))
+    return group_runs_by_plan(api_get_all(url, auth))
+
+def get_plan_runs_from_index(organization, project, plan_id, api_version, username, token,
+                             min_date=None, max_date=None, state=None, cache_scope=None):
+    """Runs de un plan servidos desde el índice de runs del proyecto (ver metacache.project_runs).
+
+    El primer plan del proyecto carga el índice con get_project_runs y los
+    demás planes con el mismo cache_scope (la misma exportación) lo reutilizan.
+    """
+    fingerprint = auth_fingerprint(HTTPBasicAuth(username, token))
+    key = (cache_scope, organization, fingerprint, project, api_version, str(min_date or ""), str(max_date or ""), state)
+    groups = project_runs.get_or_load(key, lambda: get_project_runs(
+        organization, project, api_version, username, token, min_date=min_date, max_date=max_date, state=state))
+    return groups.get(str(plan_id), [])
+
+# Campos de cada run que usa la exportación (el índice del proyecto guarda solo estos)
+RUN_INDEX_FIELDS = ('id', 'name', 'state', 'revision')
+
+def group_runs_by_plan(runs):
+    """{plan id (str): [runs]} conservando el orden de runs y solo RUN_INDEX_FIELDS."""
+    groups = {}
+    for run in runs:
+        plan_id = (run.get('plan') or {}).get('id')
+        if plan_id is None:
+            continue
+        groups.setdefault(str(plan_id), []).append({k: run.get(k) for k in RUN_INDEX_FIELDS})
+    return groups
+
+def get_run_results(organization, project, run_id, api_version, username, token):
+    """Resultados de un run. Lanza ApiError si no se pudieron obtener completos."""
+    url = f"{BASE_URL}/{organization}/{project}/_apis/test/runs/{run_id}/results?api-version={api_version}"
+    auth = HTTPBasicAuth(username, token)
+    return api_get_all(url, auth, raise_errors=True)
+
+def get_test_points(organization, project, plan_id, suite_id, api_version, username, token, raise_errors=False):
+    url = f"{BASE_URL}/{organization}/{project}/_apis/testplan/plans/{plan_id}/suites/{suite_id}/testpoints?api-version={api_version}"
+    auth = HTTPBasicAuth(username, token)
+    return api_get_all(url, auth, raise_errors=raise_errors)
+
+def get_test_cases_in_suite(organization, project, plan_id, suite_id, api_version, username, token):
+    """Devuelve la lista de test case references en una suite."""
+    url = f"{BASE_URL}/{organization}/{project}/_apis/test/Plans/{plan_id}/Suites/{suite_id}/testcases?api-version={api_version}"
+    auth = HTTPBasicAuth(username, token)
+    return _parse_testcases(api_get_all(url, auth))
+
+def _parse_testcases(items):
+    """[{'id', 'name'}] a partir de la respuesta del endpoint de test cases de una suite."""
+    testcases = []
+    for it in items:
+        tc = it.get('testCase') or it.get('testCaseReference') or it
+        tc_id = None
+        tc_name = None
+        if isinstance(tc, dict):
+            tc_id = tc.get('id') or tc.get('testCaseId') or tc.get('workItemId')
+            tc_name = tc.get('name') or (tc.get('fields') or {}).get('System.Title') or tc.get('testCaseTitle')
+        else:
+            tc_id = it.get('id')
+            tc_name = it.get('name')
+
+        if tc_id:
+            testcases.append({'id': str(tc_id), 'name': tc_name})
+    return testcases
+
+# Máximo de ids que acepta el endpoint workitemsbatch por petición
+WORKITEMS_BATCH_SIZE = 200
+WORKITEMS_MAX_WORKERS = 4
+
+def get_workitems_titles(organization, ids, api_version='7.0', username=None, token=None,
+                         max_workers=WORKITEMS_MAX_WORKERS, cache_scope=None):
+    """Obtiene títulos de work items en lote.
+
+    Los ids se deduplican, los ya conocidos salen de la caché de títulos del
+    proceso (los de cache_scope, ver metacache.TitleCache) y el resto se pide
+    a workitemsbatch en lotes de 200 en paralelo.
+    """
+    if not ids:
+        return {}
+    auth = HTTPBasicAuth(username, token)
+    fingerprint = auth_fingerprint(auth)
+    out, missing = workitem_titles.get_many(organization, fingerprint, list(dict.fromkeys(map(str, ids))),
+                                            scope=cache_scope)
+    if not missing:
+        return out
+    url = f"{BASE_URL}/{organization}/_apis/wit/workitemsbatch"
+    chunks = [missing[i:i+WORKITEMS_BATCH_SIZE] for i in range(0, len(missing), WORKITEMS_BATCH_SIZE)]
+
+    def fetch(chunk):
+        body = {'ids': [int(wid) for wid in chunk], 'fields': ['System.Title'], 'errorPolicy': 'omit'}
+        try:
+            j, _ = post_json(url, auth, body, params={'api-version': api_version})
+        except ApiError:
+            return {}
+        return _parse_titles(chunk, j)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        for titles in executor.map(fetch, chunks):
+            workitem_titles.put_many(organization, fingerprint, titles, scope=cache_scope)
+            out.update(titles)
+    return out
+
+def _parse_titles(chunk, j):
+    """{id: título} de una respuesta de workitemsbatch para los ids pedidos en chunk.
+
+    Los ids borrados o sin permiso quedan sin título (y no se vuelven a pedir).
+    """
+    titles = dict.fromkeys(chunk)
+    for wi in j.get('value') or []:
+        if wi:
+            titles[str(wi.get('id'))] = (wi.get('fields') or {}).get('System.Title')
+    return titles
@@ -0,0 +1,139 @@
+"""Caché persistente (SQLite) de resultados de runs completados.
+
+Un run completado no cambia, así que sus resultados se guardan comprimidos
+y las siguientes exportaciones solo descargan los runs nuevos, en curso o
+cuya revisión cambió.
+"""
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "exportador", "runs.sqlite"
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Estados de run que ya no reciben resultados nuevos
+FINAL_RUN_STATES = {"Completed", "Aborted"}
+
+
+def is_cacheable(run):
+    return run.get('state') in FINAL_RUN_STATES
+
+
+class RunCache:
+    """Resultados de runs por (organización, proyecto, run id), con desalojo LRU por tamaño."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        # auto_vacuum debe fijarse antes de crear las tablas para poder liberar espacio
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS runs (
+                organization TEXT NOT NULL,
+                project TEXT NOT NULL,
+                run_id INTEGER NOT NULL,
+                revision TEXT,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (organization, project, run_id)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_last_used ON runs (last_used)")
+        self._conn.commit()
+
+    def get_many(self, organization, project, runs):
+        """Devuelve {run_id: resultados} de los runs de la lista que están en caché y vigentes."""
+        wanted = {r.get('id'): str(r.get('revision')) for r in runs if is_cacheable(r)}
+        if not wanted:
+            return {}
+        found = {}
+        ids = list(wanted)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i+500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT run_id, revision, payload FROM runs "
+                f"WHERE organization = ? AND project = ? AND run_id IN ({placeholders})",
+                [organization, project, *chunk],
+            ).fetchall()
+            for run_id, revision, payload in rows:
+                if revision == wanted.get(run_id):
+                    found[run_id] = json.loads(zlib.decompress(payload))
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE runs SET last_used = ? WHERE organization = ? AND project = ? AND run_id = ?",
+                [(now, organization, project, run_id) for run_id in found],
+            )
+            self._conn.commit()
+        return found
+
+    def cached_ids(self, organization, project, runs):
+        """Ids de los runs de la lista que están en caché y vigentes, sin leer sus resultados."""
+        wanted = {r.get('id'): str(r.get('revision')) for r in runs if is_cacheable(r)}
+        found = set()
+        ids = list(wanted)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i+500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT run_id, revision FROM runs "
+                f"WHERE organization = ? AND project = ? AND run_id IN ({placeholders})",
+                [organization, project, *chunk],
+            ).fetchall()
+            found.update(run_id for run_id, revision in rows if revision == wanted.get(run_id))
+        return found
+
+    def put_many(self, organization, project, items):
+        """Guarda [(run, resultados), ...]; ignora runs que todavía pueden cambiar."""
+        now = time.time()
+        records = []
+        for run, results in items:
+            if not is_cacheable(run):
+                continue
+            payload = zlib.compress(json.dumps(results, separators=(",", ":")).encode("utf-8"))
+            records.append((organization, project, run.get('id'), str(run.get('revision')),
+                            payload, len(payload), now))
+        if not records:
+            return
+        self._conn.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+        self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Borra los runs menos usados hasta quedar por debajo de max_bytes."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM runs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Dejar margen para no desalojar en cada escritura
+        target = int(self.max_bytes * 0.9)
+        to_delete = []
+        for organization, project, run_id, size in self._conn.execute(
+                "SELECT organization, project, run_id, size FROM runs ORDER BY last_used"):
+            if total <= target:
+                break
+            to_delete.append((organization, project, run_id))
+            total -= size
+        self._conn.executemany(
+            "DELETE FROM runs WHERE organization = ? AND project = ? AND run_id = ?", to_delete
+        )
+        self._conn.commit()
+        self._conn.execute("PRAGMA incremental_vacuum")
+
+    def clear(self):
+        """Vacía la caché (opción "reconstruir caché")."""
+        self._conn.execute("DELETE FROM runs")
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,103 @@
+"""Checkpoints de exportaciones largas para poder reanudarlas.
+
+Una exportación con checkpoint escribe cada unidad (proyecto, plan)
+terminada como un parcial en un directorio de trabajo, con el mismo formato
+que la exportación repartida (ver shards). Si se interrumpe, reanudarla
+descarga solo las unidades que faltan y el archivo final se arma desde los
+parciales en el orden original, igual que una exportación sin cortes.
+
+Un checkpoint más viejo que CHECKPOINT_MAX_AGE no se reanuda: los planes
+pueden haber recibido resultados nuevos desde entonces y el archivo
+mezclaría datos de distintos momentos, así que se empieza de cero.
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+
+from requests.auth import HTTPBasicAuth
+
+from .cache import DEFAULT_CACHE_PATH
+from .metacache import auth_fingerprint
+from .shards import MANIFEST_NAME, finished_ordinals
+
+DEFAULT_CHECKPOINT_ROOT = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "checkpoints")
+
+# Segundos después de los cuales un checkpoint ya no se reanuda
+CHECKPOINT_MAX_AGE = 24 * 3600
+
+# Opciones de fetch_unit que cambian las filas exportadas (el resto solo cambia cómo se descargan)
+ROW_OPTIONS = ('mode', 'suites', 'min_date', 'max_date', 'run_states', 'outcomes')
+
+
+def row_options(options):
+    """Las opciones de options que definen el contenido de la exportación."""
+    return {k: options.get(k) for k in ROW_OPTIONS}
+
+
+def checkpoint_dir_for(organization, project_name, username, token, plans=None, iteration=None,
+                       root=DEFAULT_CHECKPOINT_ROOT, **options):
+    """Directorio de checkpoint para una exportación con estos parámetros.
+
+    Las mismas credenciales y los mismos parámetros dan siempre el mismo
+    directorio, así que una exportación interrumpida se encuentra al volver a
+    pedirla. Las credenciales forman parte de la clave para que un token no
+    reanude (ni lea) datos descargados con otro.
+    """
+    key = json.dumps({
+        'organization': organization,
+        'project': project_name,
+        'plans': plans,
+        'iteration': iteration,
+        'options': row_options(options),
+        'auth': auth_fingerprint(HTTPBasicAuth(username, token)),
+    }, sort_keys=True)
+    return os.path.join(root, hashlib.sha256(key.encode("utf-8")).hexdigest()[:24])
+
+
+def checkpoint_status(out_dir):
+    """(unidades terminadas, unidades totales) de un checkpoint, o None si no hay."""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    ordinals = {u['ordinal'] for u in manifest['units']}
+    return len(finished_ordinals(out_dir) & ordinals), len(ordinals)
+
+
+def checkpoint_age(out_dir):
+    """Segundos desde que se creó el checkpoint de out_dir, o None si no hay.
+
+    Un manifest sin fecha de creación (de una versión anterior) cuenta como
+    infinitamente viejo.
+    """
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        created = json.load(f).get('created')
+    return float("inf") if created is None else max(0.0, time.time() - created)
+
+
+def checkpoint_expired(out_dir, max_age=CHECKPOINT_MAX_AGE):
+    """True si out_dir tiene un checkpoint más viejo que max_age segundos."""
+    age = checkpoint_age(out_dir)
+    return age is not None and age > max_age
+
+
+def clear_checkpoint(out_dir):
+    """Borra el manifest y los parciales de out_dir (no toca otros archivos)."""
+    for path in glob.glob(os.path.join(out_dir, "unit-*.jsonl.gz*")):
+        os.remove(path)
+    manifest = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        os.remove(manifest)
+
+
+def remove_checkpoint(out_dir):
+    """Borra el checkpoint y, si quedó vacío, su directorio."""
+    clear_checkpoint(out_dir)
+    if os.path.isdir(out_dir) and not os.listdir(out_dir):
+        os.rmdir(out_dir)
@@ -0,0 +1,88 @@
+"""Publicación de archivos exportados para descargarlos desde disco.
+
+Los archivos se mueven a una carpeta servida como estática (Streamlit
+``server.enableStaticServing``) bajo un nombre de directorio aleatorio, así el
+navegador los descarga directamente del disco sin pasar por el websocket ni
+por memoria. Los archivos viejos se borran en cada exportación.
+
+Si no se pueden servir como estáticos (carpeta estática deshabilitada o
+archivo de más de MAX_STATIC_FILE_BYTES), la descarga pasa por st.download_button,
+que arma el archivo entero en la memoria del servidor al hacer clic: por eso
+solo se ofrece hasta MAX_BUTTON_DOWNLOAD_BYTES (ver can_download_in_memory).
+"""
+import os
+import secrets
+import shutil
+import tempfile
+import time
+
+EXPORTS_DIR_NAME = "exports"
+# Tiempo que un archivo exportado queda disponible para descargar
+EXPORT_TTL_SECONDS = 30 * 60
+# Límite de tamaño de un archivo estático en Streamlit
+MAX_STATIC_FILE_BYTES = 200 * 1024 * 1024
+# Tamaño máximo de un archivo descargable con st.download_button: Streamlit
+# lo lee completo en memoria (también si se le pasa un archivo abierto)
+MAX_BUTTON_DOWNLOAD_BYTES = 200 * 1024 * 1024
+# Ubicación de las exportaciones que no se pueden servir como estáticas
+TEMP_EXPORTS_ROOT = os.path.join(tempfile.gettempdir(), "exportador-exports")
+
+
+def cleanup_exports(exports_root, max_age=EXPORT_TTL_SECONDS):
+    """Borra las exportaciones publicadas hace más de max_age segundos."""
+    if not os.path.isdir(exports_root):
+        return
+    limit = time.time() - max_age
+    for name in os.listdir(exports_root):
+        path = os.path.join(exports_root, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+        except OSError:
+            pass
+
+
+def publish_export(src_path, file_name, static_root=None):
+    """Mueve el archivo exportado a su ubicación de descarga. Devuelve (ruta, url).
+
+    url es la dirección relativa a la app desde la que Streamlit sirve el
+    archivo como estático. Es None si no hay carpeta estática o si el archivo
+    supera el tamaño que Streamlit sirve; en ese caso el archivo queda en un
+    directorio temporal que también se limpia por antigüedad.
+    """
+    cleanup_exports(TEMP_EXPORTS_ROOT)
+    use_static = static_root and os.path.getsize(src_path) <= MAX_STATIC_FILE_BYTES
+    if use_static:
+        exports_root = os.path.join(static_root, EXPORTS_DIR_NAME)
+        cleanup_exports(exports_root)
+    else:
+        exports_root = TEMP_EXPORTS_ROOT
+    # Directorio con nombre aleatorio: la URL no es adivinable
+    key = secrets.token_urlsafe(16)
+    dest_dir = os.path.join(exports_root, key)
+    os.makedirs(dest_dir)
+    dest_path = os.path.join(dest_dir, file_name)
+    shutil.move(src_path, dest_path)
+    url = f"app/static/{EXPORTS_DIR_NAME}/{key}/{file_name}" if use_static else None
+    return dest_path, url
+
+
+def can_download_in_memory(path):
+    """True si el archivo se puede ofrecer con st.download_button (ver MAX_BUTTON_DOWNLOAD_BYTES)."""
+    return os.path.getsize(path) <= MAX_BUTTON_DOWNLOAD_BYTES
+
+
+def read_file(path):
+    """Lee un archivo exportado (para descargas diferidas).
+
+    Lanza ValueError si supera MAX_BUTTON_DOWNLOAD_BYTES: esos archivos no se
+    leen a memoria y se descargan directamente del disco del servidor.
+    """
+    if not can_download_in_memory(path):
+        raise ValueError(f"{path} supera los {MAX_BUTTON_DOWNLOAD_BYTES // (1024 * 1024)} MB "
+                         "que se pueden descargar desde la app")
+    with open(path, "rb") as f:
+        return f.read()
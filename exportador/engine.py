@@ -0,0 +1,524 @@
+"""Motor de exportación: arma las filas de resultados por plan de pruebas."""
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from .cache import DEFAULT_MAX_BYTES, RunCache
+from .filters import check_date_range, in_date_range, iteration_matches, matches_any, outcome_matches
+from .stats import record_unit
+from .transport import ApiError, configure_pool
+from .azure import (
+    WORKITEMS_BATCH_SIZE,
+    get_all_test_plans,
+    get_plan_runs_from_index,
+    get_projects,
+    get_run_results,
+    get_test_cases_in_suite,
+    get_test_points,
+    get_test_runs,
+    get_test_suites,
+    get_workitems_titles,
+)
+
+# Máximo de descargas de resultados de runs en vuelo al mismo tiempo
+MAX_WORKERS = 8
+
+# Modos de exportación:
+# - "runs": recorre todos los runs del plan y sus resultados para tomar el último
+#   resultado de cada test case (único modo que completa "Run Name").
+# - "points": arma cada fila con el último resultado que ya trae cada test point
+#   (lastResultDetails), sin descargar runs. Requiere O(suites) llamadas en vez
+#   de O(runs). Diferencias con "runs":
+#     * "Run Name" queda vacío y "Run ID" es el lastTestRunId del test point.
+#     * Outcome, Executed By y Execution Date son los del último resultado del
+#       test point en esa suite; en "runs" son los del resultado más reciente del
+#       test case en todo el plan (pueden diferir si el caso está en varias suites
+#       o configuraciones).
+# - "history": historial completo. Recorre los runs como "runs", pero en vez
+#   de quedarse con el último resultado genera una fila por cada resultado de
+#   cada run (en orden cronológico dentro de cada test case). Los test cases
+#   sin resultados tienen una sola fila, igual que en "runs".
+EXPORT_MODES = ("runs", "points", "history")
+# Modos que recorren los runs del plan y sus resultados
+RUN_MODES = ("runs", "history")
+
+# Motores de descarga: "threads" (requests + hilos, este módulo) y "async"
+# (asyncio + httpx, ver async_engine) generan las mismas filas. "odata" arma
+# las filas con consultas a Analytics (ver odata; no admite el modo "history").
+ENGINES = ("threads", "async", "odata")
+
+# Resultado de un test case sin test point: (outcome, executed_by, date, run_id)
+NOT_EXECUTED = ("Not Executed", None, None, None)
+
+# Runs nuevos que se acumulan antes de escribirlos juntos en la caché
+RUN_CACHE_BATCH = 50
+
+# Filas que se retienen como máximo mientras se juntan ids sin título (ver _TitleWindow)
+TITLES_WINDOW_MAX_ROWS = 5000
+
+# Columnas de cada fila exportada, en el orden del archivo de salida
+COLUMNS = [
+    "Project Name", "Plan Name", "Plan ID", "Suite ID", "Suite Name", "Run ID", "Run Name",
+    "Test Case ID", "Test Case Name", "Outcome", "Executed By", "Execution Date", "Iteration Path",
+]
+
+# Origen de los runs de cada plan (ver list_work_units):
+# - "plan": una consulta de runs por plan.
+# - "project": una sola consulta por proyecto, agrupada por plan en memoria
+#   (azure.get_plan_runs_from_index). Conviene cuando se exportan muchos
+#   planes del proyecto; si se exportan pocos, se descargarían runs ajenos.
+RUNS_SCOPES = ("plan", "project")
+RUNS_INDEX_MIN_PLANS = 3
+
+# Versiones de la API usadas por cada grupo de endpoints
+API_VERSIONS = {
+    'core': "7.1-preview.1",
+    'suites': "7.1-preview.1",
+    'runs': "7.1-preview.3",
+    'points': "7.1",
+    'results': "7.1-preview.3",
+}
+
+
+def list_work_units(organization, project_name, username, token, plans=None, iteration=None):
+    """Devuelve la lista ordenada de (proyecto, plan) a exportar.
+
+    Si project_name es None se recorren todos los proyectos de la organización.
+    plans (patrones de id o nombre) e iteration (ruta de iteración, incluye sus
+    hijas) dejan solo los planes que coinciden. Cada unidad indica en
+    runs_scope de dónde salen sus runs (ver RUNS_SCOPES).
+    """
+    if project_name:
+        project_names = [project_name]
+    else:
+        project_names = [p['name'] for p in get_projects(organization, API_VERSIONS['core'], username, token)]
+
+    units = []
+    for name in project_names:
+        project_plans = get_all_test_plans(organization, name, API_VERSIONS['core'], username, token)
+        selected = [
+            plan for plan in project_plans
+            if matches_any(plans, plan['id'], plan['name']) and iteration_matches(iteration, plan.get('iteration'))
+        ]
+        runs_scope = _runs_scope(len(selected), len(project_plans))
+        for plan in selected:
+            units.append({
+                'ordinal': len(units),
+                'project': name,
+                'plan_id': plan['id'],
+                'plan_name': plan['name'],
+                'iteration': plan.get('iteration', "N/A"),
+                'runs_scope': runs_scope,
+            })
+    return units
+
+
+def _runs_scope(selected, total):
+    """"project" si se exportan al menos RUNS_INDEX_MIN_PLANS planes y la mitad de los del proyecto."""
+    return "project" if selected >= RUNS_INDEX_MIN_PLANS and selected * 2 >= total else "plan"
+
+
+def fetch_unit(organization, unit, username, token, max_workers=MAX_WORKERS,
+               cache_path=None, cache_max_bytes=DEFAULT_MAX_BYTES, mode="runs", **filters):
+    """Genera las filas de una unidad (proyecto, plan) de list_work_units.
+
+    Si cache_path está definido se usa la caché persistente de runs completados.
+    filters se pasa a fetch_data_for_project (suites, fechas, estados, outcomes
+    y cache_scope).
+    """
+    configure_pool(max_workers)
+    run_cache = RunCache(cache_path, max_bytes=cache_max_bytes) if cache_path else None
+    # Se mide solo el tiempo propio del plan: mientras el consumidor escribe las filas el reloj se descuenta
+    started = time.perf_counter()
+    rows = 0
+    try:
+        for row in fetch_data_for_project(
+            organization, unit['project'], unit['plan_id'], unit['plan_name'], unit['iteration'],
+            API_VERSIONS['suites'], API_VERSIONS['runs'], API_VERSIONS['points'], API_VERSIONS['results'],
+            username, token, max_workers=max_workers, run_cache=run_cache, mode=mode,
+            runs_scope=unit.get('runs_scope', "plan"), **filters
+        ):
+            rows += 1
+            paused = time.perf_counter()
+            yield row
+            started += time.perf_counter() - paused
+    finally:
+        record_unit(unit['project'], unit['plan_id'], unit['plan_name'], time.perf_counter() - started, rows)
+        if run_cache:
+            run_cache.close()
+
+
+def unit_fetcher(engine="threads"):
+    """Devuelve la función fetch_unit del motor indicado (ver ENGINES)."""
+    if engine not in ENGINES:
+        raise ValueError(f"Motor de exportación desconocido: {engine}")
+    if engine == "async":
+        from .async_engine import fetch_unit as async_fetch_unit
+        return async_fetch_unit
+    if engine == "odata":
+        from .odata import fetch_unit as odata_fetch_unit
+        return odata_fetch_unit
+    return fetch_unit
+
+
+def _slim_result(r):
+    """Reduce un resultado de run a los campos que usa la exportación."""
+    tc = r.get('testCase') or r.get('testCaseReference') or {}
+    return {
+        'testCase': {
+            'id': tc.get('id') or tc.get('testCaseId') or tc.get('workItemId'),
+            'name': tc.get('name') or (tc.get('fields') or {}).get('System.Title') or tc.get('testCaseTitle'),
+        },
+        'outcome': r.get('outcome'),
+        'runBy': {'displayName': (r.get('runBy') or {}).get('displayName')},
+        'completedDate': r.get('completedDate') or r.get('dateCompleted'),
+    }
+
+
+class _RunResult:
+    """Un resultado de run de un test case, solo con los campos que se exportan."""
+
+    __slots__ = ('run_id', 'run_name', 'testcase_name', 'outcome', 'executed_by', 'completed_date')
+
+    def __init__(self, run_id, run_name, testcase_name, outcome, executed_by, completed_date):
+        self.run_id = run_id
+        self.run_name = run_name
+        self.testcase_name = testcase_name
+        self.outcome = outcome
+        self.executed_by = executed_by
+        self.completed_date = completed_date
+
+
+def _intern(value):
+    """Interna textos que se repiten en miles de resultados (outcomes, personas)."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _merge_run_results(run_results_map, run, results):
+    """Conserva en run_results_map el último resultado (_RunResult) de cada test case.
+
+    De cada resultado se copian solo los campos exportados, así que la lista
+    recibida puede descartarse apenas termina la fusión.
+    """
+    for tc_id, tc_name, r, r_date in _iter_results(results):
+        existing = run_results_map.get(tc_id)
+        if existing:
+            existing_date = existing.completed_date
+            if existing_date and r_date and existing_date >= r_date:
+                continue
+        run_results_map[sys.intern(tc_id)] = _run_result(run, tc_name, r, r_date)
+
+def _merge_run_history(history_map, run, results):
+    """Agrega a history_map (test case -> [_RunResult]) todos los resultados del run."""
+    for tc_id, tc_name, r, r_date in _iter_results(results):
+        entries = history_map.get(tc_id)
+        if entries is None:
+            entries = history_map[sys.intern(tc_id)] = []
+        entries.append(_run_result(run, tc_name, r, r_date))
+
+def _iter_results(results):
+    """(test case id, nombre, resultado, fecha) de cada resultado con test case."""
+    for r in results:
+        tc = r.get('testCase') or r.get('testCaseReference') or {}
+        tc_id = str(tc.get('id') or tc.get('testCaseId') or tc.get('workItemId') or tc.get('id'))
+        if not tc_id:
+            continue
+        tc_name = None
+        if isinstance(tc, dict):
+            tc_name = tc.get('name') or (tc.get('fields') or {}).get('System.Title') or tc.get('testCaseTitle')
+        yield tc_id, tc_name, r, r.get('completedDate') or r.get('dateCompleted')
+
+def _run_result(run, tc_name, r, r_date):
+    return _RunResult(
+        run.get('id'), run.get('name'), tc_name or None, _intern(r.get('outcome')),
+        _intern((r.get('runBy') or {}).get('displayName')), r_date,
+    )
+
+def _merge_function(mode):
+    """Función que fusiona los resultados de un run según el modo (ver RUN_MODES)."""
+    return _merge_run_history if mode == "history" else _merge_run_results
+
+def _point_last_result(p):
+    """Devuelve (outcome, executed_by, date, run_id) del último resultado de un test point."""
+    last = p.get('results') or p.get('lastResultDetails') or {}
+    details = last.get('lastResultDetails') or last
+    outcome = last.get('outcome') or ("Active" if not last else last.get('outcome'))
+    executed_by = (details.get('runBy') or {}).get('displayName')
+    date_completed = details.get('dateCompleted') or details.get('completedDate')
+    run_id = last.get('lastTestRunId') or (p.get('lastTestRun') or {}).get('id')
+    return outcome, executed_by, date_completed, (int(run_id) if run_id and str(run_id) != "0" else None)
+
+def _point_fallback_result(p):
+    """(outcome, executed_by, date, run_id) de un test point para el modo "runs".
+
+    Se usa para los test cases sin resultados en los runs del plan; Run ID queda vacío.
+    """
+    last = p.get('results') or p.get('lastResultDetails') or {}
+    outcome = last.get('outcome') or ("Active" if not last else last.get('outcome'))
+    executed_by = (last.get('runBy') or {}).get('displayName')
+    date_completed = last.get('dateCompleted') or last.get('completedDate')
+    return outcome, executed_by, date_completed, None
+
+def _ordered_map(fn, items, max_workers):
+    """Como executor.map, pero con a lo sumo max_workers tareas en vuelo.
+
+    Los resultados se entregan en el orden de items a medida que el consumidor
+    los pide, así que no se adelanta más trabajo del que entra en el pool.
+    """
+    items = iter(items)
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque(executor.submit(fn, item) for item in islice(items, max_workers))
+        while pending:
+            result = pending.popleft().result()
+            for item in islice(items, 1):
+                pending.append(executor.submit(fn, item))
+            yield result
+
+def _points_by_testcase(test_points):
+    """Mapa test case id -> test point (si hay varias configuraciones, queda el último)."""
+    points_map = {}
+    for p in test_points:
+        tc_ref = p.get('testCaseReference') or p.get('testCase') or {}
+        tcid = str(tc_ref.get('id')) if tc_ref else None
+        if tcid:
+            points_map[tcid] = p
+    return points_map
+
+def _suite_cases_and_points(organization, project_name, plan_id, suite_id, api_version, username, token):
+    """Devuelve (testcases, points_map) de una suite.
+
+    Los test points ya traen la referencia y el nombre de su test case, así que
+    normalmente alcanza con recorrerlos una vez. Solo si la suite no tiene test
+    points o su descarga falló se consulta el endpoint de test cases.
+    """
+    try:
+        test_points = get_test_points(organization, project_name, plan_id, suite_id, api_version,
+                                      username, token, raise_errors=True)
+    except ApiError:
+        test_points = None
+    if test_points:
+        points_map = _points_by_testcase(test_points)
+        testcases = []
+        for tcid, p in points_map.items():
+            tc_ref = p.get('testCaseReference') or p.get('testCase') or {}
+            testcases.append({'id': tcid, 'name': tc_ref.get('name')})
+        return testcases, points_map
+
+    # Si los test points fallaron, la falla ya quedó en el reporte de transport
+    testcases = get_test_cases_in_suite(organization, project_name, plan_id, suite_id, api_version, username, token)
+    return testcases, _points_by_testcase(test_points or [])
+
+def _summarize_points(points_map, mode):
+    """Reduce cada test point a la tupla (outcome, executed_by, date, run_id) que usa el modo."""
+    point_result = _point_last_result if mode == "points" else _point_fallback_result
+    point_results = {}
+    for tcid, p in points_map.items():
+        outcome, executed_by, date_completed, run_id = point_result(p)
+        point_results[tcid] = (_intern(outcome), _intern(executed_by), date_completed, run_id)
+    return point_results
+
+def _suite_rows(project_name, plan_id, plan_name, plan_iteration, suite, testcases, point_results,
+                run_results_map, outcomes=None, min_date=None, max_date=None, history=False):
+    """Filas de una suite (todavía sin los títulos que falten), ya filtradas.
+
+    Con history, run_results_map tiene la lista de resultados de cada test
+    case (ver _merge_run_history) y se genera una fila por resultado.
+    """
+    data = []
+    suite_id = suite.get('id')
+    suite_name = suite.get('name')
+    iteration_path = plan_iteration
+
+    def add_row(tcid, tcname, run_id, run_name, outcome, executed_by, date_completed):
+        data.append({
+            "Project Name": project_name,
+            "Plan Name": plan_name,
+            "Plan ID": plan_id,
+            "Suite ID": suite_id,
+            "Suite Name": suite_name,
+            "Run ID": run_id,
+            "Run Name": run_name,
+            "Test Case ID": tcid,
+            "Test Case Name": tcname,
+            "Outcome": outcome,
+            "Executed By": executed_by,
+            "Execution Date": date_completed,
+            "Iteration Path": iteration_path
+        })
+
+    for tc in testcases:
+        tcid = tc.get('id')
+        tcname = tc.get('name')
+        entry = run_results_map.get(tcid)
+        if entry and history:
+            for result in sorted(entry, key=lambda r: r.completed_date or ""):
+                add_row(tcid, tcname, result.run_id, result.run_name, result.outcome, result.executed_by,
+                        result.completed_date)
+        elif entry:
+            add_row(tcid, tcname, entry.run_id, entry.run_name, entry.outcome, entry.executed_by,
+                    entry.completed_date)
+        else:
+            outcome, executed_by, date_completed, run_id = point_results.get(tcid, NOT_EXECUTED)
+            add_row(tcid, tcname, run_id, None, outcome, executed_by, date_completed)
+
+    if outcomes or min_date or max_date:
+        data = [row for row in data
+                if outcome_matches(outcomes, row['Outcome'])
+                and in_date_range(row['Execution Date'], min_date, max_date)]
+    return data
+
+def _missing_title_ids(data):
+    return list(dict.fromkeys(str(row['Test Case ID']) for row in data if not row.get('Test Case Name')))
+
+def _fill_titles(data, titles, run_results_map):
+    """Completa los títulos faltantes con los work items y, si no, con el nombre del último resultado."""
+    for row in data:
+        if not row.get('Test Case Name'):
+            row['Test Case Name'] = titles.get(str(row['Test Case ID']))
+        if not row.get('Test Case Name'):
+            rr = run_results_map.get(str(row['Test Case ID']))
+            if isinstance(rr, list):
+                # Modo "history": el nombre del resultado más reciente
+                rr = max(rr, key=lambda r: r.completed_date or "") if rr else None
+            if rr and rr.testcase_name:
+                row['Test Case Name'] = rr.testcase_name
+
+class _TitleWindow:
+    """Suites seguidas cuyas filas esperan los títulos que les faltan.
+
+    Pedir los títulos suite por suite manda a workitemsbatch POSTs con pocos
+    ids. Las filas de varias suites se retienen hasta juntar
+    WORKITEMS_BATCH_SIZE ids sin título (o max_rows filas) y se resuelven en
+    una sola llamada. Si no queda ningún id pendiente la suite se entrega
+    enseguida, así que la espera solo existe cuando faltan títulos.
+    """
+
+    def __init__(self, max_rows=TITLES_WINDOW_MAX_ROWS):
+        self.max_rows = max_rows
+        self._suites = []
+        self._missing = {}
+        self._rows = 0
+
+    def add(self, data):
+        """Retiene las filas de una suite. True si ya hay que resolver los títulos (ver take)."""
+        self._suites.append(data)
+        self._missing.update(dict.fromkeys(_missing_title_ids(data)))
+        self._rows += len(data)
+        return (not self._missing or len(self._missing) >= WORKITEMS_BATCH_SIZE
+                or self._rows >= self.max_rows)
+
+    def take(self):
+        """(ids sin título, [filas de cada suite]) retenidos, en orden; la ventana queda vacía."""
+        taken = list(self._missing), self._suites
+        self._suites, self._missing, self._rows = [], {}, 0
+        return taken
+
+
+def _resolve_titles(window, organization, username, token, run_results_map, cache_scope=None):
+    """Genera las filas retenidas en window con los títulos que les faltaban."""
+    missing_ids, suites = window.take()
+    titles = get_workitems_titles(organization, missing_ids, username=username, token=token,
+                                  cache_scope=cache_scope) if missing_ids else {}
+    for data in suites:
+        _fill_titles(data, titles, run_results_map)
+        yield from data
+
+def _select_runs(all_runs, run_states):
+    return [run for run in all_runs if run.get('state') in run_states] if run_states else all_runs
+
+def fetch_data_for_project(organization, project_name, plan_id, plan_name, plan_iteration, 
+                          api_version_suites, api_version_runs, api_version_points, 
+                          api_version_results, username, token, max_workers=MAX_WORKERS,
+                          run_cache=None, mode="runs", suites=None, min_date=None, max_date=None,
+                          run_states=None, outcomes=None, runs_scope="plan", cache_scope=None):
+    """Genera las filas de un plan, suite por suite (ver COLUMNS).
+
+    Es un generador: las filas se entregan a medida que se completa cada suite
+    para que la memoria no dependa del tamaño total de la exportación. Ver
+    EXPORT_MODES para la diferencia entre modos.
+
+    Filtros (todos opcionales):
+    - suites: patrones de id o nombre; se exportan esas suites y sus hijas.
+    - min_date/max_date ('AAAA-MM-DD'): en modo "runs" solo se consultan los
+      runs actualizados en el rango; en ambos modos quedan solo las filas
+      ejecutadas en el rango.
+    - run_states: estados de run a considerar (p. ej. ["Completed"]).
+    - outcomes: outcomes de las filas a exportar (p. ej. ["Failed"]).
+
+    runs_scope indica si los runs se consultan por plan o salen del índice del
+    proyecto (ver RUNS_SCOPES). cache_scope es el ámbito de la exportación en
+    las cachés de títulos y de índices de runs (ver metacache.new_cache_scope).
+    """
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"Modo de exportación desconocido: {mode}")
+    check_date_range(min_date, max_date)
+    test_suites = get_test_suites(organization, project_name, plan_id, api_version_suites, username, token,
+                                  subtrees=suites)
+    if not test_suites:
+        return
+
+    # En modo "points" no se recorren runs: el último resultado sale de los test points
+    all_runs = []
+    if mode in RUN_MODES:
+        state = run_states[0] if run_states and len(run_states) == 1 else None
+        if runs_scope == "project":
+            all_runs = get_plan_runs_from_index(organization, project_name, plan_id, api_version_runs, username,
+                                                token, min_date=min_date, max_date=max_date, state=state,
+                                                cache_scope=cache_scope)
+        else:
+            all_runs = get_test_runs(organization, project_name, plan_id, api_version_runs, username, token,
+                                     min_date=min_date, max_date=max_date, state=state)
+        all_runs = _select_runs(all_runs, run_states)
+    run_results_map = {}
+
+    # Los runs completados que ya están en caché no se vuelven a descargar
+    cached = run_cache.get_many(organization, project_name, all_runs) if run_cache else {}
+
+    # Descarga concurrente (acotada por max_workers) de los resultados de cada run.
+    # None indica que la descarga falló (queda en el reporte de fallas de transport).
+    def _fetch_results(run):
+        run_id = run.get('id')
+        if run_id in cached:
+            return cached[run_id]
+        try:
+            results = get_run_results(organization, project_name, run_id, api_version_results, username, token)
+        except ApiError:
+            return None
+        return [_slim_result(r) for r in results]
+
+    # Los resultados se fusionan en el orden de all_runs (igual que el recorrido
+    # secuencial) a medida que llegan, y se descartan después de guardarlos en caché
+    merge = _merge_function(mode)
+    to_store = []
+    for run, results in zip(all_runs, _ordered_map(_fetch_results, all_runs, max_workers)):
+        run_id = run.get('id')
+        if run_id in cached:
+            del cached[run_id]
+        elif run_cache and results is not None:
+            to_store.append((run, results))
+            if len(to_store) >= RUN_CACHE_BATCH:
+                run_cache.put_many(organization, project_name, to_store)
+                to_store = []
+        merge(run_results_map, run, results or [])
+    if to_store:
+        run_cache.put_many(organization, project_name, to_store)
+    del to_store
+
+    # Las suites se descargan en paralelo (acotado por max_workers) y se procesan en orden
+    def _load_suite(suite):
+        testcases, points_map = _suite_cases_and_points(organization, project_name, plan_id, suite.get('id'),
+                                                        api_version_points, username, token)
+        return testcases, _summarize_points(points_map, mode)
+
+    # Los títulos faltantes de varias suites se piden juntos, en lotes llenos (ver _TitleWindow)
+    window = _TitleWindow()
+    for suite, (testcases, point_results) in zip(test_suites, _ordered_map(_load_suite, test_suites, max_workers)):
+        data = _suite_rows(project_name, plan_id, plan_name, plan_iteration, suite, testcases, point_results,
+                           run_results_map, outcomes=outcomes, min_date=min_date, max_date=max_date,
+                           history=mode == "history")
+        if window.add(data):
+            yield from _resolve_titles(window, organization, username, token, run_results_map, cache_scope)
+    yield from _resolve_titles(window, organization, username, token, run_results_map, cache_scope)
@@ -0,0 +1,127 @@
+"""Exploración en la app de las filas de una exportación: páginas, filtros y conteos.
+
+Las filas se guardan mientras se escriben (ResultExplorer.collect no cambia
+el flujo de escritura) con cada columna codificada como enteros más su tabla
+de valores, igual que los resúmenes (ver summary). Filtrar y contar por
+proyecto, plan, suite, outcome o tester son operaciones vectorizadas sobre
+los códigos, sin recorrer las filas, y solo se decodifican las filas de la
+página pedida (o las del subconjunto filtrado al descargarlo).
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .engine import COLUMNS
+from .summary import CodedColumn
+
+# Columnas por las que se filtra y se cuenta
+FILTER_COLUMNS = ("Project Name", "Plan Name", "Suite Name", "Outcome", "Executed By")
+DEFAULT_PAGE_SIZE = 100
+# Filas que se decodifican juntas al recorrer el subconjunto filtrado
+ROWS_CHUNK = 10000
+
+
+class ResultExplorer:
+    """Filas de una exportación codificadas por columna, para paginarlas y filtrarlas en memoria."""
+
+    def __init__(self, columns=COLUMNS):
+        self.columns = tuple(columns)
+        self._coded = {c: CodedColumn() for c in self.columns}
+        # Al terminar la recolección: códigos (np.int32) y valores (el código -1 es la última posición, None)
+        self._codes = None
+        self._values = None
+        self._lock = threading.Lock()
+
+    def collect(self, rows):
+        """Devuelve las mismas filas de rows, guardándolas codificadas."""
+        columns = [(name, column.index, column.codes.append) for name, column in self._coded.items()]
+        for row in rows:
+            for name, index, add_code in columns:
+                value = row.get(name)
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(index) - 2
+                add_code(code)
+            yield row
+
+    def _frozen(self):
+        """(códigos, valores) de cada columna; se arman una sola vez, al primer uso."""
+        with self._lock:
+            if self._codes is None:
+                codes, values = {}, {}
+                for name, column in self._coded.items():
+                    codes[name] = np.frombuffer(column.codes, dtype=np.int32) if column.codes \
+                        else np.array([], dtype=np.int32)
+                    categories = [value for value, code in column.index.items() if code >= 0]
+                    values[name] = np.array(categories + [None], dtype=object)
+                self._codes, self._values = codes, values
+            return self._codes, self._values
+
+    def __len__(self):
+        return len(self._coded[self.columns[0]].codes)
+
+    def mask(self, filters=None, exclude=None):
+        """Máscara booleana de las filas que cumplen filters ({columna: [valores]}), o None si no filtra.
+
+        Una columna sin valores no filtra. exclude omite el filtro de esa
+        columna (para contar sus valores con el resto de los filtros).
+        """
+        codes, values = self._frozen()
+        mask = None
+        for name, wanted in (filters or {}).items():
+            if not wanted or name == exclude:
+                continue
+            index = self._coded[name].index
+            # Tabla código -> ¿se quiere? (la posición -1 es "sin valor")
+            lookup = np.zeros(len(values[name]), dtype=bool)
+            for value in wanted:
+                code = index.get(value)
+                if code is not None:
+                    lookup[code] = True
+            column_mask = lookup[codes[name]]
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    def count(self, filters=None):
+        """Cantidad de filas que cumplen filters."""
+        mask = self.mask(filters)
+        return len(self) if mask is None else int(np.count_nonzero(mask))
+
+    def value_counts(self, column, filters=None):
+        """[(valor, filas)] de column con el resto de filters aplicado, de más a menos filas.
+
+        Los valores sin filas con esos filtros no aparecen; el vacío es None.
+        """
+        codes, values = self._frozen()
+        column_codes = codes[column]
+        mask = self.mask(filters, exclude=column)
+        if mask is not None:
+            column_codes = column_codes[mask]
+        # bincount no admite el código -1: se cuenta desplazado y "sin valor" pasa a la última posición
+        counts = np.bincount(column_codes + 1, minlength=len(values[column]))
+        counts = np.concatenate([counts[1:], counts[:1]])
+        order = np.argsort(-counts, kind="stable")
+        return [(values[column][i], int(counts[i])) for i in order if counts[i]]
+
+    def _positions(self, filters):
+        mask = self.mask(filters)
+        return np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+
+    def _decode(self, positions):
+        codes, values = self._frozen()
+        return {name: values[name][codes[name][positions]] for name in self.columns}
+
+    def page(self, filters=None, page=0, page_size=DEFAULT_PAGE_SIZE):
+        """(DataFrame con las filas de la página, filas que cumplen filters). page empieza en 0."""
+        positions = self._positions(filters)
+        start = max(0, page) * page_size
+        return pd.DataFrame(self._decode(positions[start:start + page_size])), len(positions)
+
+    def rows(self, filters=None):
+        """Genera las filas (dicts, como las exportadas) que cumplen filters, en su orden original."""
+        positions = self._positions(filters)
+        for start in range(0, len(positions), ROWS_CHUNK):
+            decoded = self._decode(positions[start:start + ROWS_CHUNK])
+            for values in zip(*(decoded[name].tolist() for name in self.columns)):
+                yield dict(zip(self.columns, values))
@@ -0,0 +1,198 @@
+"""Exportación completa a archivo, sin dependencias de la interfaz.
+
+Es el punto de entrada común de la app de Streamlit y de la línea de comandos.
+"""
+import shutil
+import tempfile
+
+from .checkpoint import CHECKPOINT_MAX_AGE, checkpoint_expired, clear_checkpoint, remove_checkpoint, row_options
+from .engine import ENGINES, list_work_units, unit_fetcher
+from .metacache import new_cache_scope, project_runs, workitem_titles
+from .shards import (
+    PartialWriter,
+    export_unit,
+    finished_ordinals,
+    iter_partial_rows,
+    run_parallel_export,
+    write_manifest,
+)
+from .stats import profiled
+from .store import ResultStore
+from .writers import summary_path, write_rows, write_summary_xlsx, write_xlsx
+
+
+def export_to_file(organization, project_name, username, token, output_path, output_format="xlsx",
+                   workers=1, progress=None, plans=None, iteration=None, profile_path=None,
+                   engine="threads", checkpoint_dir=None, resume=False, summary=False,
+                   store_path=None, explorer=None, **options):
+    """Exporta un proyecto (o todos si project_name es None) a output_path.
+
+    progress(porcentaje, mensaje) se invoca a medida que avanza la exportación.
+    workers > 1 reparte los planes entre procesos. plans e iteration filtran
+    los planes (ver engine.list_work_units), engine elige el motor de descarga
+    (ver engine.ENGINES) y options se pasa a su fetch_unit. Con profile_path
+    la exportación se perfila con cProfile (ver stats.profiled).
+
+    Con checkpoint_dir cada plan terminado queda guardado en ese directorio
+    (ver checkpoint). Con resume se reutilizan los planes que ya estaban
+    guardados y solo se descargan los que faltan; sin resume, o si el
+    checkpoint tiene más de CHECKPOINT_MAX_AGE segundos, se empieza de cero.
+    El checkpoint se borra cuando el archivo final queda escrito.
+
+    Con summary se agregan las hojas de resumen (ver summary): en el mismo
+    archivo si es .xlsx y, si no, en un .xlsx aparte (writers.summary_path).
+    Con store_path las filas también se guardan en ese almacén local (ver
+    store), para consultarlas después sin volver a Azure DevOps. Con explorer
+    (un explorer.ResultExplorer) las filas escritas quedan además en memoria
+    para recorrerlas y filtrarlas desde la app.
+
+    Devuelve la cantidad de filas escritas.
+    """
+    # Los títulos de work items y los índices de runs se reutilizan entre planes
+    # y proyectos, pero cada exportación tiene su ámbito en esas cachés: no
+    # arrastra datos de otra anterior ni pisa los de otra simultánea
+    scope = new_cache_scope()
+    try:
+        with profiled(profile_path):
+            return _export_to_file(organization, project_name, username, token, output_path, output_format,
+                                   workers, progress, plans, iteration, engine, checkpoint_dir, resume, summary,
+                                   store_path, explorer, cache_scope=scope, **options)
+    finally:
+        workitem_titles.discard(scope)
+        project_runs.discard(scope)
+
+
+def _export_to_file(organization, project_name, username, token, output_path, output_format,
+                    workers, progress, plans, iteration, engine, checkpoint_dir, resume, summary, store_path,
+                    explorer, **options):
+    if engine not in ENGINES:
+        raise ValueError(f"Motor de exportación desconocido: {engine}")
+    if engine == "odata":
+        # Antes de listar planes: el modo "history" no se puede exportar con OData
+        from .odata import check_mode
+        check_mode(options.get('mode', "runs"))
+
+    def report(pct, message):
+        if progress:
+            progress(pct, message)
+
+    if project_name:
+        report(10, f"Procesando proyecto específico: {project_name}")
+    else:
+        report(10, "Obteniendo lista de proyectos y planes...")
+    units = list_work_units(organization, project_name, username, token, plans=plans, iteration=iteration)
+    total_units = len(units)
+
+    def write_output(rows):
+        if explorer is not None:
+            rows = explorer.collect(rows)
+        if not store_path:
+            return _write_output(rows, output_path, output_format, summary)
+        store = ResultStore(store_path)
+        try:
+            rows = store.record(organization, rows, project=project_name, mode=options.get('mode', "runs"))
+            return _write_output(rows, output_path, output_format, summary)
+        finally:
+            store.close()
+
+    def unit_progress(j, unit):
+        report(10 + int(j/total_units*85),
+               f"📦 Procesando plan: {unit['plan_name']} - {unit['project']} ({j+1}/{total_units})")
+
+    if checkpoint_dir or (workers > 1 and total_units > 1):
+        # Cada plan se escribe en un parcial y al final se unen en orden
+        out_dir = checkpoint_dir or tempfile.mkdtemp(prefix="exportador-")
+        try:
+            if checkpoint_dir and resume and checkpoint_expired(out_dir):
+                report(10, f"⚠️ El progreso guardado tiene más de {CHECKPOINT_MAX_AGE // 3600} horas: "
+                           "se descarta y la exportación empieza de cero")
+                clear_checkpoint(out_dir)
+            elif checkpoint_dir and not resume:
+                clear_checkpoint(out_dir)
+            try:
+                write_manifest(out_dir, organization, units, options=row_options(options))
+            except ValueError as e:
+                raise ValueError("El checkpoint guardado corresponde a otra lista de planes u otras opciones; "
+                                 "exportá sin reanudar para empezar de cero.") from e
+            finished = finished_ordinals(out_dir)
+            pending = [u for u in units if u['ordinal'] not in finished]
+            if finished:
+                report(10, f"Reanudando: {total_units - len(pending)} de {total_units} planes ya exportados")
+            _export_partials(organization, pending, out_dir, username, token, workers, engine,
+                             total_units - len(pending), total_units, report, unit_progress, **options)
+            report(95, "Generando archivo de salida...")
+            rows = write_output(iter_partial_rows(out_dir))
+        finally:
+            if not checkpoint_dir:
+                shutil.rmtree(out_dir, ignore_errors=True)
+        if checkpoint_dir:
+            remove_checkpoint(checkpoint_dir)
+        return rows
+
+    if engine == "async":
+        # Un solo recorrido asíncrono para todos los planes: varios avanzan a la vez
+        from .async_engine import fetch_units
+        return write_output(fetch_units(organization, units, username, token, progress=unit_progress, **options))
+
+    fetch_unit = unit_fetcher(engine)
+
+    def iter_rows():
+        for j, unit in enumerate(units):
+            unit_progress(j, unit)
+            yield from fetch_unit(organization, unit, username, token, **options)
+
+    return write_output(iter_rows())
+
+
+def _write_output(rows, output_path, output_format, summary):
+    """Escribe las filas y, con summary, las hojas de resumen calculadas sobre esas mismas filas."""
+    if not summary:
+        return write_rows(rows, output_path, output_format)
+    # pandas y numpy se cargan solo si se piden resúmenes
+    from .summary import SUMMARY_SHEETS, SummaryCollector, summarize
+    collector = SummaryCollector()
+
+    def sheets():
+        frames = summarize(collector.frame())
+        return {SUMMARY_SHEETS[k]: frame for k, frame in frames.items()}
+
+    if output_format == "xlsx":
+        return write_xlsx(collector.collect(rows), output_path, extra_sheets=sheets)
+    count = write_rows(collector.collect(rows), output_path, output_format)
+    write_summary_xlsx(sheets(), summary_path(output_path))
+    return count
+
+
+def _export_partials(organization, units, out_dir, username, token, workers, engine,
+                     already_done, total_units, report, unit_progress, **options):
+    """Escribe el parcial de cada unidad de units en out_dir."""
+    if workers > 1 and len(units) > 1:
+        def shard_progress(done, total, unit):
+            done += already_done
+            report(10 + int(done/total_units*85), f"📦 Plan terminado: {unit['plan_name']} ({done}/{total_units})")
+
+        run_parallel_export(organization, units, out_dir, username, token, workers,
+                            progress=shard_progress, engine=engine, **options)
+        return
+
+    if engine == "async":
+        # Recorrido asíncrono de todos los planes; el parcial cambia cuando empieza el plan siguiente
+        from .async_engine import fetch_units
+        writer = PartialWriter(out_dir)
+
+        def next_unit(j, unit):
+            writer.start(unit)
+            unit_progress(already_done + j, unit)
+
+        try:
+            for row in fetch_units(organization, units, username, token, progress=next_unit, **options):
+                writer.write(row)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.finish()
+        return
+
+    for j, unit in enumerate(units):
+        unit_progress(already_done + j, unit)
+        export_unit(organization, unit, out_dir, username, token, engine=engine, **options)
@@ -0,0 +1,114 @@
+"""Filtros de alcance de la exportación (planes, iteración, suites, fechas, estados).
+
+Los filtros se aplican lo antes posible: los planes antes de listar suites,
+las suites antes de pedir sus test points y el rango de fechas en la consulta
+de runs, para que lo que queda afuera nunca se descargue.
+"""
+import fnmatch
+from datetime import date, datetime, time, timedelta, timezone
+
+# La consulta de runs por fecha de Azure DevOps admite rangos de hasta 7 días
+RUNS_QUERY_MAX_DAYS = 7
+
+# Valores habituales para los filtros de estado de run y outcome
+RUN_STATES = ("Completed", "InProgress", "Aborted", "NotStarted", "Waiting", "NeedsInvestigation")
+OUTCOMES = ("Passed", "Failed", "Blocked", "NotApplicable", "Paused", "InProgress", "Not Executed", "Active")
+
+# Outcomes (normalizados con outcome_key) que no cuentan como ejecución
+NOT_EXECUTED_OUTCOMES = ("", "notexecuted", "active", "none", "unspecified")
+
+
+def parse_patterns(text):
+    """Lista de patrones a partir de un texto separado por comas (vacío -> None)."""
+    if not text:
+        return None
+    patterns = [p.strip() for p in text.split(",") if p.strip()]
+    return patterns or None
+
+
+def matches_any(patterns, item_id, name):
+    """True si el id coincide exactamente o el nombre con algún patrón (comodines *, ?).
+
+    Sin patrones todo coincide. La comparación de nombres no distingue mayúsculas.
+    """
+    if not patterns:
+        return True
+    name = (name or "").lower()
+    for pattern in patterns:
+        if str(item_id) == pattern or fnmatch.fnmatchcase(name, pattern.lower()):
+            return True
+    return False
+
+
+def iteration_matches(prefix, path):
+    """True si path es la iteración prefix o una iteración hija de ella."""
+    if not prefix:
+        return True
+    prefix = prefix.strip("\\").lower()
+    path = (path or "").strip("\\").lower()
+    return path == prefix or path.startswith(prefix + "\\")
+
+
+def outcome_key(value):
+    """Outcome normalizado: sin espacios y en minúsculas ("" si no hay).
+
+    Los resultados de runs usan "Passed"/"NotExecuted" y los test points
+    "passed"/"notExecuted"; la fila sin resultado usa "Not Executed".
+    """
+    return (value or "").replace(" ", "").lower()
+
+
+def outcome_matches(outcomes, value):
+    """True si value está en outcomes, sin distinguir mayúsculas ni espacios (ver outcome_key)."""
+    if not outcomes:
+        return True
+    if not value:
+        return False
+    key = outcome_key(value)
+    return any(key == outcome_key(o) for o in outcomes)
+
+
+def parse_date(value):
+    """date a partir de 'AAAA-MM-DD' (o un date); None si value es vacío."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def in_date_range(value, min_date=None, max_date=None):
+    """True si la fecha ISO value cae en [min_date, max_date] (días UTC, inclusive)."""
+    if not min_date and not max_date:
+        return True
+    if not value:
+        return False
+    day = value[:10]
+    if min_date and day < str(min_date):
+        return False
+    if max_date and day > str(max_date):
+        return False
+    return True
+
+
+def date_windows(min_date, max_date, days=RUNS_QUERY_MAX_DAYS):
+    """Parte [min_date, max_date] en ventanas (desde, hasta) de a lo sumo `days` días.
+
+    Devuelve datetimes UTC; max_date se incluye completo.
+    """
+    start = datetime.combine(parse_date(min_date), time.min, tzinfo=timezone.utc)
+    end = datetime.combine(parse_date(max_date) + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    windows = []
+    while start < end:
+        stop = min(start + timedelta(days=days), end)
+        windows.append((start, stop))
+        start = stop
+    return windows
+
+
+def check_date_range(min_date, max_date):
+    """Valida el rango de fechas; lanza ValueError si no es utilizable."""
+    if max_date and not min_date:
+        raise ValueError("El rango de fechas necesita una fecha de inicio.")
+    if min_date and max_date and parse_date(min_date) > parse_date(max_date):
+        raise ValueError("La fecha de inicio es posterior a la fecha de fin.")
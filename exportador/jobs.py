@@ -0,0 +1,218 @@
+"""Exportaciones en segundo plano, compartidas entre las sesiones del proceso.
+
+La app de Streamlit encola la exportación y recibe un id de trabajo; la
+exportación corre en un hilo del proceso, así que sobrevive a los reruns y
+a las desconexiones de la sesión que la pidió, y la sesión solo consulta el
+avance. Como máximo MAX_RUNNING_JOBS exportaciones corren a la vez; las demás
+esperan su turno.
+
+Dos pedidos idénticos (misma organización, mismo alcance, mismas opciones y
+mismo formato) mientras el primero no terminó se atienden con un único
+trabajo. El alcance es la lista de planes que ve cada token (ver submit), así
+que un pedido se une a un trabajo ajeno solo si su token ve exactamente los
+mismos planes.
+"""
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .checkpoint import row_options
+from .downloads import publish_export
+from .engine import list_work_units
+from .exporter import export_to_file
+from .metacache import metadata_cache
+from .stats import get_stats, mark, raw_stats_since, release
+from .transport import failures_since, mark_failures, release_failures
+from .writers import summary_path
+
+# Exportaciones que corren al mismo tiempo en el proceso
+MAX_RUNNING_JOBS = 2
+# Tiempo que un trabajo terminado sigue disponible para sus sesiones
+JOB_TTL_SECONDS = 30 * 60
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "error"
+
+
+class ExportJob:
+    """Estado de una exportación en segundo plano (lo lee la interfaz)."""
+
+    def __init__(self, job_id, key, output_format, explore=False):
+        self.id = job_id
+        self.key = key
+        self.output_format = output_format
+        self.status = QUEUED
+        self.progress = 0
+        self.message = "En cola..."
+        # Sesiones que pidieron esta misma exportación
+        self.subscribers = 1
+        self.rows = None
+        self.error = None
+        self.failures = []
+        # Planes que no se pudieron exportar (ver stats.record_unit)
+        self.skipped_plans = []
+        self.stats = None
+        self.metadata = None
+        self.output_path = None
+        # .xlsx con las hojas de resumen cuando no van en el archivo exportado
+        self.summary_path = None
+        self.has_summary_file = False
+        # Filas exportadas para explorarlas en la app (ver explorer); None si no se pidió.
+        # Ocupan memoria hasta que el trabajo expira
+        self.explorer = None
+        if explore:
+            from .explorer import ResultExplorer
+            self.explorer = ResultExplorer()
+        self.created = time.time()
+        self.finished = None
+        self._published = {}
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED)
+
+    def report(self, progress, message):
+        self.progress = progress
+        self.message = message
+
+    def publish(self, file_name, static_root=None, summary=False):
+        """Publica el archivo (o, con summary, el de resúmenes) para descargarlo, una sola vez.
+
+        Devuelve (ruta, url) de publish_export.
+        """
+        attr = 'summary_path' if summary else 'output_path'
+        with self._lock:
+            if attr not in self._published:
+                self._published[attr] = publish_export(getattr(self, attr), file_name, static_root)
+                setattr(self, attr, None)
+            return self._published[attr]
+
+
+class JobManager:
+    """Cola de exportaciones con límite global y trabajos compartidos."""
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, ttl=JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="exportador-job")
+        self._jobs = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, organization, project_name, username, token, output_format="xlsx",
+               plans=None, iteration=None, explore=False, **kwargs):
+        """Encola una exportación (argumentos de exporter.export_to_file) y devuelve el id del trabajo.
+
+        Con explore las filas quedan también en job.explorer para explorarlas
+        desde la app mientras el trabajo siga disponible.
+
+        Si ya hay un trabajo idéntico sin terminar, devuelve el id de ese. La
+        lista de planes se obtiene acá con el token del pedido: además de
+        definir el alcance valida el token antes de compartir un trabajo (sale
+        de la caché de metadatos, que revalida cada token).
+        """
+        units = list_work_units(organization, project_name, username, token, plans=plans, iteration=iteration)
+        key = _job_key(organization, project_name, output_format, plans, iteration, units, explore, kwargs)
+        with self._lock:
+            self._cleanup()
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.subscribers += 1
+                return job.id
+            job = ExportJob(secrets.token_hex(8), key, output_format, explore=explore)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+        self._executor.submit(self._run, job, organization, project_name, username, token,
+                              output_format, plans, iteration, kwargs)
+        return job.id
+
+    def get(self, job_id):
+        """El trabajo con ese id, o None si no existe o ya expiró."""
+        with self._lock:
+            # También acá (no solo al encolar): los trabajos expirados liberan sus archivos y su explorador
+            self._cleanup()
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job):
+        """Cantidad de trabajos en cola antes que job (0 si ya está corriendo)."""
+        with self._lock:
+            queued = [j for j in self._jobs.values() if j.status == QUEUED]
+        return sum(1 for j in queued if j.created < job.created)
+
+    def _run(self, job, organization, project_name, username, token, output_format, plans, iteration, kwargs):
+        job.status = RUNNING
+        job.report(0, "Iniciando exportación...")
+        failures_mark = mark_failures()
+        stats_mark = mark()
+        metadata_before = metadata_cache.stats()
+        started = time.perf_counter()
+        fd, output_path = tempfile.mkstemp(prefix="test_results-", suffix=f".{output_format}")
+        os.close(fd)
+        status = FAILED
+        try:
+            job.rows = export_to_file(organization, project_name, username, token, output_path, output_format,
+                                      progress=job.report, plans=plans, iteration=iteration,
+                                      explorer=job.explorer, **kwargs)
+        except Exception as e:
+            job.error = str(e)
+            job.explorer = None
+            for path in (output_path, summary_path(output_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+        else:
+            job.output_path = output_path
+            if os.path.exists(summary_path(output_path)):
+                job.summary_path = summary_path(output_path)
+                job.has_summary_file = True
+            status = DONE
+        finally:
+            # Con otras exportaciones en curso estas cifras pueden incluir parte de su actividad
+            job.failures = failures_since(failures_mark)
+            job.stats = get_stats(raw_stats_since(stats_mark))
+            job.skipped_plans = job.stats['skipped_plans']
+            # El servidor no se reinicia entre trabajos: lo que ya no se necesita se descarta
+            release_failures(failures_mark, trim=True)
+            release(stats_mark, trim=True)
+            job.stats['seconds'] = round(time.perf_counter() - started, 2)
+            metadata_after = metadata_cache.stats()
+            job.metadata = {k: metadata_after[k] - metadata_before[k] for k in ('hits', 'revalidated', 'misses')}
+            job.finished = time.time()
+            # El estado final se publica al último: quien lo vea ya tiene todos los datos
+            job.status = status
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _cleanup(self):
+        """Olvida los trabajos terminados hace más de ttl segundos (y borra sus archivos sin publicar)."""
+        limit = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished < limit:
+                del self._jobs[job_id]
+                for path in (job.output_path, job.summary_path):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+
+
+def _job_key(organization, project_name, output_format, plans, iteration, units, explore, kwargs):
+    """Clave de deduplicación: organización, alcance (planes visibles) y opciones que cambian el archivo."""
+    raw = json.dumps({
+        'organization': organization,
+        'project': project_name,
+        'format': output_format,
+        'plans': plans,
+        'iteration': iteration,
+        'units': [(u['project'], u['plan_id']) for u in units],
+        'options': row_options(kwargs),
+        'summary': bool(kwargs.get('summary')),
+        'store': kwargs.get('store_path'),
+        'explore': bool(explore),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+job_manager = JobManager()
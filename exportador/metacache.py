@@ -0,0 +1,207 @@
+"""Caché en memoria de metadatos que cambian poco (proyectos, planes, suites).
+
+La caché vive en el proceso, así que la comparten todas las sesiones de
+Streamlit. La clave es la URL (que incluye la organización), nunca el token:
+los datos se comparten, pero cada token tiene que haber sido validado por el
+servidor para esa URL antes de recibir una respuesta desde la caché. Un token
+nuevo se valida con una petición condicional (If-None-Match) que, si nada
+cambió, cuesta solo un 304.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+METADATA_TTL_SECONDS = 10 * 60
+METADATA_MAX_ENTRIES = 4096
+
+
+def auth_fingerprint(auth):
+    """Huella no reversible de las credenciales (solo para saber si ya se validaron)."""
+    if auth is None:
+        return ""
+    raw = f"{auth.username}:{auth.password}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class MetadataCache:
+    """Respuestas completas (todas las páginas) por URL, con TTL y revalidación por ETag."""
+
+    def __init__(self, ttl=METADATA_TTL_SECONDS, max_entries=METADATA_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def lookup(self, url, fingerprint):
+        """Devuelve (items, etag) o (None, etag).
+
+        items solo se devuelve si la entrada está vigente y esas credenciales ya
+        fueron validadas para la URL. etag (si la respuesta entró en una sola
+        página) sirve para revalidar con If-None-Match.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None, None
+            self._entries.move_to_end(url)
+            fresh = time.monotonic() - entry['fetched_at'] < self.ttl
+            if fresh and fingerprint in entry['verified']:
+                self.hits += 1
+                return list(entry['items']), None
+            return None, entry['etag']
+
+    def revalidate(self, url, fingerprint):
+        """El servidor respondió 304: la entrada sigue vigente para esas credenciales."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            entry['fetched_at'] = time.monotonic()
+            entry['verified'].add(fingerprint)
+            self.revalidated += 1
+            return list(entry['items'])
+
+    def store(self, url, fingerprint, items, etag):
+        with self._lock:
+            self.misses += 1
+            self._entries[url] = {
+                'items': list(items),
+                'etag': etag,
+                'fetched_at': time.monotonic(),
+                'verified': {fingerprint},
+            }
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'entries': len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+metadata_cache = MetadataCache()
+
+
+# Títulos de work items que se recuerdan como máximo (se descartan los menos usados)
+WORKITEM_TITLES_MAX_ENTRIES = 100000
+
+
+def new_cache_scope():
+    """Ámbito nuevo para las cachés de una exportación (ver TitleCache y ProjectRunsIndex).
+
+    Es un texto para que viaje a los procesos de una exportación repartida.
+    """
+    return uuid.uuid4().hex
+
+
+class TitleCache:
+    """LRU de títulos de work items por (ámbito, organización, credenciales, id).
+
+    Un mismo test case aparece en muchas suites y planes: con esta caché su
+    título se pide una sola vez por exportación. Las credenciales son parte de
+    la clave para no mostrar a un token títulos que no puede leer. Cada
+    exportación usa su propio ámbito (ver new_cache_scope): dos exportaciones
+    simultáneas no se pisan y ninguna recibe títulos de otra anterior.
+    """
+
+    def __init__(self, max_entries=WORKITEM_TITLES_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._titles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, organization, fingerprint, ids, scope=None):
+        """Devuelve ({id: título} de los ids conocidos, [ids que faltan])."""
+        found = {}
+        missing = []
+        with self._lock:
+            for wid in ids:
+                key = (scope, organization, fingerprint, wid)
+                if key in self._titles:
+                    self._titles.move_to_end(key)
+                    found[wid] = self._titles[key]
+                else:
+                    missing.append(wid)
+        return found, missing
+
+    def put_many(self, organization, fingerprint, titles, scope=None):
+        with self._lock:
+            for wid, title in titles.items():
+                key = (scope, organization, fingerprint, wid)
+                self._titles[key] = title
+                self._titles.move_to_end(key)
+            while len(self._titles) > self.max_entries:
+                self._titles.popitem(last=False)
+
+    def discard(self, scope):
+        """Olvida los títulos del ámbito scope (al terminar su exportación)."""
+        with self._lock:
+            for key in [key for key in self._titles if key[0] == scope]:
+                del self._titles[key]
+
+    def clear(self):
+        with self._lock:
+            self._titles.clear()
+
+
+workitem_titles = TitleCache()
+
+
+# Índices de runs de proyectos que se conservan a la vez (se descartan los menos usados)
+RUNS_INDEX_MAX_PROJECTS = 8
+
+
+class ProjectRunsIndex:
+    """Runs de cada proyecto agrupados por plan, cargados una sola vez.
+
+    La clave empieza por el ámbito de la exportación (ver new_cache_scope) e
+    incluye organización, credenciales y filtros de la consulta. Si varios
+    planes del mismo proyecto piden el índice a la vez, solo el primero lo
+    carga y los demás esperan. Cada exportación tiene su ámbito, así que no
+    recibe runs cargados por otra (que pueden estar desactualizados).
+    """
+
+    def __init__(self, max_entries=RUNS_INDEX_MAX_PROJECTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, load):
+        """Devuelve el índice de key; si no está, lo arma con load()."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {'lock': threading.Lock(), 'groups': None}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        with entry['lock']:
+            if entry['groups'] is None:
+                entry['groups'] = load()
+            return entry['groups']
+
+    def discard(self, scope):
+        """Olvida los índices del ámbito scope (al terminar su exportación)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == scope]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+project_runs = ProjectRunsIndex()
@@ -0,0 +1,302 @@
+"""Motor de exportación sobre Analytics (OData) en vez de la API REST.
+
+En lugar de una petición por suite y una por run, cada plan se resuelve con
+una consulta paginada a la entidad TestPoints (el último resultado de cada
+test point, con $select/$filter/$expand) y, en modo "runs", unas pocas
+consultas agregadas ($apply=filter/groupby) a TestRuns para los nombres de
+los runs. Las suites (orden, nombres y filtro por subárbol) siguen saliendo
+de la API REST y de la caché de metadatos.
+
+fetch_unit tiene la misma firma y genera las mismas columnas que
+engine.fetch_unit. Diferencias con el motor REST:
+- No admite el modo "history": Analytics solo expone el último resultado de
+  cada test point (TestResultsDaily está agregado por día, sin run ni tester).
+- En modo "runs" el resultado de cada test case es el más reciente de sus
+  test points en todo el plan, que es el más reciente de todos sus resultados.
+  Con run_states, si el run de ese resultado no está en los estados pedidos
+  la fila queda como en el motor REST para un caso sin resultados en esos
+  runs: el outcome del test point sin Run ID (no se buscan resultados
+  anteriores).
+- Con min_date/max_date una fila queda solo si el último resultado cae en el
+  rango (el filtro se aplica en el servidor); el motor REST, en modo "runs",
+  toma en cambio el último resultado dentro del rango.
+
+Los nombres de entidades y campos están en POINT_FIELDS y RUN_FIELDS; si el
+$metadata del proyecto usa otros nombres basta con cambiarlos ahí.
+"""
+import os
+import time
+from datetime import timedelta
+
+from requests.auth import HTTPBasicAuth
+
+from . import azure
+from .engine import (
+    API_VERSIONS, MAX_WORKERS, NOT_EXECUTED, _RunResult, _TitleWindow, _intern, _points_by_testcase,
+    _resolve_titles, _suite_rows,
+)
+from .filters import check_date_range, parse_date
+from .stats import record_page, record_unit
+from .transport import ApiError, configure_pool, endpoint_name, get_json
+
+# URL de Analytics; por defecto la de Azure DevOps Services, o AZURE_DEVOPS_URL
+# si apunta a otro servidor (Azure DevOps Server o el servidor de benchmarks/)
+ANALYTICS_URL = os.environ.get("AZURE_DEVOPS_ANALYTICS_URL", "").rstrip("/")
+DEFAULT_ANALYTICS_URL = "https://analytics.dev.azure.com"
+ODATA_VERSION = "v4.0-preview"
+
+# Tamaño de página pedido con Prefer: odata.maxpagesize (el servidor puede usar uno menor)
+ODATA_PAGE_SIZE = 10000
+# Runs por consulta de nombres (el filtro "in" va en la URL)
+RUN_IDS_PER_QUERY = 200
+
+# Campos de TestPoints: clave interna -> nombre en Analytics
+POINT_FIELDS = {
+    'point': "TestPointId",
+    'plan': "TestPlanId",
+    'suite': "TestSuiteId",
+    'test_case': "TestCaseId",
+    'outcome': "LastResultOutcome",
+    'date': "LastResultCompletedDate",
+    'run': "LastResultTestRunId",
+    # Navegaciones ($expand) con el título del test case y quién ejecutó el último resultado
+    'test_case_title': ("TestCase", "Title"),
+    'run_by': ("LastResultRunBy", "UserName"),
+}
+# Campos de TestRuns
+RUN_FIELDS = {
+    'run': "TestRunId",
+    'name': "Title",
+    'state': "State",
+}
+
+
+def analytics_url():
+    """URL base de Analytics (se resuelve en cada uso para seguir a azure.BASE_URL)."""
+    if ANALYTICS_URL:
+        return ANALYTICS_URL
+    return DEFAULT_ANALYTICS_URL if azure.BASE_URL == "https://dev.azure.com" else azure.BASE_URL
+
+
+def odata_get_all(url, auth, params):
+    """Todas las filas de una consulta OData, siguiendo @odata.nextLink.
+
+    Lanza ApiError si una página falla (después de los reintentos de transport).
+    """
+    headers = {'Prefer': f"odata.maxpagesize={ODATA_PAGE_SIZE}"}
+    items = []
+    while url:
+        j, _ = get_json(url, auth, params=params, headers=headers)
+        items.extend(j.get('value') or [])
+        url = j.get('@odata.nextLink')
+        # El nextLink ya trae la consulta completa
+        params = None
+        if url:
+            record_page(endpoint_name(url))
+    return items
+
+
+def _entity_url(organization, project, entity):
+    return f"{analytics_url()}/{organization}/{project}/_odata/{ODATA_VERSION}/{entity}"
+
+
+def _in_filter(field, values):
+    return f"{field} in ({','.join(str(v) for v in values)})"
+
+
+def _date_filters(field, min_date=None, max_date=None):
+    """Cláusulas $filter de [min_date, max_date] (días UTC, inclusive) sobre field."""
+    clauses = []
+    if min_date:
+        clauses.append(f"{field} ge {parse_date(min_date).isoformat()}T00:00:00Z")
+    if max_date:
+        clauses.append(f"{field} lt {(parse_date(max_date) + timedelta(days=1)).isoformat()}T00:00:00Z")
+    return clauses
+
+
+def get_plan_points(organization, project, plan_id, username, token, suite_ids=None,
+                    min_date=None, max_date=None):
+    """Test points de un plan con su último resultado, en el formato de la API REST.
+
+    Cada test point se devuelve como los de azure.get_test_points
+    (testCaseReference y results.lastResultDetails) más 'suiteId', para
+    reutilizar lo que ya arma engine. Lanza ApiError si la consulta falla.
+    """
+    f = POINT_FIELDS
+    clauses = [f"{f['plan']} eq {plan_id}"]
+    if suite_ids:
+        clauses.append(_in_filter(f['suite'], suite_ids))
+    clauses.extend(_date_filters(f['date'], min_date, max_date))
+    params = {
+        '$select': ",".join(f[k] for k in ('point', 'suite', 'test_case', 'outcome', 'date', 'run')),
+        '$expand': ",".join(f"{nav}($select={field})" for nav, field in (f['test_case_title'], f['run_by'])),
+        '$filter': " and ".join(clauses),
+        '$orderby': f['point'],
+    }
+    items = odata_get_all(_entity_url(organization, project, "TestPoints"), HTTPBasicAuth(username, token), params)
+    return [_rest_point(item) for item in items]
+
+
+def _rest_point(item):
+    """Un test point de Analytics con la forma de los de la API REST."""
+    f = POINT_FIELDS
+    title_nav, title_field = f['test_case_title']
+    run_by_nav, run_by_field = f['run_by']
+    outcome = item.get(f['outcome'])
+    results = {}
+    if outcome:
+        results = {
+            'outcome': outcome,
+            'lastTestRunId': item.get(f['run']),
+            'lastResultDetails': {
+                'dateCompleted': item.get(f['date']),
+                'runBy': {'displayName': (item.get(run_by_nav) or {}).get(run_by_field)},
+            },
+        }
+    return {
+        'id': item.get(f['point']),
+        'suiteId': item.get(f['suite']),
+        'testCaseReference': {
+            'id': item.get(f['test_case']),
+            'name': (item.get(title_nav) or {}).get(title_field),
+        },
+        'results': results,
+    }
+
+
+def get_runs_by_id(organization, project, run_ids, username, token):
+    """{run id: (nombre, estado)} de los runs pedidos, con consultas agregadas a TestRuns."""
+    f = RUN_FIELDS
+    url = _entity_url(organization, project, "TestRuns")
+    auth = HTTPBasicAuth(username, token)
+    run_ids = sorted(set(run_ids))
+    runs = {}
+    for i in range(0, len(run_ids), RUN_IDS_PER_QUERY):
+        chunk = run_ids[i:i+RUN_IDS_PER_QUERY]
+        params = {'$apply': f"filter({_in_filter(f['run'], chunk)})/groupby(({f['run']},{f['name']},{f['state']}))"}
+        for item in odata_get_all(url, auth, params):
+            runs[int(item[f['run']])] = (item.get(f['name']), item.get(f['state']))
+    return runs
+
+
+def check_mode(mode):
+    """Lanza ValueError si el motor OData no puede exportar en el modo indicado."""
+    if mode == "history":
+        raise ValueError("El motor OData no admite el modo \"history\": Analytics solo expone el último "
+                         "resultado de cada test point. Usá el motor REST (threads o async).")
+    if mode not in ("runs", "points"):
+        raise ValueError(f"Modo de exportación desconocido: {mode}")
+
+
+def fetch_unit(organization, unit, username, token, max_workers=MAX_WORKERS, mode="runs", suites=None,
+               min_date=None, max_date=None, run_states=None, outcomes=None, cache_scope=None, **_ignored):
+    """Genera las filas de una unidad (proyecto, plan) de list_work_units, como engine.fetch_unit.
+
+    La caché de runs (cache_path) no se usa: no se descargan resultados de runs.
+    Si no se pueden obtener los test points del plan, el plan se omite: la
+    falla queda en el reporte de transport y el plan en 'skipped_plans' de
+    stats.get_stats.
+    """
+    configure_pool(max_workers)
+    started = time.perf_counter()
+    rows = 0
+    skipped = False
+    try:
+        for row in fetch_data_for_project(organization, unit, username, token, mode=mode, suites=suites,
+                                          min_date=min_date, max_date=max_date, run_states=run_states,
+                                          outcomes=outcomes, cache_scope=cache_scope):
+            rows += 1
+            paused = time.perf_counter()
+            yield row
+            started += time.perf_counter() - paused
+    except ApiError:
+        skipped = True
+    finally:
+        record_unit(unit['project'], unit['plan_id'], unit['plan_name'], time.perf_counter() - started, rows,
+                    skipped=skipped)
+
+
+def fetch_data_for_project(organization, unit, username, token, mode="runs", suites=None, min_date=None,
+                           max_date=None, run_states=None, outcomes=None, cache_scope=None):
+    """Filas de un plan, suite por suite, a partir de los test points de Analytics.
+
+    Lanza ApiError si no se pudieron obtener los test points del plan.
+    """
+    check_mode(mode)
+    check_date_range(min_date, max_date)
+    project_name, plan_id = unit['project'], unit['plan_id']
+    test_suites = azure.get_test_suites(organization, project_name, plan_id, API_VERSIONS['suites'],
+                                        username, token, subtrees=suites)
+    if not test_suites:
+        return
+
+    # En modo "runs" el último resultado es el de todo el plan: se piden también las suites no elegidas
+    suite_ids = [s.get('id') for s in test_suites] if suites and mode == "points" else None
+    points = get_plan_points(organization, project_name, plan_id, username, token, suite_ids=suite_ids,
+                             min_date=min_date, max_date=max_date)
+    run_results_map = _latest_results(organization, project_name, points, username, token, run_states) \
+        if mode == "runs" else {}
+
+    by_suite = {}
+    for p in points:
+        by_suite.setdefault(str(p['suiteId']), []).append(p)
+
+    # Los títulos faltantes de varias suites se piden juntos (ver engine._TitleWindow)
+    window = _TitleWindow()
+    for suite in test_suites:
+        points_map = _points_by_testcase(by_suite.get(str(suite.get('id')), []))
+        testcases = [{'id': tcid, 'name': p['testCaseReference'].get('name')} for tcid, p in points_map.items()]
+        point_results = {tcid: _point_result(p, mode) for tcid, p in points_map.items()}
+        data = _suite_rows(project_name, plan_id, unit['plan_name'], unit['iteration'], suite, testcases,
+                           point_results, run_results_map, outcomes=outcomes, min_date=min_date, max_date=max_date)
+        if window.add(data):
+            yield from _resolve_titles(window, organization, username, token, run_results_map, cache_scope)
+    yield from _resolve_titles(window, organization, username, token, run_results_map, cache_scope)
+
+
+def _point_result(p, mode):
+    """(outcome, executed_by, date, run_id) de un test point; en modo "runs" sin Run ID (como engine)."""
+    last = p['results']
+    if not last:
+        return ("Active",) + NOT_EXECUTED[1:]
+    details = last['lastResultDetails']
+    run_id = last.get('lastTestRunId') if mode == "points" else None
+    return (_intern(last['outcome']), _intern(details['runBy'].get('displayName')), details['dateCompleted'],
+            int(run_id) if run_id else None)
+
+
+def _latest_results(organization, project, points, username, token, run_states=None):
+    """{test case id: _RunResult} con el resultado más reciente de cada test case en el plan.
+
+    Si no se pueden obtener los nombres de los runs (la falla queda en el
+    reporte de transport), los resultados quedan sin "Run Name" y sin filtrar
+    por run_states, como los de un run borrado.
+    """
+    latest = {}
+    for p in points:
+        last = p['results']
+        if not last or not last.get('lastTestRunId'):
+            continue
+        tcid = str(p['testCaseReference']['id'])
+        date = last['lastResultDetails']['dateCompleted']
+        existing = latest.get(tcid)
+        if existing and existing['lastResultDetails']['dateCompleted'] and date \
+                and existing['lastResultDetails']['dateCompleted'] >= date:
+            continue
+        latest[tcid] = last
+
+    try:
+        runs = get_runs_by_id(organization, project, [int(last['lastTestRunId']) for last in latest.values()],
+                              username, token) if latest else {}
+    except ApiError:
+        runs = None
+    results = {}
+    for tcid, last in latest.items():
+        run_id = int(last['lastTestRunId'])
+        run_name, run_state = runs.get(run_id, (None, None)) if runs is not None else (None, None)
+        if run_states and runs is not None and run_state not in run_states:
+            continue
+        details = last['lastResultDetails']
+        results[tcid] = _RunResult(run_id, run_name, None, _intern(last['outcome']),
+                                   _intern(details['runBy'].get('displayName')), details['dateCompleted'])
+    return results
@@ -0,0 +1,135 @@
+"""Análisis previo (pre-flight) de una exportación: qué se va a descargar y cuánto puede tardar.
+
+Antes de exportar se listan los proyectos y planes, el árbol de suites de
+cada plan y sus runs, con las mismas consultas (y los mismos filtros) que
+usa la exportación. Es barato: unas pocas peticiones por plan, contra una por
+suite y una por run de la exportación. Con eso se estiman las peticiones y
+el tiempo de cada plan usando la latencia medida.
+
+Los proyectos, planes y suites quedan en la caché de metadatos (ver
+metacache), así que la exportación que sigue los reutiliza sin volver a
+pedirlos.
+"""
+import math
+import statistics
+import time
+
+from .azure import get_plan_runs_from_index, get_test_runs, get_test_suites
+from .cache import RunCache
+from .engine import API_VERSIONS, MAX_WORKERS, RUN_MODES, _ordered_map, _select_runs, list_work_units
+from .filters import check_date_range, date_windows
+from .metacache import new_cache_scope, project_runs
+from .stats import get_stats, mark, raw_stats_since, release
+
+# Latencia supuesta si no hay ninguna medición (ms)
+DEFAULT_LATENCY_MS = 200.0
+
+
+def scan(organization, project_name, username, token, plans=None, iteration=None, mode="runs",
+         suites=None, min_date=None, max_date=None, run_states=None, cache_path=None,
+         max_workers=MAX_WORKERS, progress=None, **_ignored):
+    """Analiza los planes que exportaría export_to_file con estos parámetros.
+
+    Los argumentos son los de exporter.export_to_file y engine.fetch_unit (el
+    resto de las opciones se ignora). progress(hechos, total, unidad) se
+    invoca al terminar cada plan.
+
+    Devuelve un dict con 'plans' (una entrada por plan: unidad de
+    list_work_units, cantidad de suites y de runs, runs ya en la caché local,
+    peticiones y segundos estimados), los totales 'requests' y 'seconds',
+    'latency_ms' (latencia usada por tipo de endpoint) y lo que costó el
+    análisis ('scan_requests', 'scan_seconds').
+    """
+    check_date_range(min_date, max_date)
+    started = time.perf_counter()
+    before = mark()
+    # Los índices de runs de este análisis no se comparten con otros ni con las exportaciones
+    scope = new_cache_scope()
+    try:
+        units = list_work_units(organization, project_name, username, token, plans=plans, iteration=iteration)
+        state = run_states[0] if run_states and len(run_states) == 1 else None
+
+        def scan_unit(unit):
+            test_suites = get_test_suites(organization, unit['project'], unit['plan_id'], API_VERSIONS['suites'],
+                                          username, token, subtrees=suites)
+            runs = []
+            if test_suites and mode in RUN_MODES:
+                if unit['runs_scope'] == "project":
+                    runs = get_plan_runs_from_index(organization, unit['project'], unit['plan_id'],
+                                                    API_VERSIONS['runs'], username, token, min_date=min_date,
+                                                    max_date=max_date, state=state, cache_scope=scope)
+                else:
+                    runs = get_test_runs(organization, unit['project'], unit['plan_id'], API_VERSIONS['runs'],
+                                         username, token, min_date=min_date, max_date=max_date, state=state)
+                runs = _select_runs(runs, run_states)
+            return test_suites, runs
+
+        run_cache = RunCache(cache_path) if cache_path else None
+        scanned = []
+        try:
+            for done, (unit, (test_suites, runs)) in enumerate(
+                    zip(units, _ordered_map(scan_unit, units, max_workers)), start=1):
+                cached = run_cache.cached_ids(organization, unit['project'], runs) if run_cache and runs else set()
+                scanned.append((unit, test_suites, runs, cached))
+                if progress:
+                    progress(done, len(units), unit)
+        finally:
+            if run_cache:
+                run_cache.close()
+
+        scan_stats = get_stats(raw_stats_since(before))
+    finally:
+        project_runs.discard(scope)
+        release(before)
+    latency = _latencies(scan_stats)
+    # Consultas de runs de cada plan: una por ventana de fechas; con el índice del proyecto se reparten
+    run_queries = len(date_windows(min_date, max_date or time.strftime("%Y-%m-%d", time.gmtime()))) if min_date else 1
+    project_plans = {}
+    for unit, *_ in scanned:
+        project_plans[unit['project']] = project_plans.get(unit['project'], 0) + 1
+
+    report = []
+    for unit, test_suites, runs, cached in scanned:
+        run_list_requests = 0
+        if test_suites and mode in RUN_MODES:
+            run_list_requests = run_queries
+            if unit['runs_scope'] == "project":
+                run_list_requests = run_queries / project_plans[unit['project']]
+        to_download = len(runs) - len(cached)
+        requests = 1 + len(test_suites) + run_list_requests + to_download
+        # Las suites y los runs se descargan de a max_workers en paralelo dentro del plan
+        seconds = (
+            latency['suites'] + run_list_requests * latency['runs']
+            + math.ceil(len(test_suites) / max_workers) * latency['testpoints']
+            + math.ceil(to_download / max_workers) * latency['run_results']
+        ) / 1000
+        report.append({
+            **unit,
+            'suites': len(test_suites),
+            'runs': len(runs),
+            'cached_runs': len(cached),
+            'requests': math.ceil(requests),
+            'seconds': round(seconds, 1),
+        })
+
+    return {
+        'plans': report,
+        'requests': sum(p['requests'] for p in report),
+        'seconds': round(sum(p['seconds'] for p in report), 1),
+        'latency_ms': latency,
+        'scan_requests': scan_stats['requests'],
+        'scan_seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def _latencies(scan_stats):
+    """Latencia (p50, ms) a usar para cada tipo de endpoint de la exportación.
+
+    Se usa la de las exportaciones anteriores del proceso si la hay y, si no,
+    la mediana de lo medido durante el análisis (los test points y los
+    resultados de runs no se piden en el análisis).
+    """
+    measured = {e['endpoint']: e['p50_ms'] for e in get_stats()['endpoints'] if e['p50_ms'] is not None}
+    scanned = [e['p50_ms'] for e in scan_stats['endpoints'] if e['p50_ms'] is not None]
+    fallback = statistics.median(scanned) if scanned else DEFAULT_LATENCY_MS
+    return {name: measured.get(name, fallback) for name in ('suites', 'runs', 'testpoints', 'run_results')}
@@ -0,0 +1,196 @@
+"""Exportación repartida en varios procesos o máquinas.
+
+Cada unidad (proyecto, plan) se escribe en su propio archivo parcial
+``unit-NNNNN.jsonl.gz`` dentro de un directorio de trabajo. El paso de
+``merge`` lee los parciales en el orden original de las unidades, por lo que
+el resultado final es el mismo que el de una exportación secuencial.
+"""
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .engine import unit_fetcher
+from .stats import mark, merge_stats, raw_stats_since, release
+from .transport import failures_since, mark_failures, record_failures, release_failures
+from .writers import write_rows
+
+MANIFEST_NAME = "manifest.json"
+
+
+def unit_path(out_dir, ordinal):
+    return os.path.join(out_dir, f"unit-{ordinal:05d}.jsonl.gz")
+
+
+def select_shard(units, shard_index, shard_count):
+    """Devuelve las unidades asignadas a un shard (reparto round-robin)."""
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard inválido: {shard_index}/{shard_count}")
+    return units[shard_index::shard_count]
+
+
+def write_manifest(out_dir, organization, units, options=None):
+    """Guarda la lista de unidades; todos los shards deben coincidir en ella.
+
+    options (opcional) son las opciones que definen el contenido de las filas:
+    también deben coincidir para reutilizar los parciales (ver checkpoint).
+    El manifest registra además cuándo se creó ('created', segundos epoch),
+    que se conserva al volver a escribirlo.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {
+        'organization': organization,
+        'units': [{k: u[k] for k in ('ordinal', 'project', 'plan_id', 'plan_name')} for u in units],
+    }
+    if options is not None:
+        manifest['options'] = options
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            existing = json.load(f)
+        existing.pop('created', None)
+        if existing != manifest:
+            raise ValueError(f"El directorio {out_dir} contiene un manifest de otra exportación.")
+        return
+    manifest['created'] = time.time()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def finished_ordinals(out_dir):
+    """Ordinales de las unidades cuyo parcial ya está completo en out_dir."""
+    ordinals = set()
+    for name in os.listdir(out_dir) if os.path.isdir(out_dir) else []:
+        if name.startswith("unit-") and name.endswith(".jsonl.gz"):
+            ordinals.add(int(name[len("unit-"):-len(".jsonl.gz")]))
+    return ordinals
+
+
+class PartialWriter:
+    """Escribe las filas de una unidad tras otra, cada una en su parcial.
+
+    Escritura atómica: un parcial existe solo si se completó (finish o el
+    start de la unidad siguiente).
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self._file = None
+        self._path = None
+        self.count = 0
+
+    def start(self, unit):
+        self.finish()
+        self._path = unit_path(self.out_dir, unit['ordinal'])
+        self._file = gzip.open(self._path + ".tmp", "wt", encoding="utf-8")
+        self.count = 0
+
+    def write(self, row):
+        self._file.write(json.dumps(row, ensure_ascii=False))
+        self._file.write("\n")
+        self.count += 1
+
+    def finish(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path + ".tmp", self._path)
+        self._file = None
+
+    def abort(self):
+        """Descarta la unidad a medio escribir."""
+        if self._file is None:
+            return
+        self._file.close()
+        os.remove(self._path + ".tmp")
+        self._file = None
+
+
+def export_unit(organization, unit, out_dir, username, token, engine="threads", **options):
+    """Exporta una unidad a su archivo parcial. Devuelve (ordinal, filas, fallas, métricas).
+
+    engine elige el motor (ver engine.ENGINES) y options se pasa tal cual a su fetch_unit. fallas y métricas son las
+    registradas por transport y stats durante esta unidad.
+    """
+    failures_mark = mark_failures()
+    stats_mark = mark()
+    try:
+        fetch_unit = unit_fetcher(engine)
+        writer = PartialWriter(out_dir)
+        writer.start(unit)
+        try:
+            for row in fetch_unit(organization, unit, username, token, **options):
+                writer.write(row)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.finish()
+        return unit['ordinal'], writer.count, failures_since(failures_mark), raw_stats_since(stats_mark)
+    finally:
+        release_failures(failures_mark)
+        release(stats_mark)
+
+
+def run_parallel_export(organization, units, out_dir, username, token, workers,
+                        progress=None, **options):
+    """Exporta las unidades repartidas entre `workers` procesos.
+
+    progress(done, total, unit) se invoca al terminar cada unidad.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    total = len(units)
+    by_ordinal = {u['ordinal']: u for u in units}
+    # spawn: los procesos hijos no heredan el estado del servidor de Streamlit
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=ctx) as executor:
+        futures = [
+            executor.submit(export_unit, organization, u, out_dir, username, token, **options)
+            for u in units
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            ordinal, _, failures, unit_stats = future.result()
+            # Las fallas y métricas de los procesos hijos se suman a las de este proceso
+            record_failures(failures)
+            merge_stats(unit_stats)
+            if progress:
+                progress(done, total, by_ordinal[ordinal])
+
+
+def run_shard(organization, units, shard_index, shard_count, out_dir, username, token,
+              workers=1, progress=None, **options):
+    """Exporta solo las unidades del shard indicado (útil para varias máquinas)."""
+    write_manifest(out_dir, organization, units)
+    mine = select_shard(units, shard_index, shard_count)
+    if workers > 1:
+        run_parallel_export(organization, mine, out_dir, username, token, workers,
+                            progress=progress, **options)
+        return
+    for done, unit in enumerate(mine, start=1):
+        export_unit(organization, unit, out_dir, username, token, **options)
+        if progress:
+            progress(done, len(mine), unit)
+
+
+def iter_partial_rows(out_dir):
+    """Recorre las filas de todos los parciales en el orden de las unidades."""
+    with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    ordinals = [u['ordinal'] for u in manifest['units']]
+    missing = [o for o in ordinals if not os.path.exists(unit_path(out_dir, o))]
+    if missing:
+        raise FileNotFoundError(
+            f"Faltan {len(missing)} parciales en {out_dir} (unidades: {missing[:20]})"
+        )
+    for ordinal in ordinals:
+        with gzip.open(unit_path(out_dir, ordinal), "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def merge_partials(out_dir, output_path, output_format="xlsx"):
+    """Une los parciales de out_dir en el archivo final. Devuelve la cantidad de filas."""
+    return write_rows(iter_partial_rows(out_dir), output_path, output_format)
@@ -0,0 +1,224 @@
+"""Métricas de la exportación: peticiones por endpoint y tiempo por plan.
+
+transport registra cada intento HTTP (latencia, bytes, reintentos),
+azure.api_get_all las páginas seguidas y engine.fetch_unit el tiempo de cada
+plan. Como el reporte de fallas, el registro es del proceso: los procesos
+hijos devuelven su parte (raw_stats_since) y el padre la suma (merge_stats).
+
+Quien necesita solo lo de una exportación toma una marca (mark) al empezar y
+la suelta (release) al terminar. En un proceso de larga vida (la app) los
+trabajos sueltan su marca con trim, que descarta lo que ya no necesita
+ninguna marca activa para que el registro no crezca con el tiempo.
+"""
+import cProfile
+import contextlib
+import json
+import threading
+
+_lock = threading.Lock()
+_endpoints = {}
+_units = []
+# Marcas activas (ver mark) y cantidad de latencias y planes ya descartados:
+# las marcas guardan posiciones absolutas para seguir valiendo después de descartar
+_marks = []
+_dropped = {'latencies': {}, 'units': 0}
+
+# Latencias por endpoint que se conservan al descartar (preflight estima con las últimas)
+KEEP_LATENCIES = 1000
+
+_COUNTERS = ('requests', 'pages', 'retries', 'errors', 'bytes')
+
+
+def _endpoint(name):
+    entry = _endpoints.get(name)
+    if entry is None:
+        entry = _endpoints[name] = {k: 0 for k in _COUNTERS}
+        entry['latencies'] = []
+    return entry
+
+
+def record_request(endpoint, seconds, size, retry=False, error=False):
+    """Registra un intento HTTP (incluye los reintentos)."""
+    with _lock:
+        entry = _endpoint(endpoint)
+        entry['requests'] += 1
+        entry['bytes'] += size
+        entry['latencies'].append(seconds)
+        if retry:
+            entry['retries'] += 1
+        if error:
+            entry['errors'] += 1
+
+
+def record_page(endpoint):
+    """Registra una página seguida por continuation token."""
+    with _lock:
+        _endpoint(endpoint)['pages'] += 1
+
+
+def record_unit(project, plan_id, plan_name, seconds, rows, skipped=False):
+    """Registra el tiempo propio (sin contar al consumidor de las filas) de un plan.
+
+    skipped indica que el plan no se pudo exportar (sus filas faltan en el archivo).
+    """
+    with _lock:
+        _units.append({'project': project, 'plan_id': plan_id, 'plan_name': plan_name,
+                       'seconds': seconds, 'rows': rows, 'skipped': skipped})
+
+
+def raw_stats():
+    """Copia de los datos crudos (para get_stats y merge_stats)."""
+    with _lock:
+        return {
+            'endpoints': {name: dict(e, latencies=list(e['latencies'])) for name, e in _endpoints.items()},
+            'units': list(_units),
+        }
+
+
+def mark():
+    """Marca el estado actual del registro (para raw_stats_since); se suelta con release.
+
+    No copia las latencias ni los planes: solo guarda contadores y posiciones.
+    """
+    with _lock:
+        m = {
+            'endpoints': {
+                name: dict({k: e[k] for k in _COUNTERS},
+                           latencies=_dropped['latencies'].get(name, 0) + len(e['latencies']))
+                for name, e in _endpoints.items()
+            },
+            'units': _dropped['units'] + len(_units),
+        }
+        _marks.append(m)
+        return m
+
+
+def raw_stats_since(before):
+    """Datos registrados después de la marca `before` (ver mark)."""
+    with _lock:
+        endpoints = {}
+        for name, e in _endpoints.items():
+            prev = before['endpoints'].get(name)
+            start = (prev['latencies'] if prev else 0) - _dropped['latencies'].get(name, 0)
+            delta = {k: e[k] - (prev[k] if prev else 0) for k in _COUNTERS}
+            delta['latencies'] = e['latencies'][start:]
+            if delta['requests'] or delta['pages']:
+                endpoints[name] = delta
+        return {'endpoints': endpoints, 'units': _units[before['units'] - _dropped['units']:]}
+
+
+def release(m, trim=False):
+    """Suelta una marca de mark. Con trim descarta lo que ninguna marca activa necesita."""
+    with _lock:
+        _marks.remove(m)
+        if not trim:
+            return
+        for name, e in _endpoints.items():
+            dropped = _dropped['latencies'].get(name, 0)
+            total = dropped + len(e['latencies'])
+            # Una marca anterior al primer uso del endpoint necesita todas sus latencias
+            keep_from = min([total - KEEP_LATENCIES] + [
+                other['endpoints'][name]['latencies'] if name in other['endpoints'] else 0 for other in _marks
+            ])
+            if keep_from > dropped:
+                del e['latencies'][:keep_from - dropped]
+                _dropped['latencies'][name] = keep_from
+        keep_from = min([_dropped['units'] + len(_units)] + [other['units'] for other in _marks])
+        del _units[:keep_from - _dropped['units']]
+        _dropped['units'] = keep_from
+
+
+def merge_stats(raw):
+    """Suma los datos reportados por otro proceso."""
+    with _lock:
+        for name, e in raw['endpoints'].items():
+            entry = _endpoint(name)
+            for k in _COUNTERS:
+                entry[k] += e[k]
+            entry['latencies'].extend(e['latencies'])
+        _units.extend(raw['units'])
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def get_stats(raw=None):
+    """Resumen: por endpoint, por plan (del más lento al más rápido) y por proyecto.
+
+    raw (de raw_stats o raw_stats_since) permite resumir solo una parte; por
+    defecto se resume todo lo registrado en el proceso.
+    """
+    if raw is None:
+        raw = raw_stats()
+    endpoints = []
+    for name, e in sorted(raw['endpoints'].items()):
+        ordered = sorted(e['latencies'])
+        endpoints.append({
+            'endpoint': name,
+            'requests': e['requests'],
+            'pages': e['pages'],
+            'retries': e['retries'],
+            'errors': e['errors'],
+            'mb': round(e['bytes'] / (1024 * 1024), 2),
+            'p50_ms': _ms(_percentile(ordered, 50)),
+            'p90_ms': _ms(_percentile(ordered, 90)),
+            'p99_ms': _ms(_percentile(ordered, 99)),
+            'max_ms': _ms(ordered[-1] if ordered else None),
+            'total_s': round(sum(ordered), 2),
+        })
+
+    plans = sorted(({**u, 'seconds': round(u['seconds'], 2)} for u in raw['units']),
+                   key=lambda u: u['seconds'], reverse=True)
+    projects = {}
+    for u in raw['units']:
+        p = projects.setdefault(u['project'], {'project': u['project'], 'plans': 0, 'rows': 0, 'seconds': 0.0})
+        p['plans'] += 1
+        p['rows'] += u['rows']
+        p['seconds'] += u['seconds']
+    for p in projects.values():
+        p['seconds'] = round(p['seconds'], 2)
+
+    return {
+        'requests': sum(e['requests'] for e in endpoints),
+        'retries': sum(e['retries'] for e in endpoints),
+        'mb': round(sum(e['mb'] for e in endpoints), 2),
+        'endpoints': endpoints,
+        'plans': plans,
+        'projects': sorted(projects.values(), key=lambda p: p['seconds'], reverse=True),
+        # Planes que no se pudieron exportar (ver record_unit)
+        'skipped_plans': [{k: u[k] for k in ('project', 'plan_id', 'plan_name')}
+                          for u in raw['units'] if u.get('skipped')],
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def write_stats_json(path, stats=None):
+    """Guarda el resumen de get_stats() como JSON (archivo complementario de la exportación)."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stats if stats is not None else get_stats(), f, ensure_ascii=False, indent=2)
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """Perfila el bloque con cProfile y guarda el resultado en path (nada si path es None).
+
+    El archivo se analiza con pstats o snakeviz. Solo cubre este proceso: con
+    workers > 1 los procesos hijos no se perfilan.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,312 @@
+"""Almacén local (SQLite) de los resultados exportados, para consultas entre exportaciones.
+
+Cada exportación guarda sus filas en el almacén (una fila por organización,
+proyecto, plan, suite, test case y run; si la fila ya estaba se actualiza).
+Después se pueden armar exportaciones y tendencias (por ejemplo, outcomes
+por semana de cada suite) directamente desde el almacén, sin consultar
+Azure DevOps.
+
+Las filas sin run (test case nunca ejecutado o modo "points" sin run) se
+guardan con run id 0. En modo "history" se guardan todos los resultados;
+en los otros modos, el último de cada test case en cada exportación, así
+que el almacén va acumulando la historia de exportación en exportación.
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from .cache import DEFAULT_CACHE_PATH
+from .engine import COLUMNS
+from .filters import NOT_EXECUTED_OUTCOMES, OUTCOMES, matches_any, outcome_key
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "results.sqlite")
+
+# Filas por transacción al guardar una exportación
+STORE_BATCH_ROWS = 5000
+
+# Columna de la tabla results para cada columna exportada
+_COLUMN_FIELDS = {
+    "Project Name": "project",
+    "Plan Name": "plan_name",
+    "Plan ID": "plan_id",
+    "Suite ID": "suite_id",
+    "Suite Name": "suite_name",
+    "Run ID": "run_id",
+    "Run Name": "run_name",
+    "Test Case ID": "test_case_id",
+    "Test Case Name": "test_case_name",
+    "Outcome": "outcome",
+    "Executed By": "executed_by",
+    "Execution Date": "execution_date",
+    "Iteration Path": "iteration_path",
+}
+
+# Agrupaciones de las tendencias: columnas de results que identifican cada serie
+TREND_GROUPS = {
+    'project': ("project",),
+    'plan': ("project", "plan_id", "plan_name"),
+    'suite': ("project", "plan_id", "plan_name", "suite_id", "suite_name"),
+    'tester': ("executed_by",),
+}
+# Períodos de las tendencias (formato de strftime de Python sobre el día UTC).
+# La semana es la ISO 8601: empieza el lunes y lleva el año ISO, así que los
+# primeros días de enero pueden caer en la última semana del año anterior
+TREND_PERIODS = {
+    'day': "%Y-%m-%d",
+    'week': "%G-W%V",
+    'month': "%Y-%m",
+}
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS results (
+        organization TEXT NOT NULL,
+        project TEXT NOT NULL,
+        plan_id INTEGER NOT NULL,
+        suite_id INTEGER NOT NULL,
+        test_case_id TEXT NOT NULL,
+        run_id INTEGER NOT NULL,
+        plan_name TEXT,
+        suite_name TEXT,
+        test_case_name TEXT,
+        run_name TEXT,
+        outcome TEXT,
+        outcome_key TEXT,
+        executed_by TEXT,
+        execution_date TEXT,
+        iteration_path TEXT,
+        export_id INTEGER NOT NULL,
+        PRIMARY KEY (organization, project, plan_id, suite_id, test_case_id, run_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS exports (
+        id INTEGER PRIMARY KEY,
+        organization TEXT NOT NULL,
+        project TEXT,
+        mode TEXT,
+        started REAL NOT NULL,
+        finished REAL,
+        rows INTEGER
+    )""",
+    # Planes y suites guardados, para resolver los patrones de nombres sin recorrer results
+    """CREATE TABLE IF NOT EXISTS plans (
+        organization TEXT NOT NULL,
+        project TEXT NOT NULL,
+        plan_id INTEGER NOT NULL,
+        plan_name TEXT,
+        PRIMARY KEY (organization, project, plan_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS suites (
+        organization TEXT NOT NULL,
+        project TEXT NOT NULL,
+        plan_id INTEGER NOT NULL,
+        suite_id INTEGER NOT NULL,
+        suite_name TEXT,
+        PRIMARY KEY (organization, project, plan_id, suite_id)
+    )""",
+    # La clave primaria cubre los filtros por proyecto; estos, los demás filtros habituales
+    "CREATE INDEX IF NOT EXISTS results_plan ON results (organization, plan_id, suite_id)",
+    "CREATE INDEX IF NOT EXISTS results_date ON results (organization, execution_date)",
+    "CREATE INDEX IF NOT EXISTS results_outcome ON results (organization, outcome_key)",
+    "CREATE INDEX IF NOT EXISTS results_executed_by ON results (organization, executed_by)",
+)
+
+_INSERT = (
+    "INSERT OR REPLACE INTO results (organization, project, plan_id, suite_id, test_case_id, run_id, "
+    "plan_name, suite_name, test_case_name, run_name, outcome, outcome_key, executed_by, execution_date, "
+    "iteration_path, export_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _period_key(day, fmt):
+    """Período (según fmt, ver TREND_PERIODS) del día 'AAAA-MM-DD', o "" si no es una fecha."""
+    try:
+        return datetime.strptime(day, "%Y-%m-%d").strftime(fmt)
+    except (TypeError, ValueError):
+        return ""
+
+
+class ResultStore:
+    """Resultados exportados por (organización, proyecto, plan, suite, test case, run)."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Con WAL alcanza con sincronizar en los checkpoints (un corte pierde, a lo sumo, el último lote)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def record(self, organization, rows, project=None, mode=None, batch_rows=STORE_BATCH_ROWS):
+        """Devuelve las mismas filas de rows, guardándolas de paso en el almacén.
+
+        Se guardan de a batch_rows filas por transacción; si la exportación se
+        corta, lo ya guardado queda (son resultados válidos).
+        """
+        cursor = self._conn.execute(
+            "INSERT INTO exports (organization, project, mode, started) VALUES (?, ?, ?, ?)",
+            (organization, project, mode, time.time()),
+        )
+        export_id = cursor.lastrowid
+        self._conn.commit()
+        batch = []
+        plans = {}
+        suites = {}
+        count = 0
+        for row in rows:
+            project, plan_id, suite_id = row.get("Project Name"), row.get("Plan ID"), row.get("Suite ID")
+            plans[project, plan_id] = row.get("Plan Name")
+            suites[project, plan_id, suite_id] = row.get("Suite Name")
+            batch.append((
+                organization, project, plan_id, suite_id, str(row.get("Test Case ID")), row.get("Run ID") or 0,
+                row.get("Plan Name"), row.get("Suite Name"), row.get("Test Case Name"), row.get("Run Name"),
+                row.get("Outcome"), outcome_key(row.get("Outcome")), row.get("Executed By"),
+                row.get("Execution Date"), row.get("Iteration Path"), export_id,
+            ))
+            count += 1
+            if len(batch) >= batch_rows:
+                self._write(organization, batch, plans, suites)
+                batch = []
+            yield row
+        self._write(organization, batch, plans, suites)
+        self._conn.execute("UPDATE exports SET finished = ?, rows = ? WHERE id = ?", (time.time(), count, export_id))
+        self._conn.commit()
+
+    def _write(self, organization, batch, plans, suites):
+        """Guarda un lote de filas y los planes y suites vistos hasta ahora (en una transacción)."""
+        self._conn.executemany(_INSERT, batch)
+        self._conn.executemany("INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?)",
+                               [(organization, *key, name) for key, name in plans.items()])
+        self._conn.executemany("INSERT OR REPLACE INTO suites VALUES (?, ?, ?, ?, ?)",
+                               [(organization, *key, name) for key, name in suites.items()])
+        self._conn.commit()
+        plans.clear()
+        suites.clear()
+
+    def _where(self, organization, projects=None, plans=None, suites=None, outcomes=None,
+               min_date=None, max_date=None, executed_by=None):
+        """(condición SQL, parámetros) para los filtros; los planes y suites admiten patrones (ver filters).
+
+        Los patrones de planes y suites se resuelven contra las tablas plans y
+        suites, así la consulta final filtra por id con el índice results_plan.
+        """
+        conditions = ["organization = ?"]
+        params = [organization]
+        if projects:
+            conditions.append(f"project IN ({','.join('?' * len(projects))})")
+            params.extend(projects)
+        for patterns, table, id_field, name_field in ((plans, "plans", "plan_id", "plan_name"),
+                                                      (suites, "suites", "suite_id", "suite_name")):
+            if not patterns:
+                continue
+            where = " AND ".join(conditions)
+            ids = sorted({item_id for item_id, name in self._conn.execute(
+                f"SELECT {id_field}, {name_field} FROM {table} WHERE {where}", params)
+                if matches_any(patterns, item_id, name)})
+            conditions.append(f"{id_field} IN ({','.join('?' * len(ids)) or 'NULL'})")
+            params.extend(ids)
+        if outcomes:
+            keys = [outcome_key(o) for o in outcomes]
+            conditions.append(f"outcome_key IN ({','.join('?' * len(keys))})")
+            params.extend(keys)
+        if executed_by:
+            conditions.append(f"executed_by IN ({','.join('?' * len(executed_by))})")
+            params.extend(executed_by)
+        # Las fechas son ISO en UTC: comparar el texto equivale a comparar días
+        if min_date:
+            conditions.append("execution_date >= ?")
+            params.append(str(min_date))
+        if max_date:
+            conditions.append("execution_date < ?")
+            params.append(f"{max_date}T99")
+        return " AND ".join(conditions), params
+
+    def query_rows(self, organization, latest=False, **filters):
+        """Filas guardadas (mismo esquema que la exportación), en el orden de una exportación.
+
+        Con latest se devuelve solo el resultado más reciente de cada test
+        case en cada suite, como una exportación en modo "runs". filters son
+        los de _where (projects, plans, suites, outcomes, min_date, max_date,
+        executed_by).
+        """
+        where, params = self._where(organization, **filters)
+        fields = ", ".join(_COLUMN_FIELDS[c] for c in COLUMNS)
+        if latest:
+            sql = (
+                f"SELECT {fields} FROM (SELECT *, ROW_NUMBER() OVER ("
+                "PARTITION BY project, plan_id, suite_id, test_case_id "
+                "ORDER BY execution_date IS NULL, execution_date DESC, run_id DESC) AS position "
+                f"FROM results WHERE {where}) WHERE position = 1 "
+            )
+        else:
+            sql = f"SELECT {fields} FROM results WHERE {where} "
+        sql += "ORDER BY project, plan_id, suite_id, test_case_id, execution_date, run_id"
+        run_id_position = COLUMNS.index("Run ID")
+        for values in self._conn.execute(sql, params):
+            row = dict(zip(COLUMNS, values))
+            if not values[run_id_position]:
+                row["Run ID"] = None
+            yield row
+
+    def trend(self, organization, by="suite", period="week", **filters):
+        """Outcomes por período de cada serie (plan, suite, tester...) como DataFrame.
+
+        Una fila por serie y período con la cantidad de resultados de cada
+        outcome, el total y el pass rate sobre los resultados ejecutados (los
+        outcomes fuera de filters.NOT_EXECUTED_OUTCOMES, igual que en los
+        resúmenes). Las filas sin fecha de ejecución no cuentan.
+        """
+        import pandas as pd
+
+        if by not in TREND_GROUPS:
+            raise ValueError(f"Agrupación desconocida: {by}")
+        if period not in TREND_PERIODS:
+            raise ValueError(f"Período desconocido: {period}")
+        where, params = self._where(organization, **filters)
+        groups = ", ".join(TREND_GROUPS[by])
+        # SQLite agrupa por día y el período se calcula acá (SQLite no tiene la semana ISO en todas las versiones)
+        frame = pd.read_sql_query(
+            f"SELECT substr(execution_date, 1, 10) AS day, {groups}, "
+            f"outcome_key, COUNT(*) AS results FROM results WHERE {where} AND execution_date IS NOT NULL "
+            f"GROUP BY day, {groups}, outcome_key",
+            self._conn, params=params,
+        )
+        periods = {day: _period_key(day, TREND_PERIODS[period]) for day in frame["day"].unique()}
+        frame["period"] = frame["day"].map(periods)
+        keys = frame["outcome_key"].fillna("")
+        frame["executed"] = frame["results"].where(~keys.isin(NOT_EXECUTED_OUTCOMES), 0)
+        labels = {outcome_key(o): o for o in OUTCOMES}
+        frame["outcome_key"] = keys.map(lambda k: labels.get(k, k or "Not Executed"))
+        index = ["period", *TREND_GROUPS[by]]
+        # Las series sin valor (p. ej. resultados sin tester) se agrupan como ""
+        frame[index] = frame[index].fillna("")
+        table = frame.pivot_table(index=index, columns="outcome_key", values="results", aggfunc="sum", fill_value=0)
+        table.columns.name = None
+        outcome_columns = list(table.columns)
+        table["Total"] = table[outcome_columns].sum(axis=1)
+        executed = frame.groupby(index)["executed"].sum().reindex(table.index)
+        passed = table["Passed"] if "Passed" in table else 0
+        table["Pass Rate %"] = (passed / executed.where(executed > 0) * 100).round(1)
+        table = table.reset_index()
+        return table.rename(columns={'period': "Period", **{v: c for c, v in _COLUMN_FIELDS.items()}})
+
+    def exports(self, organization=None):
+        """Exportaciones guardadas (más recientes primero) como lista de dicts."""
+        sql = "SELECT id, organization, project, mode, started, finished, rows FROM exports"
+        params = []
+        if organization:
+            sql += " WHERE organization = ?"
+            params.append(organization)
+        sql += " ORDER BY started DESC"
+        keys = ('id', 'organization', 'project', 'mode', 'started', 'finished', 'rows')
+        return [dict(zip(keys, values)) for values in self._conn.execute(sql, params)]
+
+    def projects(self, organization):
+        """Proyectos de la organización con filas guardadas."""
+        return [p for (p,) in self._conn.execute(
+            "SELECT DISTINCT project FROM plans WHERE organization = ? ORDER BY project", (organization,))]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,163 @@
+"""Hojas de resumen de una exportación (pass rate, casos inestables, testers).
+
+Las filas se recolectan mientras se escriben (SummaryCollector.collect no
+cambia el flujo de escritura) y los resúmenes se calculan al final con
+operaciones vectorizadas de pandas sobre columnas con tipo: los textos
+repetidos (proyecto, plan, suite, outcome, tester...) se guardan como códigos
+enteros y se convierten en columnas categóricas, así que la memoria y el
+tiempo dependen poco de la cantidad de resultados.
+
+Pensado sobre todo para el modo "history" (todos los resultados de todos
+los runs); con los otros modos los resúmenes describen solo el último
+resultado de cada test case.
+"""
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from .filters import NOT_EXECUTED_OUTCOMES, outcome_key
+
+# Columnas de las filas que usan los resúmenes (la fecha se guarda aparte)
+CODED_COLUMNS = (
+    "Project Name", "Plan ID", "Plan Name", "Suite ID", "Suite Name", "Run ID",
+    "Test Case ID", "Test Case Name", "Outcome", "Executed By", "Iteration Path",
+)
+DATE_COLUMN = "Execution Date"
+
+# Nombre de cada hoja de resumen (Excel admite hasta 31 caracteres)
+SUMMARY_SHEETS = {
+    'plans': "Pass rate por plan",
+    'suites': "Pass rate por suite",
+    'iterations': "Pass rate por iteración",
+    'flaky': "Casos inestables",
+    'testers': "Ejecuciones por tester",
+}
+
+
+class CodedColumn:
+    """Valores de una columna como códigos enteros y su tabla de categorías (-1 es vacío)."""
+
+    __slots__ = ('index', 'codes')
+
+    def __init__(self):
+        # None y "" ya están cargados con el código -1 (sin valor)
+        self.index = {None: -1, "": -1}
+        self.codes = array('i')
+
+    def categorical(self):
+        categories = [value for value, code in self.index.items() if code >= 0]
+        codes = np.frombuffer(self.codes, dtype=np.int32) if self.codes else np.array([], dtype=np.int32)
+        return pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+
+
+class SummaryCollector:
+    """Acumula las columnas que necesitan los resúmenes a medida que pasan las filas."""
+
+    def __init__(self):
+        self._columns = {c: CodedColumn() for c in CODED_COLUMNS}
+        self._dates = []
+
+    def collect(self, rows):
+        """Devuelve las mismas filas de rows, guardando de paso lo necesario para los resúmenes."""
+        # Es el único trabajo por fila de los resúmenes: sin llamadas a métodos propios
+        columns = [(name, column.index, column.codes.append) for name, column in self._columns.items()]
+        add_date = self._dates.append
+        for row in rows:
+            for name, index, add_code in columns:
+                value = row.get(name)
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(index) - 2
+                add_code(code)
+            add_date(row.get(DATE_COLUMN))
+            yield row
+
+    def frame(self):
+        """DataFrame con las columnas recolectadas: categóricas y la fecha como datetime UTC."""
+        data = {name: column.categorical() for name, column in self._columns.items()}
+        data[DATE_COLUMN] = pd.to_datetime(pd.Series(self._dates, dtype=object), utc=True,
+                                           errors="coerce", format="ISO8601")
+        return pd.DataFrame(data)
+
+
+def _outcome_flags(outcome):
+    """(clave normalizada como código entero, ejecutado, passed, failed) de una columna categórica de outcomes.
+
+    La normalización se hace sobre las categorías (pocas) y se expande a las
+    filas indexando con los códigos.
+    """
+    keys = pd.Index([outcome_key(str(c)) for c in outcome.cat.categories] + [""])
+    key_codes, _ = pd.factorize(keys)
+    # El código -1 (sin outcome) cae en la última posición, que es ""
+    row_keys = keys.to_numpy()[outcome.cat.codes.to_numpy()]
+    row_codes = key_codes[outcome.cat.codes.to_numpy()]
+    executed = ~np.isin(row_keys, NOT_EXECUTED_OUTCOMES)
+    return row_codes, executed, row_keys == "passed", row_keys == "failed"
+
+
+def _pass_rates(df, by):
+    """Test cases, ejecuciones, passed, failed y pass rate (sobre lo ejecutado) por grupo."""
+    out = df.groupby(by, observed=True, sort=True, dropna=False).agg(**{
+        "Test Cases": ("Test Case ID", "nunique"),
+        "Executions": ("_executed", "sum"),
+        "Passed": ("_passed", "sum"),
+        "Failed": ("_failed", "sum"),
+    }).reset_index()
+    out["Pass Rate %"] = (out["Passed"] / out["Executions"].where(out["Executions"] > 0) * 100).round(1)
+    return out
+
+
+def _flaky_cases(df):
+    """Test cases cuyo outcome cambió entre ejecuciones consecutivas del mismo plan."""
+    by = ["Project Name", "Plan ID", "Plan Name", "Test Case ID"]
+    executed = df[df["_executed"]].sort_values(["Plan ID", "Test Case ID", DATE_COLUMN], kind="stable")
+    previous = executed.groupby(["Plan ID", "Test Case ID"], observed=True)["_outcome"].shift()
+    executed = executed.assign(_flip=previous.notna() & (previous != executed["_outcome"]))
+    out = executed.groupby(by, observed=True, sort=False, dropna=False).agg(**{
+        "Test Case Name": ("Test Case Name", "last"),
+        "Executions": ("_executed", "sum"),
+        "Passed": ("_passed", "sum"),
+        "Failed": ("_failed", "sum"),
+        "Outcome Flips": ("_flip", "sum"),
+        "Last Outcome": ("Outcome", "last"),
+        "Last Execution": (DATE_COLUMN, "max"),
+    }).reset_index()
+    out = out[out["Outcome Flips"] > 0]
+    out = out.assign(**{"Flip Rate %": (out["Outcome Flips"] / (out["Executions"] - 1) * 100).round(1)})
+    return out.sort_values(["Outcome Flips", "Executions"], ascending=False, kind="stable").reset_index(drop=True)
+
+
+def _testers(df):
+    """Ejecuciones por tester: resultados, planes y test cases distintos, primera y última ejecución."""
+    executed = df[df["_executed"]]
+    out = executed.groupby("Executed By", observed=True, sort=True, dropna=False).agg(**{
+        "Executions": ("_executed", "sum"),
+        "Passed": ("_passed", "sum"),
+        "Failed": ("_failed", "sum"),
+        "Plans": ("Plan ID", "nunique"),
+        "Test Cases": ("Test Case ID", "nunique"),
+        "First Execution": (DATE_COLUMN, "min"),
+        "Last Execution": (DATE_COLUMN, "max"),
+    }).reset_index()
+    out["Pass Rate %"] = (out["Passed"] / out["Executions"].where(out["Executions"] > 0) * 100).round(1)
+    return out.sort_values("Executions", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def summarize(df):
+    """Calcula las hojas de resumen de un DataFrame de SummaryCollector.frame.
+
+    Devuelve un dict {clave de SUMMARY_SHEETS: DataFrame}. Un mismo resultado
+    aparece en cada suite que contiene al test case; salvo el resumen por
+    suite, los resúmenes lo cuentan una sola vez.
+    """
+    outcome, executed, passed, failed = _outcome_flags(df["Outcome"])
+    df = df.assign(_outcome=outcome, _executed=executed, _passed=passed, _failed=failed)
+    unique = df.drop_duplicates(["Plan ID", "Run ID", "Test Case ID", DATE_COLUMN])
+    return {
+        'plans': _pass_rates(unique, ["Project Name", "Plan ID", "Plan Name"]),
+        'suites': _pass_rates(df, ["Project Name", "Plan ID", "Plan Name", "Suite ID", "Suite Name"]),
+        'iterations': _pass_rates(unique, ["Project Name", "Iteration Path"]),
+        'flaky': _flaky_cases(unique),
+        'testers': _testers(unique),
+    }
@@ -0,0 +1,282 @@
+"""Capa HTTP compartida: pool de conexiones, reintentos y control de tasa.
+
+Todas las llamadas a Azure DevOps pasan por request(). Los errores que
+persisten después de los reintentos se registran en un reporte de fallas
+(get_failures) para que la exportación nunca pierda filas en silencio.
+"""
+import email.utils
+import random
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .stats import record_request
+
+# Respuestas que vale la pena reintentar
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Retry-After más largo que esto se recorta (evita quedar bloqueado indefinidamente)
+RETRY_AFTER_MAX = 300.0
+TIMEOUT = (10, 120)
+DEFAULT_POOL_SIZE = 10
+
+
+class ApiError(Exception):
+    """Un endpoint no respondió correctamente aun después de reintentar."""
+
+    def __init__(self, url, status, message):
+        super().__init__(f"{endpoint_name(url)}: {status} {message}")
+        self.url = url
+        self.status = status
+        self.message = message
+
+
+# Patrones para agrupar URLs por tipo de endpoint (el orden importa)
+_ENDPOINT_PATTERNS = [
+    ("odata", re.compile(r"/_odata/", re.I)),
+    ("run_results", re.compile(r"/_apis/test/runs/\d+/results", re.I)),
+    ("runs", re.compile(r"/_apis/test/runs", re.I)),
+    ("testpoints", re.compile(r"/_apis/testplan/plans/\d+/suites/\d+/testpoints", re.I)),
+    ("suite_testcases", re.compile(r"/_apis/test/plans/\d+/suites/\d+/testcases", re.I)),
+    ("suites", re.compile(r"/_apis/testplan/plans/\d+/suites", re.I)),
+    ("plans", re.compile(r"/_apis/testplan/plans", re.I)),
+    ("workitems", re.compile(r"/_apis/wit/workitems", re.I)),
+    ("projects", re.compile(r"/_apis/projects", re.I)),
+]
+
+
+def endpoint_name(url):
+    """Nombre corto del tipo de endpoint de una URL (para reportes)."""
+    for name, pattern in _ENDPOINT_PATTERNS:
+        if pattern.search(url):
+            return name
+    return "other"
+
+
+# --- Sesión HTTP persistente ---
+session = requests.Session()
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def configure_pool(size):
+    """Dimensiona el pool de conexiones para `size` peticiones concurrentes."""
+    global _pool_size
+    with _pool_lock:
+        if size <= _pool_size:
+            return
+        # pool_block: si se llena, los hilos esperan una conexión libre en vez de abrir y descartar
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size, pool_block=True)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _pool_size = size
+
+
+configure_pool(DEFAULT_POOL_SIZE)
+
+
+class Throttle:
+    """Espaciado adaptativo entre peticiones según las cabeceras de rate limit.
+
+    Azure DevOps envía X-RateLimit-* cuando el uso se acerca al límite y
+    Retry-After cuando empieza a rechazar. El intervalo entre peticiones crece
+    con esas señales y vuelve a bajar mientras las respuestas son normales.
+    """
+
+    MIN_INTERVAL = 0.05
+    MAX_INTERVAL = 5.0
+    # Fracción de X-RateLimit-Remaining/Limit por debajo de la cual se frena
+    LOW_REMAINING = 0.2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.interval = 0.0
+        self._next_slot = 0.0
+
+    def reserve(self):
+        """Reserva un turno para la próxima petición y devuelve cuántos segundos esperar."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + self.interval
+            return start - now
+
+    def pause(self, seconds):
+        """Detiene todas las peticiones durante `seconds`."""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    def observe(self, resp):
+        """Ajusta el intervalo según la respuesta recibida."""
+        headers = resp.headers
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        slow_down = resp.status_code == 429 or bool(headers.get('X-RateLimit-Delay'))
+        limit = _to_float(headers.get('X-RateLimit-Limit'))
+        remaining = _to_float(headers.get('X-RateLimit-Remaining'))
+        if limit and remaining is not None:
+            if remaining <= 0:
+                reset = _to_float(headers.get('X-RateLimit-Reset'))
+                if reset:
+                    retry_after = max(retry_after or 0, min(reset - time.time(), RETRY_AFTER_MAX))
+                slow_down = True
+            elif remaining / limit < self.LOW_REMAINING:
+                slow_down = True
+
+        with self._lock:
+            if slow_down:
+                self.interval = min(self.MAX_INTERVAL, max(self.MIN_INTERVAL, self.interval * 2))
+            elif self.interval:
+                self.interval *= 0.9
+                if self.interval < self.MIN_INTERVAL:
+                    self.interval = 0.0
+        if retry_after:
+            self.pause(retry_after)
+
+
+throttle = Throttle()
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_retry_after(value):
+    """Segundos indicados por Retry-After (número o fecha HTTP), o None."""
+    if not value:
+        return None
+    seconds = _to_float(value)
+    if seconds is None:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, min(seconds, RETRY_AFTER_MAX))
+
+
+def backoff_delay(attempt, resp=None):
+    """Espera antes del reintento `attempt`: Retry-After o backoff exponencial con jitter."""
+    if resp is not None:
+        retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+        if retry_after is not None:
+            return retry_after
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+# --- Reporte de fallas ---
+_failures = []
+_failures_lock = threading.Lock()
+# Marcas activas (ver mark_failures) y fallas ya descartadas, como en stats.mark
+_failure_marks = []
+_failures_dropped = 0
+
+
+def record_failure(url, status, message):
+    with _failures_lock:
+        _failures.append({
+            'endpoint': endpoint_name(url),
+            'url': url,
+            'status': status,
+            'message': message,
+        })
+
+
+def record_failures(failures):
+    """Agrega fallas reportadas por otro proceso."""
+    with _failures_lock:
+        _failures.extend(failures)
+
+
+def get_failures():
+    with _failures_lock:
+        return list(_failures)
+
+
+def mark_failures():
+    """Marca la posición actual del reporte (para failures_since); se suelta con release_failures."""
+    with _failures_lock:
+        m = [_failures_dropped + len(_failures)]
+        _failure_marks.append(m)
+        return m
+
+
+def failures_since(m):
+    """Fallas registradas después de la marca m."""
+    with _failures_lock:
+        return _failures[m[0] - _failures_dropped:]
+
+
+def release_failures(m, trim=False):
+    """Suelta una marca. Con trim descarta las fallas que ninguna marca activa necesita."""
+    global _failures_dropped
+    with _failures_lock:
+        _failure_marks.remove(m)
+        if trim:
+            keep_from = min([_failures_dropped + len(_failures)] + [other[0] for other in _failure_marks])
+            del _failures[:keep_from - _failures_dropped]
+            _failures_dropped = keep_from
+
+
+def request(method, url, auth, params=None, json=None, headers=None):
+    """Ejecuta una petición con control de tasa y reintentos.
+
+    Devuelve la última respuesta (que puede ser un error no reintentable) o
+    lanza requests.RequestException si la red falló en todos los intentos.
+    """
+    endpoint = endpoint_name(url)
+    for attempt in range(MAX_RETRIES + 1):
+        wait = throttle.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        resp = None
+        started = time.perf_counter()
+        try:
+            resp = session.request(method, url, auth=auth, params=params, json=json,
+                                   headers=headers, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            record_request(endpoint, time.perf_counter() - started, 0, retry=attempt > 0, error=True)
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            record_request(endpoint, time.perf_counter() - started, len(resp.content),
+                           retry=attempt > 0, error=resp.status_code >= 400)
+            throttle.observe(resp)
+            if resp.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                return resp
+        time.sleep(backoff_delay(attempt, resp))
+
+
+def get_json(url, auth, params=None, headers=None):
+    """GET que devuelve (json, headers) o lanza ApiError (la falla queda registrada).
+
+    Si la petición es condicional (If-None-Match) y el servidor responde 304,
+    devuelve (None, headers).
+    """
+    return _json_or_error("GET", url, auth, params=params, headers=headers)
+
+
+def post_json(url, auth, body, params=None):
+    """POST con cuerpo JSON; mismo contrato que get_json."""
+    return _json_or_error("POST", url, auth, params=params, json=body)
+
+
+def _json_or_error(method, url, auth, params=None, json=None, headers=None):
+    try:
+        resp = request(method, url, auth, params=params, json=json, headers=headers)
+    except requests.RequestException as e:
+        record_failure(url, None, str(e))
+        raise ApiError(url, None, str(e)) from e
+    if resp.status_code == 304:
+        return None, resp.headers
+    if resp.status_code != 200:
+        message = resp.reason or ""
+        record_failure(url, resp.status_code, message)
+        raise ApiError(url, resp.status_code, message)
+    return resp.json(), resp.headers
@@ -0,0 +1,223 @@
+"""Escritura de las filas exportadas a archivo, sin acumularlas en memoria."""
+import csv
+import json
+import os
+import re
+from datetime import datetime
+
+from .engine import COLUMNS
+
+# Límite de filas por hoja de Excel (incluye la fila de encabezados)
+EXCEL_MAX_ROWS = 1048576
+SHEET_NAME = "Resultados"
+
+
+def write_xlsx(rows, path, columns=COLUMNS, extra_sheets=None):
+    """Escribe las filas en un .xlsx en modo constant_memory. Devuelve la cantidad de filas.
+
+    Con constant_memory xlsxwriter vuelca cada fila a disco apenas se escribe,
+    así que la memoria no crece con el tamaño de la exportación. Si se supera
+    el límite de filas de Excel se continúa en una hoja nueva.
+
+    extra_sheets, si se indica, se invoca después de escribir todas las filas
+    y devuelve {nombre de hoja: DataFrame} con hojas que se agregan al final
+    (ver summary).
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True, 'border': 1})
+    count = 0
+    try:
+        worksheet = None
+        sheet_row = EXCEL_MAX_ROWS
+        for row in rows:
+            if sheet_row >= EXCEL_MAX_ROWS:
+                sheet_number = count // (EXCEL_MAX_ROWS - 1) + 1
+                worksheet = workbook.add_worksheet(SHEET_NAME if sheet_number == 1 else f"{SHEET_NAME} {sheet_number}")
+                worksheet.write_row(0, 0, columns, header_format)
+                sheet_row = 1
+            worksheet.write_row(sheet_row, 0, [row.get(c) for c in columns])
+            sheet_row += 1
+            count += 1
+        if worksheet is None:
+            worksheet = workbook.add_worksheet(SHEET_NAME)
+            worksheet.write_row(0, 0, columns, header_format)
+        if extra_sheets is not None:
+            write_frames(workbook, extra_sheets(), header_format)
+    finally:
+        workbook.close()
+    return count
+
+
+def _cell_values(series):
+    """Valores de una columna de pandas como tipos de Python que entiende xlsxwriter (None si falta)."""
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return [None if pd.isna(v) else v.isoformat() for v in series]
+    return [None if pd.isna(v) else v for v in series.astype(object).tolist()]
+
+
+def write_frames(workbook, frames, header_format=None):
+    """Agrega al workbook una hoja por DataFrame de frames ({nombre de hoja: DataFrame}).
+
+    Las filas que no entran en una hoja de Excel se descartan (los resúmenes
+    vienen ordenados con lo más relevante primero).
+    """
+    for name, frame in frames.items():
+        frame = frame.head(EXCEL_MAX_ROWS - 1)
+        worksheet = workbook.add_worksheet(name)
+        worksheet.write_row(0, 0, [str(c) for c in frame.columns], header_format)
+        columns = [_cell_values(frame[c]) for c in frame.columns]
+        for i, values in enumerate(zip(*columns), start=1):
+            worksheet.write_row(i, 0, values)
+
+
+def summary_path(output_path):
+    """Archivo .xlsx con los resúmenes de una exportación que no es .xlsx."""
+    return os.path.splitext(output_path)[0] + ".summary.xlsx"
+
+
+def write_summary_xlsx(frames, path):
+    """Escribe en un .xlsx aparte las hojas de frames ({nombre de hoja: DataFrame})."""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        write_frames(workbook, frames, workbook.add_format({'bold': True, 'border': 1}))
+    finally:
+        workbook.close()
+
+
+def write_csv(rows, path, columns=COLUMNS):
+    """Escribe las filas en CSV (UTF-8), una por una. Devuelve la cantidad de filas."""
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(["" if row.get(c) is None else row.get(c) for c in columns])
+            count += 1
+    return count
+
+
+def write_jsonl(rows, path, columns=COLUMNS):
+    """Escribe las filas en JSON Lines, una por línea. Devuelve la cantidad de filas."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+# Columnas con tipo propio en Parquet; el resto se escribe como texto
+PARQUET_INT_COLUMNS = ("Plan ID", "Suite ID", "Run ID")
+PARQUET_TIMESTAMP_COLUMNS = ("Execution Date",)
+PARQUET_BATCH_ROWS = 50000
+
+
+def _to_int(value):
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+# Decimales de los segundos (Azure DevOps manda hasta 7)
+_FRACTION = re.compile(r"\.(\d+)")
+
+
+def _to_timestamp(value):
+    """datetime de una fecha ISO de Azure DevOps (p. ej. '2024-01-01T10:00:00.1234567Z').
+
+    Antes de Python 3.11, fromisoformat no acepta la "Z" final ni otra
+    cantidad de decimales que 3 o 6: la zona se escribe como +00:00 y los
+    decimales se llevan a 6.
+    """
+    if not value:
+        return None
+    if value[-1] in "Zz":
+        value = value[:-1] + "+00:00"
+    value = _FRACTION.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value, count=1)
+    return datetime.fromisoformat(value)
+
+
+def parquet_schema(columns=COLUMNS):
+    import pyarrow as pa
+
+    fields = []
+    for c in columns:
+        if c in PARQUET_INT_COLUMNS:
+            fields.append(pa.field(c, pa.int64()))
+        elif c in PARQUET_TIMESTAMP_COLUMNS:
+            fields.append(pa.field(c, pa.timestamp("us", tz="UTC")))
+        else:
+            fields.append(pa.field(c, pa.string()))
+    return pa.schema(fields)
+
+
+def write_parquet(rows, path, columns=COLUMNS, batch_rows=PARQUET_BATCH_ROWS):
+    """Escribe las filas en Parquet por row groups de batch_rows filas. Devuelve la cantidad de filas.
+
+    Plan ID, Suite ID y Run ID se guardan como int64 y Execution Date como
+    timestamp UTC. Requiere pyarrow (dependencia opcional).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("La exportación a Parquet requiere el paquete 'pyarrow'.") from e
+
+    schema = parquet_schema(columns)
+    converters = []
+    for c in columns:
+        if c in PARQUET_INT_COLUMNS:
+            converters.append(_to_int)
+        elif c in PARQUET_TIMESTAMP_COLUMNS:
+            converters.append(_to_timestamp)
+        else:
+            converters.append(lambda v: None if v is None else str(v))
+
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = [[] for _ in columns]
+
+        def flush():
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(batch, schema)],
+                schema=schema,
+            ))
+            for values in batch:
+                values.clear()
+
+        for row in rows:
+            for values, c, convert in zip(batch, columns, converters):
+                values.append(convert(row.get(c)))
+            count += 1
+            if len(batch[0]) >= batch_rows:
+                flush()
+        if batch[0] or count == 0:
+            flush()
+    return count
+
+
+# Formatos de salida disponibles (la clave es la extensión del archivo)
+OUTPUT_FORMATS = {
+    'xlsx': {
+        'writer': write_xlsx,
+        'label': "Excel (.xlsx)",
+        'mime': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    },
+    'csv': {'writer': write_csv, 'label': "CSV", 'mime': "text/csv"},
+    'jsonl': {'writer': write_jsonl, 'label': "JSON Lines", 'mime': "application/x-ndjson"},
+    'parquet': {'writer': write_parquet, 'label': "Parquet", 'mime': "application/vnd.apache.parquet"},
+}
+
+
+def write_rows(rows, path, output_format="xlsx", columns=COLUMNS):
+    """Escribe las filas en el formato indicado. Devuelve la cantidad de filas."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de salida desconocido: {output_format}")
+    return OUTPUT_FORMATS[output_format]['writer'](rows, path, columns=columns)